@@ -108,6 +108,8 @@ netplan_state_write_yaml_file(
  * @brief   Update all the YAML files that were used to create this @ref NetplanState.
  * @details Data that has no associated filepath uses the @p default_filename
  *          output file in the standard configuration directory.
+ *          If this @ref NetplanState was patched, only the files affected by the
+ *          patch are rewritten, each file is replaced atomically.
  * @param[in]  np_state The @ref NetplanState for which to generate the configuration
  * @param[in]  default_filename Default configuration file; cannot be `NULL` or empty
  * @param[in]  rootdir  If not `NULL`, generate configuration in this root directory (useful for testing)
@@ -174,6 +176,52 @@ netplan_state_iterator_next(NetplanStateIterator* iter);
 NETPLAN_PUBLIC gboolean
 netplan_state_iterator_has_next(const NetplanStateIterator* iter);
 
+/**
+ * @brief   Match all @ref NetplanNetDefinition inside @p np_state against a table of system network interfaces.
+ * @details The match conditions of each @ref NetplanNetDefinition are evaluated once for the whole table,
+ *          with the same semantics as @ref netplan_netdef_match_interface.
+ *          The resulting pairs are ordered by @ref NetplanNetDefinition (in definition order),
+ *          then by interface position.
+ * @param[in]  np_state    The @ref NetplanState to query
+ * @param[in]  ifaces      Table of @ref NetplanInterfaceInfo describing the system network interfaces
+ * @param[in]  n_ifaces    Number of entries in @p ifaces
+ * @param[out] out_matches A pre-allocated array of @ref NetplanInterfaceMatch, owned by the caller
+ * @param[in]  out_size    The maximum number of entries available in @p out_matches
+ * @return                 The number of matches written to @p out_matches.
+ *                         If the array is too small, returns @ref NETPLAN_BUFFER_TOO_SMALL instead.
+ */
+NETPLAN_PUBLIC ssize_t
+netplan_state_match_interfaces(
+        const NetplanState* np_state,
+        const NetplanInterfaceInfo* ifaces,
+        size_t n_ifaces,
+        NetplanInterfaceMatch* out_matches,
+        size_t out_size);
+
+/**
+ * @brief   Regenerate the backend configuration of a single @ref NetplanNetDefinition.
+ * @details Replaces the files written by `netplan generate` for the definition identified by @p netdef_id,
+ *          or removes them if @p netdef_id is no longer part of @p np_state. Definitions linked to it
+ *          (e.g. VLANs, bridge or bond members) are regenerated as well, as is the configuration shared
+ *          by all definitions, such as NetworkManager's `netplan.conf` and the udev rules.
+ *          All other generated files are left alone.
+ * @note    Only definitions rendered by NetworkManager are supported. If any of the affected definitions
+ *          is (or used to be) rendered by systemd-networkd or Open vSwitch, or uses SR-IOV, the
+ *          systemd generator output needs to be updated, too. This fails with
+ *          @ref NETPLAN_ERROR_UNSUPPORTED without touching any file, a full `netplan generate` is needed.
+ * @param[in]  np_state  The @ref NetplanState containing the new configuration
+ * @param[in]  netdef_id The Netplan ID of the changed @ref NetplanNetDefinition
+ * @param[in]  rootdir   If not `NULL`, generate configuration in this root directory (useful for testing)
+ * @param[out] error     Filled with a @ref NetplanError in case of failure
+ * @return               Indication of success or failure
+ */
+NETPLAN_PUBLIC gboolean
+netplan_state_regenerate_netdef(
+        const NetplanState* np_state,
+        const char* netdef_id,
+        const char* rootdir,
+        NetplanError** error);
+
 /**
  * @brief   Write generic NetworkManager configuration to disk.
  * @details This configures global settings, independent of @ref NetplanNetDefinition data, such as udev blocklisting to make NetworkManager ignore certain interfaces using `[device].managed=false` or `NM_MANAGED=0`.
@@ -109,6 +109,26 @@ struct _NetplanStateIterator {
     void* placeholder; ///< Just a placeholder in memory
 };
 
+/**
+ * @brief   Properties of a system network interface, used for matching.
+ * @details See @ref netplan_state_match_interfaces.
+ */
+typedef struct {
+    const char* name;   ///< Current interface name, e.g. `eth0`
+    const char* mac;    ///< MAC address of the interface or `NULL`
+    const char* driver; ///< Name of the kernel driver of the interface or `NULL`
+} NetplanInterfaceInfo;
+
+/**
+ * @brief   A single match between a @ref NetplanNetDefinition and a system network interface.
+ * @details See @ref netplan_state_match_interfaces.
+ */
+typedef struct {
+    const NetplanNetDefinition* netdef; ///< The matching @ref NetplanNetDefinition
+    size_t iface_index;                 ///< Position of the matched interface in the input table
+    gboolean duplicate;                 ///< The interface is matched by more than one @ref NetplanNetDefinition
+} NetplanInterfaceMatch;
+
 /*
  * Errors and error domains
  *
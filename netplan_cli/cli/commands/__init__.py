@@ -15,16 +15,45 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .apply import NetplanApply
-from .generate import NetplanGenerate
-from .ip import NetplanIp
-from .migrate import NetplanMigrate
-from .try_command import NetplanTry
-from .info import NetplanInfo
-from .set import NetplanSet
-from .get import NetplanGet
-from .sriov_rebind import NetplanSriovRebind
-from .status import NetplanStatus
+import importlib
+
+# Registry of the 'netplan' subcommands, in the order of 'netplan help':
+# command ID -> (module, class name, description, testing)
+# A command's module is only imported once it got selected on the command line,
+# so that frequent calls like 'netplan generate' do not need to load yaml, rich,
+# the state/diff modules or the SR-IOV/OVS helpers.
+COMMANDS = {
+    'apply': ('apply', 'NetplanApply', 'Apply current netplan config to running system', False),
+    'generate': ('generate', 'NetplanGenerate',
+                 'Generate backend specific configuration files from /etc/netplan/*.yaml', False),
+    'get': ('get', 'NetplanGet',
+            'Get a setting by specifying a nested key like "ethernets.eth0.addresses", or "all"', False),
+    'info': ('info', 'NetplanInfo', 'Show available features', False),
+    'ip': ('ip', 'NetplanIp', 'Retrieve IP information from the system', False),
+    'migrate': ('migrate', 'NetplanMigrate', 'Migration of /etc/network/interfaces to netplan', True),
+    'set': ('set', 'NetplanSet',
+            'Add new setting by specifying a dotted key=value pair like ethernets.eth0.dhcp4=true', False),
+    'rebind': ('sriov_rebind', 'NetplanSriovRebind',
+               'Rebind SR-IOV virtual functions of given physical functions to their driver', False),
+    'status': ('status', 'NetplanStatus', 'Query networking state of the running system', False),
+    'try': ('try_command', 'NetplanTry',
+            'Try to apply a new netplan config to running system, with automatic rollback', False),
+}
+
+
+def load_command(command_id: str):
+    '''Import the module implementing a subcommand and return its class'''
+    module, class_name, _, _ = COMMANDS[command_id]
+    return getattr(importlib.import_module('.' + module, __name__), class_name)
+
+
+def __getattr__(name: str):
+    # Keep 'from netplan_cli.cli.commands import NetplanApply' working
+    for command_id, (_, class_name, _, _) in COMMANDS.items():
+        if class_name == name:
+            return load_command(command_id)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
 
 __all__ = [
     'NetplanApply',
@@ -27,6 +27,7 @@ import subprocess
 import shutil
 import time
 
+from .. import trace
 from .. import utils
 from ...configmanager import ConfigManager, ConfigurationError
 from ..sriov import apply_sriov_config
@@ -55,12 +56,16 @@ class NetplanApply(utils.NetplanCommand):
                                  help='Only clean up old OpenVSwitch interfaces and exit')
         self.parser.add_argument('--state',
                                  help='Directory containing previous YAML configuration')
+        self.parser.add_argument('--trace', metavar='FILE',
+                                 help='Record the timing of all phases into FILE (Chrome trace format)')
 
         self.func = self.command_apply
 
         self.parse_args()
+        trace.start(self.trace)
         self.run_command()
 
+    @trace.span('apply')
     def command_apply(self, run_generate=True, sync=False, exit_on_error=True, state_dir=None):  # pragma: nocover
         config_manager = ConfigManager()
         if state_dir:
@@ -115,7 +120,8 @@ class NetplanApply(utils.NetplanCommand):
             old_ovs_glob.remove(ovs_cleanup_service)
         old_files_ovs = bool(old_ovs_glob)
         old_nm_glob = glob.glob('/run/NetworkManager/system-connections/netplan-*')
-        nm_ifaces = NetplanApply._get_nm_interfaces(old_nm_glob, utils.get_interfaces(), exit_on_error)
+        old_nm_ifaces = NetplanApply._get_nm_interfaces(old_nm_glob, utils.get_interfaces(), exit_on_error)
+        old_nm_profiles = NetplanApply._read_nm_profiles(old_nm_glob)
         old_files_nm = bool(old_nm_glob)
 
         configure = []
@@ -125,6 +131,7 @@ class NetplanApply(utils.NetplanCommand):
             configure_out = subprocess.STDOUT
 
         configure.append(utils.get_configure_path())
+        phase = trace.mark()
         if run_generate:
             logging.debug('command configure: running %s', configure)
             if subprocess.call(configure, stderr=configure_out) != 0:
@@ -135,7 +142,9 @@ class NetplanApply(utils.NetplanCommand):
             # Running 'systemctl daemon-reload' will re-run the netplan systemd generator.
             logging.debug('executing Netplan systemd-generator via daemon-reload')
             utils.systemctl_daemon_reload()
+        trace.record('apply: generate', phase)
 
+        phase = trace.mark()
         devices = utils.get_interfaces()
 
         # Re-start service when
@@ -157,10 +166,22 @@ class NetplanApply(utils.NetplanCommand):
             restart_networkd = True
 
         restart_nm_glob = glob.glob('/run/NetworkManager/system-connections/netplan-*')
-        nm_ifaces.update(NetplanApply._get_nm_interfaces(restart_nm_glob, devices, exit_on_error))
+        new_nm_ifaces = NetplanApply._get_nm_interfaces(restart_nm_glob, devices, exit_on_error)
+        nm_ifaces = old_nm_ifaces | new_nm_ifaces
         restart_nm = bool(restart_nm_glob)
         if not restart_nm and old_files_nm:
             restart_nm = True
+        # Instead of restarting NM, try to reload its connection profiles and
+        # (re-)activate only the changed ones. This is not possible if an
+        # interface is handed over between NM and another backend, as NM's
+        # runtime device state needs to be reset in that case.
+        changed_nm_profiles = []
+        reload_nm = False
+        if restart_nm and old_nm_ifaces == new_nm_ifaces and utils.nm_running():
+            nm_profiles = NetplanApply._read_nm_profiles(restart_nm_glob)
+            changed_nm_profiles = [path for path in sorted(nm_profiles)
+                                   if old_nm_profiles.get(path) != nm_profiles[path]]
+            reload_nm = True
 
         # stop backends
         if restart_networkd:
@@ -173,26 +194,19 @@ class NetplanApply(utils.NetplanCommand):
             logging.debug('no netplan generated networkd configuration exists')
 
         loopback_connection = ''
-        if restart_nm:
+        if restart_nm and reload_nm:
+            logging.debug('netplan generated NM configuration changed, reloading NM connections')
+        elif restart_nm:
             logging.debug('netplan generated NM configuration changed, restarting NM')
             if utils.nm_running():
-                if 'lo' in nm_ifaces:
-                    loopback_connection = utils.nm_get_connection_for_interface('lo')
-                # restarting NM does not cause new config to be applied, need to shut down devices first
-                for device in devices:
-                    if device not in nm_ifaces:
-                        continue  # do not touch this interface
-                    # ignore failures here -- some/many devices might not be managed by NM
-                    try:
-                        utils.nmcli(['device', 'disconnect', device])
-                    except subprocess.CalledProcessError:
-                        pass
-
-                utils.systemctl_network_manager('stop', sync=sync)
+                loopback_connection = NetplanApply.stop_nm(devices, nm_ifaces, sync)
         else:
             logging.debug('no netplan generated NM configuration exists')
 
+        trace.record('apply: stop backends', phase)
+
         # Refresh devices now; restarting a backend might have made something appear.
+        phase = trace.mark()
         devices = utils.get_interfaces()
 
         # evaluate config for extra steps we need to take (like renaming)
@@ -207,12 +221,14 @@ class NetplanApply(utils.NetplanCommand):
             prev_links = cm.virtual_interfaces.keys()
             curr_links = config_manager.virtual_interfaces.keys()
             NetplanApply.clear_virtual_links(prev_links, curr_links, devices)
+        trace.record('apply: link changes', phase)
 
         # if the interface is up, we can still apply some .link file changes
         # but we cannot apply the interface rename via udev, as it won't touch
         # the interface name, if it was already renamed once (e.g. during boot),
         # because of the NamePolicy=keep default:
         # https://www.freedesktop.org/software/systemd/man/systemd.net-naming-scheme.html
+        phase = trace.mark()
         devices = utils.get_interfaces()
         for device in devices:
             logging.debug('netplan triggering .link rules for %s', device)
@@ -260,11 +276,13 @@ class NetplanApply(utils.NetplanCommand):
             # udevadm trigger returns 1 if it cannot trigger devices since
             # systemd v248, e.g. in containers (LP: #2095203)
             logging.warning('Ignoring device trigger error: {}'.format(e))
+        trace.record('apply: udev', phase)
 
         # apply any SR-IOV related changes, if applicable
         NetplanApply.process_sriov_config(config_manager, exit_on_error)
 
         # (re)set global regulatory domain
+        phase = trace.mark()
         if os.path.exists(self.generator_late_dir + 'netplan-regdom.service'):
             utils.systemctl('start', ['netplan-regdom.service'])
         # (re)start backends
@@ -286,7 +304,11 @@ class NetplanApply(utils.NetplanCommand):
             utils.systemctl('start', [OVS_CLEANUP_SERVICE], sync=True)
             # 2nd: start all other services
             utils.systemctl('start', netplan_wpa + netplan_ovs, sync=True)
-        if restart_nm:
+        if reload_nm and not NetplanApply.process_nm_reload(changed_nm_profiles):
+            logging.warning('Falling back to a hard restart of NetworkManager')
+            loopback_connection = NetplanApply.stop_nm(devices, nm_ifaces, sync)
+            reload_nm = False
+        if restart_nm and not reload_nm:
             # Flush all IP addresses of NM managed interfaces, to avoid NM creating
             # new, non netplan-* connection profiles, using the existing IPs.
             nm_interfaces = NetplanApply._get_nm_interfaces(restart_nm_glob, devices, exit_on_error)
@@ -326,6 +348,140 @@ class NetplanApply(utils.NetplanCommand):
             # connection with nmcli for example, NM will create a persistent nmconnection file and emit a YAML for it.
             if 'lo' in nm_interfaces and loopback_connection:
                 utils.nm_bring_interface_up(loopback_connection)
+        trace.record('apply: start backends', phase)
+
+    @staticmethod
+    def stop_nm(devices, nm_ifaces, sync=False):  # pragma: nocover (covered in autopkgtest)
+        '''
+        Disconnect all NM managed devices and stop NetworkManager.
+        Returns the connection active on 'lo', so it can be brought up again.
+        '''
+        loopback_connection = ''
+        if 'lo' in nm_ifaces:
+            loopback_connection = utils.nm_get_connection_for_interface('lo')
+        # restarting NM does not cause new config to be applied, need to shut down devices first
+        for device in devices:
+            if device not in nm_ifaces:
+                continue  # do not touch this interface
+            # ignore failures here -- some/many devices might not be managed by NM
+            try:
+                utils.nmcli(['device', 'disconnect', device])
+            except subprocess.CalledProcessError:
+                pass
+
+        utils.systemctl_network_manager('stop', sync=sync)
+        return loopback_connection
+
+    @staticmethod
+    def process_nm_reload(changed_profiles):
+        '''
+        Make NetworkManager reload its connection profiles from disk and bring
+        the changed netplan-*.nmconnection profiles into effect, without
+        disrupting any other connections. Only profiles that are active
+        already get reapplied (on the same device), all other profiles are left
+        to NM's autoconnect logic, just like after a restart of NetworkManager.
+        Returns False if a full restart of NetworkManager is needed instead.
+        '''
+        try:
+            active = utils.nm_active_connections()
+            utils.nm_reload_connections()
+            for path in changed_profiles:
+                settings = utils.nm_keyfile_connection(path)
+                uuid = settings.get('uuid')
+                if not uuid:
+                    logging.debug('Cannot reload NM profile without UUID: %s', path)
+                    return False
+                if uuid not in active:
+                    logging.debug('NM connection %s is not active, leaving it to autoconnect', uuid)
+                    continue
+                logging.debug('netplan reapplying NM connection %s on %s', uuid, active[uuid])
+                utils.nm_reapply_connection(uuid, active[uuid])
+        except (OSError, RuntimeError, ValueError, subprocess.CalledProcessError) as e:
+            logging.debug('Cannot reload NM connections: %s', e)
+            return False
+        return True
+
+    @staticmethod
+    def process_fast_revert(changed_files, tried_interfaces, np_states=()):
+        '''
+        Bring a reverted backend configuration into effect, by reconfiguring
+        only the interfaces touched by the changed_files (as reported by
+        ConfigManager.changed_files()), instead of restarting the backends.
+        tried_interfaces are the interfaces matched by those files before the
+        revert, np_states the netplan states involved (the tried one, plus the
+        reverted one if its YAML is known; None if a state could not be parsed).
+        Returns False if a full 'netplan apply' is needed instead.
+        '''
+        # Open vSwitch, wifi and SR-IOV are set up outside of the backends
+        try:
+            if any(np_state is None or NetplanApply._has_special_setup(np_state) for np_state in np_states):
+                return False
+        except utils.config_errors as e:
+            logging.debug('Cannot inspect the netplan config: %s', e)
+            return False
+        networkd = [path for path in changed_files if path.endswith('.network')]
+        nm = [path for path in changed_files if path.endswith('.nmconnection')]
+        # Virtual devices, links or NM profiles that come and go need the full treatment
+        if len(networkd) + len(nm) != len(changed_files) or not all(os.path.isfile(path) for path in nm):
+            return False
+        interfaces = NetplanApply._networkd_match_names(networkd)
+        if interfaces is None or tried_interfaces is None:
+            return False
+        interfaces |= tried_interfaces
+        if networkd:
+            try:
+                utils.networkctl_reload()
+                devices = utils.get_interfaces()
+                utils.networkctl_reconfigure(sorted(iface for iface in interfaces if iface in devices))
+            except subprocess.CalledProcessError as e:
+                logging.debug('Cannot reconfigure networkd interfaces: %s', e)
+                return False
+        if nm and (not utils.nm_running() or not NetplanApply.process_nm_reload(nm)):
+            return False
+        return True
+
+    @staticmethod
+    def _has_special_setup(np_state):
+        '''
+        Check if np_state contains Open vSwitch, wifi or SR-IOV definitions,
+        which are configured by 'netplan apply' itself (ovs-vsctl, wpa_supplicant,
+        sysfs), not just by reloading the backend configuration.
+        '''
+        if np_state.ovs_ports or np_state.wifis:
+            return True
+        for netdef in np_state.netdefs.values():
+            if (netdef.backend == 'OpenVSwitch' or netdef.links.get('sriov')
+                    or netdef._embedded_switch_mode or netdef._vf_count):
+                return True
+        return False
+
+    @staticmethod
+    def _networkd_match_names(paths):
+        '''
+        Collect the interface names matched by the existing systemd-networkd
+        .network files in paths. Returns None if any of them does not match
+        by plain interface names.
+        '''
+        names = set()
+        for path in paths:
+            if not path.endswith('.network') or not os.path.isfile(path):
+                continue
+            section = None
+            matched = False
+            with open(path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith('['):
+                        section = line
+                    elif section == '[Match]' and line.startswith('Name='):
+                        for name in line[len('Name='):].split():
+                            if any(c in name for c in '*?[!'):
+                                return None
+                            names.add(name)
+                            matched = True
+            if not matched:
+                return None
+        return names
 
     @staticmethod
     def clear_virtual_links(prev_links, curr_links, devices=[]):
@@ -361,6 +517,7 @@ class NetplanApply(utils.NetplanCommand):
         """
 
         changes = {}
+        matches = None
 
         # Find physical interfaces which need a rename
         # But do not rename virtual interfaces
@@ -371,7 +528,9 @@ class NetplanApply(utils.NetplanCommand):
             if not netdef._has_match:
                 continue  # Skip if no match for current name is given
             # Find current name of the interface, according to match conditions and globs (name, mac, driver)
-            current_iface_name = utils.find_matching_iface(interfaces, netdef)
+            if matches is None:
+                matches = utils.match_interfaces(interfaces, config_manager.np_state)
+            current_iface_name = utils.find_matching_iface(interfaces, netdef, matches)
             if not current_iface_name:
                 logging.warning('Cannot find unique matching interface for {}'.format(netdef.id))
                 continue
@@ -413,6 +572,17 @@ class NetplanApply(utils.NetplanCommand):
         except OvsDbServerNotInstalled as e:
             logging.debug('Cannot call Open vSwitch: %s.', e)
 
+    @staticmethod
+    def _read_nm_profiles(paths):
+        profiles = {}
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    profiles[path] = f.read()
+            except OSError as e:
+                logging.debug('Cannot read NM profile %s: %s', path, e)
+        return profiles
+
     @staticmethod
     def _get_nm_interfaces(paths, devices, exit_on_error):
         try:
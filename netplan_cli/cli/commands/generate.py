@@ -17,14 +17,24 @@
 
 '''netplan generate command line'''
 
+import contextlib
+import fcntl
+import json
 import logging
 import os
 import sys
 import subprocess
 import shutil
+import time
 
+import netplan
+
+from .. import trace
 from .. import utils
 
+# Requests arriving this shortly after a coalesced run finished are merged into a single follow-up run
+COALESCE_WINDOW_SEC = 0.5
+
 
 class NetplanGenerate(utils.NetplanCommand):
 
@@ -39,13 +49,22 @@ class NetplanGenerate(utils.NetplanCommand):
                                  help='Search for and generate configuration files in this root directory instead of /')
         self.parser.add_argument('--mapping',
                                  help='Display the netplan device ID/backend/interface name mapping and exit.')
+        self.parser.add_argument('--trace', metavar='FILE',
+                                 help='Record the timing of all phases into FILE (Chrome trace format)')
+        mode = self.parser.add_mutually_exclusive_group()
+        mode.add_argument('--coalesce', action='store_true',
+                          help='Merge this request with concurrent or back-to-back calls into a single run')
+        mode.add_argument('--only', metavar='NETDEF_ID',
+                          help='Only regenerate the configuration of this netdef, if possible')
 
         self.func = self.command_generate
         self._rootdir = '/'
 
         self.parse_args()
+        trace.start(self.trace)
         self.run_command()
 
+    @trace.span('generate')
     def command_generate(self):
         # if we are inside a snap, then call dbus to run netplan apply instead
         if "SNAP" in os.environ:
@@ -87,7 +106,18 @@ class NetplanGenerate(utils.NetplanCommand):
         if self.mapping:  # XXX: get rid of the legacy "--mapping" option
             argv[0] = utils.get_generator_path()
             res = subprocess.call(argv)
-        elif os.path.isfile(self._netplan_try_stamp):
+        elif self.only:
+            res = self._generate_only(argv)
+        elif self.coalesce:
+            res = self._coalesce(lambda: self._generate(argv))
+        else:
+            res = self._generate(argv)
+
+        # FIXME: os.execv(argv[0], argv) would be better but fails coverage
+        sys.exit(res)
+
+    def _generate(self, argv) -> int:
+        if os.path.isfile(self._netplan_try_stamp):
             # Avoid calling the Netplan generator if 'netplan try' is restoring
             # a previous configuration. See https://github.com/canonical/netplan/pull/548
             # This is especially relevant when NetworkManager is calling 'netplan generate'
@@ -132,6 +162,80 @@ class NetplanGenerate(utils.NetplanCommand):
                 subprocess.check_call(['udevadm', 'control', '--reload'])
             except subprocess.CalledProcessError as e:
                 logging.debug(f'Could not call "udevadm control --reload": {str(e)}')
+        return res
 
-        # FIXME: os.execv(argv[0], argv) would be better but fails coverage
-        sys.exit(res)
+    def _generate_only(self, argv) -> int:
+        '''
+        Rewrite the backend configuration of the netdef given by --only (and the netdefs linked to it),
+        without touching any other output nor reloading systemd. Falls back to a full run if the
+        systemd generator output is affected, too.
+        '''
+        if os.path.isfile(self._netplan_try_stamp):
+            return self._generate(argv)  # skipped, see above
+
+        parser = netplan.Parser()
+        parser.load_yaml_hierarchy(self._rootdir)
+        np_state = netplan.State()
+        np_state.import_parser_results(parser)
+        if not np_state._regenerate_netdef(self.only, self.root_dir):
+            logging.debug('Cannot regenerate %s on its own, running a full generate', self.only)
+            return self._generate(argv)
+
+        try:
+            subprocess.check_call(['udevadm', 'control', '--reload'])
+        except subprocess.CalledProcessError as e:
+            logging.debug(f'Could not call "udevadm control --reload": {str(e)}')
+        return 0
+
+    def _coalesce(self, generate) -> int:
+        '''
+        Call generate() under the run/netplan/netplan-generate.lock, merging all requests which arrive
+        while another run is ongoing or within COALESCE_WINDOW_SEC after it into a single follow-up run.
+        Each request draws a ticket from the run/netplan/netplan-generate.pending counter and returns
+        the exit code of the first run that started after its ticket was drawn.
+        '''
+        rundir = os.path.join(self._rootdir, 'run', 'netplan')
+        os.makedirs(rundir, mode=0o700, exist_ok=True)
+        pending = os.path.join(rundir, 'netplan-generate.pending')
+        with self._pending_state(pending) as state:
+            state['requested'] += 1
+            ticket = state['requested']
+
+        lock_fd = os.open(os.path.join(rundir, 'netplan-generate.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            with self._pending_state(pending) as state:
+                if state['done'] >= ticket:
+                    logging.debug('Generate request #%d was covered by a concurrent run (up to #%d)',
+                                  ticket, state['done'])
+                    return state['result']
+                # the monotonic clock starts over at boot, along with the content of /run
+                delay = min(state['finished'] + COALESCE_WINDOW_SEC - time.monotonic(), COALESCE_WINDOW_SEC)
+            if delay > 0:
+                time.sleep(delay)  # give back-to-back requests the chance to be covered by this run
+
+            with self._pending_state(pending) as state:
+                covered = state['requested']
+            res = generate()
+            with self._pending_state(pending) as state:
+                state.update(done=covered, result=res, finished=time.monotonic())
+            return res
+        finally:
+            os.close(lock_fd)  # releases the lock
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _pending_state(path):
+        '''Read-modify-write the coalescing counters, while holding a lock on their file'''
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            state = {'requested': 0, 'done': 0, 'result': 0, 'finished': 0.0}
+            try:
+                state.update(json.load(f))
+            except ValueError:  # new (empty) or corrupted file, start over
+                pass
+            yield state
+            f.seek(0)
+            f.truncate()
+            json.dump(state, f)
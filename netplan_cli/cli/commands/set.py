@@ -17,9 +17,14 @@
 
 '''netplan set command line'''
 
+import argparse
+import contextlib
 import tempfile
 import re
 import io
+from typing import IO, List, Tuple
+
+import yaml
 
 from ..utils import NetplanCommand
 import netplan
@@ -36,8 +41,12 @@ class NetplanSet(NetplanCommand):
                          leaf=True)
 
     def run(self):
-        self.parser.add_argument('key_value', type=str,
-                                 help='The nested key=value pair in dotted format. Value can be NULL to delete a key.')
+        self.parser.add_argument('key_value', type=str, nargs='*',
+                                 help='The nested key=value pair in dotted format. Value can be NULL to delete a key. \
+                                       Multiple pairs are applied together, in a single step.')
+        self.parser.add_argument('--patch', type=argparse.FileType('r'),
+                                 help='Apply a YAML (or JSON) document, in the format of the configuration files, \
+                                       together with any key=value pairs. Use - to read it from stdin.')
         self.parser.add_argument('--origin-hint', type=str,
                                  help='Can be used to help choose a name for the overwrite YAML file. \
                                        A .yaml suffix will be appended automatically.')
@@ -49,14 +58,8 @@ class NetplanSet(NetplanCommand):
         self.parse_args()
         self.run_command()
 
-    def command_set(self):
-        if self.origin_hint is not None and len(self.origin_hint) == 0:
-            raise Exception('Invalid/empty origin-hint')
-        if self.origin_hint:
-            filename = '.'.join((self.origin_hint, 'yaml'))
-        else:
-            filename = None
-        split = self.key_value.split('=', 1)
+    def _key_value_patch(self, key_value: str) -> Tuple[List[str], str]:
+        split = key_value.split('=', 1)
         if len(split) != 2:
             raise Exception('Invalid value specified')
 
@@ -66,58 +69,64 @@ class NetplanSet(NetplanCommand):
 
         # Split the string into a list on the dot separators, and unescape the remaining dots
         yaml_path = [s.replace(r'\.', '.') for s in re.split(r'(?<!\\)\.', key)]
+        return yaml_path, value
 
-        parser = netplan.Parser()
-        with tempfile.TemporaryFile() as tmp:
-            netplan._create_yaml_patch(yaml_path, value, tmp)
-            tmp.flush()
-
-            # Load fields that are about to be deleted (e.g. some.setting=NULL)
-            # Ignore those fields when parsing subsequent YAML files
-            tmp.seek(0, io.SEEK_SET)
-            parser.load_nullable_fields(tmp)
-
-            # Parse the full, existing YAML config hierarchy
-            parser.load_yaml_hierarchy(self.root_dir)
+    def _document_patch(self, document: str) -> Tuple[List[str], str]:
+        data = yaml.safe_load(document)
+        if not isinstance(data, dict):
+            raise Exception('Invalid patch document, expected a mapping')
+        # The 'network:' top-level key is optional
+        return ([] if 'network' in data else ['network']), document
 
-            # Load YAML patch, containing our update (new or deleted settings)
-            tmp.seek(0, io.SEEK_SET)
-            parser.load_yaml(tmp)
+    def command_set(self):
+        if self.origin_hint is not None and len(self.origin_hint) == 0:
+            raise Exception('Invalid/empty origin-hint')
+        if self.origin_hint:
+            filename = '.'.join((self.origin_hint, 'yaml'))
+        else:
+            filename = None
 
-            # Validate the final parser state
+        patches = [self._key_value_patch(key_value) for key_value in self.key_value]
+        if self.patch:
+            with self.patch:
+                patches.append(self._document_patch(self.patch.read()))
+        if not patches:
+            raise Exception('No key=value pair or patch document specified')
+
+        with contextlib.ExitStack() as stack:
+            tmps = []
+            for yaml_path, value in patches:
+                tmp = stack.enter_context(tempfile.TemporaryFile())
+                netplan._create_yaml_patch(yaml_path, value, tmp)
+                tmp.flush()
+                tmps.append(tmp)
+
+            # Parse all the patches in one go and validate the final parser
+            # state, so nothing is written if any of them is invalid
+            parser = netplan.Parser()
+            self._load_patches(parser, tmps)
             state = netplan.State()
             state.import_parser_results(parser)
 
-            if filename:  # only act on the output file (a.k.a. "origin-hint")
+            if filename and not self._overrides_other_files(state, tmps, filename):
+                # The netdefs touched by the patches are defined in the output
+                # file (a.k.a. "origin-hint") only, if at all, so we can
+                # write it from the validated state directly.
+                state._write_yaml_file(filename, self.root_dir)
+            elif filename:  # only act on the output file (a.k.a. "origin-hint")
                 parser_output_file = netplan.Parser()
 
-                # Load fields that are about to be deleted ("some.setting=NULL")
-                # Ignore those fields when parsing subsequent YAML files
-                tmp.seek(0, io.SEEK_SET)
-                parser_output_file.load_nullable_fields(tmp)
-
-                # Load globals/netdefs that are to be ignored from the existing
-                # YAML hierarchy, as our patch is supposed to override settings
-                # in those netdefs via the output file.
-                # Those netdefs and globals must end up in the output file
-                # (a.k.a. "origin-hint", <filename>), have they been defined in
-                # pre-existing YAML files or not.
-                tmp.seek(0, io.SEEK_SET)
-                parser_output_file._load_nullable_overrides(tmp, constraint=filename)
-
-                # Parse the full YAML hierarchy and new patch, ignoring any
+                # Parse the full YAML hierarchy and new patches, ignoring any
                 # nullable overrides (netdefs/globals) from pre-existing files
                 # and ignoring any nullable fields (settings to be deleted).
                 # This way we can avoid updates to certain netdefs/globals to be
                 # redirected into existing YAML files (defining those same
                 # stanzas) or ignored, but have them written out to the single
                 # output file.
-                # XXX: The origin file of each individual YAML setting/stanza
-                #      should be tracked individually, to avoid this
-                #      double-parsing workaround (LP: #2003727)
-                parser_output_file.load_yaml_hierarchy(self.root_dir)
-                tmp.seek(0, io.SEEK_SET)
-                parser_output_file.load_yaml(tmp)
+                # XXX: This double-parsing is only needed if netdefs of the
+                #      patches are defined in other YAML files, too, as the
+                #      origin files are tracked per netdef (LP: #2003727)
+                self._load_patches(parser_output_file, tmps, filename)
 
                 # Import the partial parser state, ignoring duplicated netdefs
                 # from pre-existing YAML files, so we can force write the patch
@@ -127,3 +136,34 @@ class NetplanSet(NetplanCommand):
                 state_output_file._write_yaml_file(filename, self.root_dir)
             else:
                 state._update_yaml_hierarchy(FALLBACK_FILENAME, self.root_dir)
+
+    def _overrides_other_files(self, state: netplan.State, tmps: List[IO], filename: str) -> bool:
+        for tmp in tmps:
+            tmp.seek(0, io.SEEK_SET)
+            if state._patch_overrides_other_files(tmp, filename):
+                return True
+        return False
+
+    def _load_patches(self, parser: netplan.Parser, tmps: List[IO], filename: str = None):
+        for tmp in tmps:
+            # Load fields that are about to be deleted (e.g. some.setting=NULL)
+            # Ignore those fields when parsing subsequent YAML files
+            tmp.seek(0, io.SEEK_SET)
+            parser.load_nullable_fields(tmp)
+            if filename:
+                # Load globals/netdefs that are to be ignored from the existing
+                # YAML hierarchy, as our patch is supposed to override settings
+                # in those netdefs via the output file.
+                # Those netdefs and globals must end up in the output file
+                # (a.k.a. "origin-hint", <filename>), have they been defined in
+                # pre-existing YAML files or not.
+                tmp.seek(0, io.SEEK_SET)
+                parser._load_nullable_overrides(tmp, constraint=filename)
+
+        # Parse the full, existing YAML config hierarchy
+        parser.load_yaml_hierarchy(self.root_dir)
+
+        # Load YAML patches, containing our updates (new or deleted settings)
+        for tmp in tmps:
+            tmp.seek(0, io.SEEK_SET)
+            parser.load_yaml(tmp)
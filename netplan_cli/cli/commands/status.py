@@ -20,16 +20,22 @@
 import json
 import logging
 import re
+import selectors
+import sys
+import time
 from netplan.netdef import NetplanRoute
 
 import yaml
 
 from .. import utils
+from ..monitor import DBusMonitor, RtnlMonitor
 from ..state import NetplanConfigState, SystemConfigState, JSON
 from ..state_diff import DiffJSONEncoder, NetplanDiffState
 
 
 MATCH_TAGS = re.compile(r'\[([a-z0-9]+)\].*\[\/\1\]')
+# Time (in seconds) to collect related events in --watch mode, before updating the state
+WATCH_SETTLE_TIME = 0.2
 RICH_OUTPUT = False
 try:
     from rich.console import Console
@@ -54,6 +60,7 @@ class NetplanStatus(utils.NetplanCommand):
                          leaf=True)
         self.all = False
         self.state_diff = None
+        self.diff_state = None
         self.route_lookup_table_names = {}
 
     def run(self):
@@ -71,6 +78,8 @@ class NetplanStatus(utils.NetplanCommand):
                                  help='Only show the differences between the system\'s and netplan\'s states')
         self.parser.add_argument('--root-dir',
                                  help='Search for configuration files in this root directory instead of /')
+        self.parser.add_argument('-w', '--watch', action='store_true',
+                                 help='Keep watching for changes of the networking state')
 
         self.func = self.command
         self.parse_args()
@@ -107,42 +116,48 @@ class NetplanStatus(utils.NetplanCommand):
 
         return pprint
 
-    def _get_interface_diff(self, ifname) -> dict:
+    def _lookup_interface_diff(self, ifname) -> dict:
+        if self.state_diff:
+            return self.state_diff['interfaces'].get(ifname)
+        if self.diff_state:
+            # compare only the interfaces that are actually displayed
+            return self.diff_state.diff_for(ifname)
+        return None
+
+    def _lookup_missing_interfaces(self, key: str) -> dict:
         if self.state_diff:
-            if diff := self.state_diff['interfaces'].get(ifname):
-                if diff.get('system_state') or diff.get('netplan_state'):
-                    return diff
+            return self.state_diff.get(key, {})
+        if self.diff_state:
+            return self.diff_state.get_missing_interfaces(self.ifname or '')[key]
+        return {}
+
+    def _get_interface_diff(self, ifname) -> dict:
+        if diff := self._lookup_interface_diff(ifname):
+            if diff.get('system_state') or diff.get('netplan_state'):
+                return diff
         return {}
 
     def _is_interface_missing_in_netplan(self, ifname) -> bool:
-        if self.state_diff:
-            if missing := self.state_diff.get('missing_interfaces_netplan'):
-                if ifname in missing:
-                    return True
-        return False
+        return ifname in self._lookup_missing_interfaces('missing_interfaces_netplan')
 
     def _get_missing_property_list(self, ifname: str, state: str, property: str) -> list[str]:
-        if self.state_diff:
-            if diff := self.state_diff['interfaces'].get(ifname):
-                return diff.get(state, {}).get(property, [])
+        if diff := self._lookup_interface_diff(ifname):
+            return diff.get(state, {}).get(property, [])
         return []
 
     def _get_missing_property_str(self, ifname: str, state: str, property: str) -> str:
-        if self.state_diff:
-            if diff := self.state_diff['interfaces'].get(ifname):
-                return diff.get(state, {}).get(property, '')
+        if diff := self._lookup_interface_diff(ifname):
+            return diff.get(state, {}).get(property, '')
         return ''
 
     def _get_missing_property_set(self, ifname: str, state: str, property: str) -> set:
-        if self.state_diff:
-            if diff := self.state_diff['interfaces'].get(ifname):
-                return diff.get(state, {}).get(property, set())
+        if diff := self._lookup_interface_diff(ifname):
+            return diff.get(state, {}).get(property, set())
         return set()
 
     def _get_missing_property_bool(self, ifname: str, state: str, property: str) -> bool:
-        if self.state_diff:
-            if diff := self.state_diff['interfaces'].get(ifname):
-                return diff.get(state, {}).get(property, False)
+        if diff := self._lookup_interface_diff(ifname):
+            return diff.get(state, {}).get(property, False)
         return False
 
     def _get_missing_netplan_addresses(self, ifname) -> list[str]:
@@ -200,17 +215,14 @@ class NetplanStatus(utils.NetplanCommand):
         return self._get_missing_property_list(ifname, 'system_state', 'missing_interfaces')
 
     def _get_missing_system_interfaces(self) -> dict:
-        if self.state_diff:
-            return self.state_diff.get('missing_interfaces_system', {})
-        return {}
+        return self._lookup_missing_interfaces('missing_interfaces_system')
 
     def _has_diff(self, ifname) -> bool:
         if self._is_interface_missing_in_netplan(ifname):
             return True
-        if self.state_diff:
-            if diff := self.state_diff['interfaces'].get(ifname):
-                if diff.get('system_state') or diff.get('netplan_state'):
-                    return True
+        if diff := self._lookup_interface_diff(ifname):
+            if diff.get('system_state') or diff.get('netplan_state'):
+                return True
         return False
 
     def _display_global_state(self, data):
@@ -779,8 +791,12 @@ class NetplanStatus(utils.NetplanCommand):
         # Per interface
         interfaces = [(key, data[key]) for key in data if key != 'netplan-global-state']
         if self.diff_only:
-            # in diff-only mode we filter out interfaces that don't have any diff
-            interfaces = list(filter(lambda i: self._has_diff(i[0]), interfaces))
+            if self.diff_state and not self.ifname and not self.diff_state.has_any_diff():
+                return
+            # in diff-only mode we filter out interfaces that don't have any diff,
+            # comparing only the selected one if we called netplan status for a single interface
+            interfaces = list(filter(lambda i: (not self.ifname or self.ifname == i[0]) and self._has_diff(i[0]),
+                                     interfaces))
 
         missing_interfaces = self._get_missing_system_interfaces()
         for index, (ifname, ifconfig) in enumerate(interfaces, 1):
@@ -826,27 +842,93 @@ class NetplanStatus(utils.NetplanCommand):
         if self.diff:
             self.all = True
 
+        if self.watch and self.diff:
+            logging.error('--watch cannot be combined with --diff or --diff-only')
+            sys.exit(1)
+
         system_state = SystemConfigState(self.ifname, self.all)
 
         output_format = self.format.lower()
 
+        if self.watch:
+            self.watch_state(system_state, output_format)
+            return
+
         if self.diff:
             netplan_state = NetplanConfigState(rootdir=self.root_dir)
             diff_state = NetplanDiffState(system_state, netplan_state)
 
-            self.state_diff = diff_state.get_diff(self.ifname)
-
             if output_format == 'json':
-                print(json.dumps(self.state_diff, cls=DiffJSONEncoder))
+                print(json.dumps(diff_state.get_diff(self.ifname), cls=DiffJSONEncoder))
                 return
             elif output_format == 'yaml':
-                serialized = json.dumps(self.state_diff, cls=DiffJSONEncoder)
+                serialized = json.dumps(diff_state.get_diff(self.ifname), cls=DiffJSONEncoder)
                 print(yaml.dump(json.loads(serialized)))
                 return
 
+            # The human readable output compares the interfaces on demand, as they are displayed
+            self.diff_state = diff_state
+
         if output_format == 'json':  # structural JSON output
             print(json.dumps(system_state.get_data()))
         elif output_format == 'yaml':  # stuctural YAML output
             print(yaml.dump(system_state.get_data()))
         else:  # pretty print, human readable output
             self.pretty_print(system_state.get_data(), system_state.number_of_interfaces)
+
+    def _display_changes(self, system_state: SystemConfigState, changes: JSON, output_format: str) -> None:
+        if output_format == 'json':  # JSON lines of the changed entries
+            print(json.dumps(changes), flush=True)
+        elif output_format == 'yaml':  # YAML documents of the changed entries
+            print(yaml.dump(changes, explicit_start=True), end='', flush=True)
+        else:  # redraw the human readable output
+            if sys.stdout.isatty():
+                print('\033[H\033[2J', end='')  # clear the terminal
+            self.pretty_print(system_state.get_data(), system_state.number_of_interfaces)
+            sys.stdout.flush()
+
+    def watch_state(self, system_state: SystemConfigState, output_format: str) -> None:
+        '''
+        Display the state, then wait for rtnetlink and D-Bus events and update
+        the output whenever the state changes. The first JSON/YAML output contains
+        the full state, the following ones only the changed entries.
+        '''
+        monitors = [RtnlMonitor()]
+        try:
+            monitors.append(DBusMonitor())
+        except Exception as e:
+            logging.debug('Cannot monitor D-Bus property changes: {}'.format(str(e)))
+
+        self._display_changes(system_state, system_state.get_data(), output_format)
+        with selectors.DefaultSelector() as selector:
+            for monitor in monitors:
+                selector.register(monitor, selectors.EVENT_READ)
+            try:
+                sources = set()
+                deadline = None
+                while True:
+                    # Sleep until anything relevant happens, then collect the related
+                    # events for a moment. Steady traffic must not delay the update
+                    # beyond the settle deadline.
+                    timeout = None
+                    if deadline is not None:
+                        timeout = deadline - time.monotonic()
+                        if timeout <= 0:
+                            logging.debug('Updating the state of: {}'.format(', '.join(sorted(sources))))
+                            if changes := system_state.refresh(sources):
+                                self._display_changes(system_state, changes, output_format)
+                            sources = set()
+                            deadline = None
+                            continue
+                    for key, _ in selector.select(timeout):
+                        if (affected := key.fileobj.read()) is None:
+                            selector.unregister(key.fileobj)
+                        elif affected:  # filtered events (e.g. foreign routes) don't count
+                            if deadline is None:
+                                deadline = time.monotonic() + WATCH_SETTLE_TIME
+                            sources.update(affected)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                for monitor in monitors:
+                    monitor.close()
@@ -140,12 +140,29 @@ class NetplanTry(utils.NetplanCommand):
         confdir = os.path.join(tempdir, 'etc', 'netplan')
         os.makedirs(confdir)
         self.config_manager.copy_tree('/etc/netplan', confdir, dirs_exist_ok=True)
-        # restore previous state
+        # keep track of the backend configuration touched by the tried state
+        changed_files = self.config_manager.changed_files()
+        tried_interfaces = NetplanApply._networkd_match_names(changed_files)
+        tried_state = self._parse_state()
+        # restore previous state, reconfiguring only what the tried state touched, if possible
         self.config_manager.revert()
-        NetplanApply().command_apply(run_generate=False, sync=True, exit_on_error=False, state_dir=tempdir)
+        np_states = [tried_state]
+        if self.config_file:
+            # dropping the tried config file brings back the previous YAML, otherwise
+            # /etc/netplan is unchanged and only the backend output tells about it
+            np_states.append(self._parse_state())
+        if not NetplanApply.process_fast_revert(changed_files, tried_interfaces, np_states):
+            NetplanApply().command_apply(run_generate=False, sync=True, exit_on_error=False, state_dir=tempdir)
         # clear the backup
         shutil.rmtree(tempdir)
 
+    def _parse_state(self):  # pragma: nocover (requires user input)
+        try:
+            return self.config_manager.parse()
+        except utils.config_errors as e:
+            logging.debug('Cannot parse the netplan config: %s', e)
+            return None
+
     def cleanup(self):  # pragma: nocover (requires user input)
         self.config_manager.cleanup()
 
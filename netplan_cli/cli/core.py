@@ -18,10 +18,12 @@
 
 '''netplan command line'''
 
+import functools
 import logging
 import os
 import sys
 
+from . import trace
 from . import utils
 from netplan import NetplanException, NetplanValidationException, NetplanParserException
 
@@ -42,7 +44,10 @@ class Netplan(utils.NetplanCommand):
     def parse_args(self):
         from . import commands as cli_commands
 
-        self._import_subcommands(cli_commands)
+        for command_id, (_, _, description, testing) in cli_commands.COMMANDS.items():
+            self._add_lazy_subparser(command_id, description,
+                                     functools.partial(cli_commands.load_command, command_id),
+                                     testing=testing)
 
         super().parse_args()
 
@@ -55,6 +60,7 @@ class Netplan(utils.NetplanCommand):
         else:
             logging.basicConfig(level=logging.INFO, format='%(message)s', force=True)
 
+        trace.start()
         try:
             self.run_command()
         except NetplanParserException as e:
@@ -67,3 +73,5 @@ class Netplan(utils.NetplanCommand):
         except NetplanException as e:
             logging.warning(f'Command failed: {e}')
             sys.exit(1)
+        finally:
+            trace.finish()
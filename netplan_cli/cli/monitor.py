@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2025 Canonical, Ltd.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Event sources for 'netplan status --watch'.
+
+Each monitor exposes a file descriptor (via fileno()) to be used with the
+selectors module. Once it is readable, read() returns the names of the
+SystemConfigState data sources that need to be queried again, such as
+'iproute2' for link/address changes or 'resolved' for DNS changes.
+'''
+
+import errno
+import json
+import logging
+import os
+import shutil
+import socket
+import struct
+import subprocess
+from typing import Set
+
+from .state import FOREIGN_ROUTE_PROTOCOLS
+
+# rtnetlink multicast groups, see linux/rtnetlink.h
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+
+# rtnetlink message types
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+
+# struct nlmsghdr: length, type, flags, sequence number, port ID
+NLMSGHDR = struct.Struct('=IHHII')
+# offset of the rtm_protocol field in struct rtmsg
+RTMSG_PROTOCOL_OFFSET = 5
+FOREIGN_ROUTE_PROTOCOL_IDS = set(FOREIGN_ROUTE_PROTOCOLS.values())
+
+# D-Bus object paths of the services providing data to 'netplan status'
+DBUS_SOURCES = {
+    '/org/freedesktop/network1': 'networkd',
+    '/org/freedesktop/NetworkManager': 'nm',
+    '/org/freedesktop/resolve1': 'resolved',
+    }
+
+
+class RtnlMonitor():
+    '''Listen to rtnetlink notifications about links, addresses and routes'''
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_NONBLOCK,
+                                  socket.NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR |
+                        RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_ROUTE))
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
+
+    def read(self) -> Set[str]:
+        sources = set()
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:  # pragma: nocover (unexpected socket error)
+                    raise
+                # The kernel dropped some notifications, we cannot know which
+                logging.debug('rtnetlink notifications overrun')
+                sources.update(['iproute2', 'routes'])
+                continue
+            sources.update(self.parse(data))
+        return sources
+
+    @classmethod
+    def parse(cls, data: bytes) -> Set[str]:
+        sources = set()
+        offset = 0
+        while offset + NLMSGHDR.size <= len(data):
+            length, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+            if length < NLMSGHDR.size:
+                break
+            if msg_type in (RTM_NEWLINK, RTM_DELLINK, RTM_NEWADDR, RTM_DELADDR):
+                sources.add('iproute2')
+            elif msg_type in (RTM_NEWROUTE, RTM_DELROUTE):
+                # Ignore the churn of routing daemons, e.g. BGP full tables
+                protocol_offset = offset + NLMSGHDR.size + RTMSG_PROTOCOL_OFFSET
+                if protocol_offset < len(data) and data[protocol_offset] not in FOREIGN_ROUTE_PROTOCOL_IDS:
+                    sources.add('routes')
+            offset += (length + 3) & ~3  # NLMSG_ALIGN
+        return sources
+
+
+class DBusMonitor():
+    '''Listen to property changes of systemd-networkd, NetworkManager and systemd-resolved'''
+
+    def __init__(self):
+        busctl = shutil.which('busctl')
+        if busctl is None:
+            raise RuntimeError('missing busctl utility')
+        # 'busctl monitor' needs to be root, the caller needs to handle its exit
+        match = "type='signal',interface='org.freedesktop.DBus.Properties',member='PropertiesChanged'"
+        self.proc = subprocess.Popen([busctl, '--system', '--json=short', 'monitor', '--match', match],
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        os.set_blocking(self.proc.stdout.fileno(), False)
+        self.buffer = b''
+
+    def fileno(self) -> int:
+        return self.proc.stdout.fileno()
+
+    def close(self):
+        self.proc.kill()
+        self.proc.wait()
+        self.proc.stdout.close()
+
+    def read(self) -> Set[str]:
+        '''Returns the affected data sources, or None once the monitor exited'''
+        data = os.read(self.fileno(), 65536)
+        if not data:
+            logging.debug('Cannot monitor D-Bus property changes, busctl exited with {}'.format(self.proc.wait()))
+            return None
+        lines = (self.buffer + data).split(b'\n')
+        self.buffer = lines.pop()  # incomplete line
+        sources = set()
+        for line in lines:
+            sources.update(self.parse(line))
+        return sources
+
+    @classmethod
+    def parse(cls, line: bytes) -> Set[str]:
+        try:
+            path = json.loads(line).get('path', '')
+        except (ValueError, AttributeError):
+            return set()
+        return set(source for prefix, source in DBUS_SOURCES.items()
+                   if path == prefix or path.startswith(prefix + '/'))
@@ -19,6 +19,8 @@ import logging
 import os
 import subprocess
 
+from . import trace
+
 OPENVSWITCH_OVS_VSCTL = 'ovs-vsctl'
 # Defaults for non-optional settings, as defined here:
 # http://www.openvswitch.org/ovs-vswitchd.conf.db.5.pdf
@@ -137,6 +139,7 @@ def is_ovs_interface(iface, np_interface_dict):
     return np_def and np_def.backend == 'OpenVSwitch'
 
 
+@trace.span('apply_ovs_cleanup')
 def apply_ovs_cleanup(config_manager, ovs_old, ovs_current):  # pragma: nocover (covered in autopkgtest)
     """
     Query OpenVSwitch state through 'ovs-vsctl' and filter for netplan=true
@@ -21,8 +21,9 @@ import logging
 import os
 import subprocess
 import typing
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
+from . import trace
 from . import utils
 from ..configmanager import ConfigurationError
 import netplan
@@ -209,19 +210,20 @@ def unbind_vfs(vfs: typing.Iterable[PCIDevice], driver) -> typing.Iterable[PCIDe
     return unbound_vfs
 
 
-def _interface_matches(netdef: netplan.NetDefinition, interface: str) -> bool:
-    return netdef._match_interface(
-        iface_name=interface,
-        iface_driver=utils.get_interface_driver_name(interface),
-        iface_mac=utils.get_interface_macaddress(interface))
+def _match_system_interfaces(np_state: netplan.State) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Match all netdefs against the real system network interfaces at once.
+    """
+    interfaces: List[str] = utils.get_interfaces()
+    return interfaces, utils.match_interfaces(interfaces, np_state)
 
 
-def _get_interface_name_for_netdef(netdef: netplan.NetDefinition) -> Optional[str]:
+def _get_interface_name_for_netdef(netdef: netplan.NetDefinition, interfaces: List[str],
+                                   matches: Dict[str, List[str]]) -> Optional[str]:
     """
     Try to match a netdef with the real system network interface.
     Throws ConfigurationError if there is more than one match.
     """
-    interfaces: List[str] = utils.get_interfaces()
     if netdef._has_match:
         # now here it's a bit tricky
         set_name: str = netdef.set_name
@@ -230,24 +232,12 @@ def _get_interface_name_for_netdef(netdef: netplan.NetDefinition) -> Optional[st
             # assume that, if found, the interface has already been
             # renamed - use the new name
             return set_name
-        else:
-            matches: Set[str] = set()
-            # we walk through all the system interfaces to determine if there is
-            # more than one matched interface
-            for interface in interfaces:
-                if not _interface_matches(netdef, interface):
-                    continue
-                # we have a matching PF
-                # error out if we matched more than one
-                if len(matches) > 1:
-                    raise ConfigurationError('matched more than one interface for a PF device: %s' % netdef.id)
-                matches.add(interface)
-            if matches:
-                return list(matches)[0]
-    else:
-        # no match field, assume entry name is the interface name
-        if netdef.id in interfaces:
-            return netdef.id
+        # error out if we matched more than one interface
+        if len(matches.get(netdef.id, [])) > 1:
+            raise ConfigurationError('matched more than one interface for a PF device: %s' % netdef.id)
+    # without a match field, the entry name is assumed to be the interface name
+    if iface := matches.get(netdef.id):
+        return iface[0]
 
     return None
 
@@ -275,16 +265,19 @@ def _get_physical_functions(np_state: netplan.State) -> Dict[str, str]:
     PFs matching them with actual network interfaces.
     """
     pfs = {}
+    system = None
     for netdef in np_state.ethernets.values():
         # If the sriov_link is present, the interface is a VF and link is the PF
         if link := netdef.links.get('sriov'):
-            if iface := _get_interface_name_for_netdef(np_state[link.id]):
+            system = system or _match_system_interfaces(np_state)
+            if iface := _get_interface_name_for_netdef(np_state[link.id], *system):
                 pfs[link.id] = iface
         else:
             # If a netdef also defines the embedded_switch_mode key we consider it's a PF
             # This enables us to change the eswitch mode even when the PF has no VFs.
             if netdef._embedded_switch_mode:
-                if iface := _get_interface_name_for_netdef(netdef):
+                system = system or _match_system_interfaces(np_state)
+                if iface := _get_interface_name_for_netdef(netdef, *system):
                     pfs[netdef.id] = iface
 
             # If the netdef has any (positive) number of VFs that's because it's a PF
@@ -293,7 +286,8 @@ def _get_physical_functions(np_state: netplan.State) -> Dict[str, str]:
             except netplan.NetplanException as e:
                 raise ConfigurationError(str(e))
             if count > 0:
-                if iface := _get_interface_name_for_netdef(netdef):
+                system = system or _match_system_interfaces(np_state)
+                if iface := _get_interface_name_for_netdef(netdef, *system):
                     pfs[netdef.id] = iface
 
     return pfs
@@ -306,13 +300,15 @@ def _get_vf_number_per_pf(np_state: netplan.State) -> Dict[str, int]:
     from libnetplan which return MAX(sriov_explicit_vf_count, number of VF netdefs).
     """
     vf_counts = {}
+    system = None
     for netdef in np_state.ethernets.values():
         try:
             count = netdef._vf_count
         except netplan.NetplanException as e:
             raise ConfigurationError(str(e))
         if count > 0:
-            if iface := _get_interface_name_for_netdef(netdef):
+            system = system or _match_system_interfaces(np_state)
+            if iface := _get_interface_name_for_netdef(netdef, *system):
                 vf_counts[iface] = count
 
     return vf_counts
@@ -324,10 +320,12 @@ def _get_virtual_functions(np_state: netplan.State) -> Set[str]:
     are virtual functions
     """
     vfs = set()
+    system = None
     for netdef in np_state.ethernets.values():
         # If the sriov_link is present and the PF is also present in the system we save the VF
         if link := netdef.links.get('sriov'):
-            if _get_interface_name_for_netdef(np_state[link.id]):
+            system = system or _match_system_interfaces(np_state)
+            if _get_interface_name_for_netdef(np_state[link.id], *system):
                 vfs.add(netdef.id)
     return vfs
 
@@ -447,6 +445,7 @@ def apply_vlan_filter_for_vf(pf, vf, vlan_name, vlan_id, prefix='/'):
             'failed setting SR-IOV VLAN filter for vlan %s (ip link set command failed)' % vlan_name)
 
 
+@trace.span('apply_sriov_config')
 def apply_sriov_config(config_manager, rootdir='/'):
     """
     Go through all interfaces, identify which ones are SR-IOV VFs, create
@@ -493,21 +492,17 @@ def apply_sriov_config(config_manager, rootdir='/'):
     # filtered VLANs for those.
     # XXX: does matching those even make sense?
     vfs = {}
+    # right now we only match by name, as I don't think matching per
+    # driver and/or macaddress makes sense
+    # TODO: print warning if other matches are provided
+    vf_matches = {}
+    if vfs_set:
+        vf_matches, _ = np_state._match_interfaces([(interface, None, None) for interface in interfaces])
     for vf in vfs_set:
-        netdef = np_state[vf]
-        if netdef._has_match:
-            # right now we only match by name, as I don't think matching per
-            # driver and/or macaddress makes sense
-            # TODO: print warning if other matches are provided
-
-            for interface in interfaces:
-                if netdef._match_interface(iface_name=interface):
-                    if vf in vfs and vfs[vf]:
-                        raise ConfigurationError('matched more than one interface for a VF device: %s' % vf)
-                    vfs[vf] = interface
-        else:
-            if vf in interfaces:
-                vfs[vf] = vf
+        if matches := vf_matches.get(vf):
+            if len(matches) > 1:
+                raise ConfigurationError('matched more than one interface for a VF device: %s' % vf)
+            vfs[vf] = matches[0]
 
     # Walk the SR-IOV PFs and check if we need to change the eswitch mode
     for netdef_id, iface in pfs.items():
@@ -24,10 +24,14 @@ import re
 import shutil
 import subprocess
 import sys
-from collections import defaultdict, namedtuple
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from io import StringIO
-from socket import AF_INET, AF_INET6, inet_ntop
-from typing import Dict, List, Type, Union
+from socket import AF_INET, AF_INET6, if_nametoindex, inet_ntop
+from typing import Callable, Dict, Iterable, Iterator, List, Type, Union
 from urllib import parse
 
 import yaml
@@ -38,6 +42,33 @@ from . import utils
 
 JSON = Union[Dict[str, 'JSON'], List['JSON'], int, str, float, bool, Type[None]]
 
+# Timeout (in seconds) of each system data source queried by SystemConfigState
+QUERY_TIMEOUT = 10
+# Size of the chunks read from streamed command output
+STREAM_CHUNK_SIZE = 65536
+
+# Route protocols of routing daemons and their IDs (see /etc/iproute2/rt_protos),
+# netplan cannot configure such routes
+FOREIGN_ROUTE_PROTOCOLS = {
+    'babel': 42,
+    'bgp': 186,
+    'bird': 12,
+    'dnrouted': 13,
+    'eigrp': 192,
+    'gated': 8,
+    'isis': 187,
+    'keepalived': 18,
+    'mrt': 10,
+    'ntk': 15,
+    'openr': 99,
+    'ospf': 188,
+    'rip': 189,
+    'xorp': 14,
+    'zebra': 11,
+    }
+# iproute2 prints the numeric ID of protocols missing from its rt_protos table
+FOREIGN_ROUTE_PROTOCOL_NAMES = set(FOREIGN_ROUTE_PROTOCOLS) | {str(proto_id) for proto_id in FOREIGN_ROUTE_PROTOCOLS.values()}
+
 DEVICE_TYPES = {
     'bond': 'bond',
     'bridge': 'bridge',
@@ -88,7 +119,8 @@ class Interface():
         return None
 
     def __init__(self, ip: dict, nd_data: JSON = [], nm_data: JSON = [],
-                 resolved_data: tuple = (None, None), route_data: tuple = (None, None)):
+                 resolved_data: tuple = (None, None), route_data: tuple = (None, None),
+                 nm_cache: dict = None):
         self.idx: int = ip.get('ifindex', -1)
         self.name: str = ip.get('ifname', 'unknown')
         self.adminstate: str = 'UP' if 'UP' in ip.get('flags', []) else 'DOWN'
@@ -162,12 +194,15 @@ class Interface():
         if addr_info := ip.get('addr_info'):
 
             ra_networks = set()
+            dhcp_sources = set()
             if self.routes:
                 for route in self.routes:
                     if (route.get('protocol') == 'ra'
                             and route.get('to') != 'default'
                             and route.get('family') == AF_INET6.value):
                         ra_networks.add(ipaddress.ip_interface(route['to']).network)
+                    if 'from' in route and route.get('protocol') == 'dhcp':
+                        dhcp_sources.add(ipaddress.ip_address(route['from']))
 
             self.addresses = []
             for addr in addr_info:
@@ -190,13 +225,8 @@ class Interface():
                         if ip_ds == 'DHCPv6':
                             flags.append('dhcp')
 
-                if self.routes:
-                    for route in self.routes:
-                        if ('from' in route and
-                                ipaddress.ip_address(route['from']) == ipaddress.ip_address(addr['local'])):
-                            if route['protocol'] == 'dhcp' and 'dhcp' not in flags:
-                                flags.append('dhcp')
-                                break
+                if ipaddress.ip_address(addr['local']) in dhcp_sources and 'dhcp' not in flags:
+                    flags.append('dhcp')
                 ip_addr = addr['local'].lower()
                 elem = {ip_addr: {'prefix': addr['prefixlen']}}
                 if flags:
@@ -206,21 +236,55 @@ class Interface():
         self.iproute_type: str = None
         if info_kind := ip.get('linkinfo', {}).get('info_kind'):
             self.iproute_type = info_kind.strip()
+        # name of the bond/bridge/vrf (or other) interface this link is enslaved to
+        self.uplink: str = ip.get('master')  # wokeignore:rule=master
+        self.uplink_kind: str = ip.get('linkinfo', {}).get('info_slave_kind')
 
-        # workaround: query some data which is not available via networkctl's JSON output
-        self._networkctl: str = self.query_networkctl(self.name) or ''
+        # 'networkctl status' output, queried lazily, see _networkctl
+        self._networkctl_output: str = None
+        # NetworkManager connection data, shared by all interfaces of a
+        # SystemConfigState, so that each connection is queried only once
+        self._nm_cache: dict = nm_cache if nm_cache is not None else {}
 
     def query_nm_ssid(self, con_name: str) -> str:
+        key = ('802-11-wireless.ssid', con_name)
+        if key in self._nm_cache:
+            return self._nm_cache[key]
         ssid: str = None
         try:
             ssid = utils.nmcli_out(['--get-values', '802-11-wireless.ssid',
-                                    'con', 'show', 'id', con_name])
-            return ssid.strip()
+                                    'con', 'show', 'id', con_name]).strip()
         except Exception as e:
             logging.warning('Cannot query NetworkManager SSID for {}: {}'.format(
                             con_name, str(e)))
+        self._nm_cache[key] = ssid
         return ssid
 
+    @property
+    def _networkctl(self) -> str:
+        # workaround: query some data which is not available via networkctl's JSON output
+        # of older systemd versions. This forks a process per interface, so do it only on demand.
+        if self._networkctl_output is None:
+            self._networkctl_output = self.query_networkctl(self.name) or ''
+        return self._networkctl_output
+
+    def _network_file_sets(self, key: str) -> bool:
+        '''
+        Check if the networkd configuration (.network file and drop-ins) of this
+        interface sets the given key. Unreadable files are assumed to set it.
+        '''
+        pattern = re.compile(r'^\s*{}\s*='.format(key), re.MULTILINE)
+        for path in [self.nd.get('NetworkFile')] + (self.nd.get('NetworkFileDropins') or []):
+            if not path:
+                continue
+            try:
+                with open(path, 'r') as f:
+                    if pattern.search(f.read()):
+                        return True
+            except OSError:
+                return True
+        return False
+
     def query_networkctl(self, ifname: str) -> str:
         output: str = None
         try:
@@ -278,7 +342,9 @@ class Interface():
     def down(self) -> bool:
         return self.adminstate == 'DOWN' and self.operstate == 'DOWN'
 
-    @property
+    # The derived properties below are computed only once, as they are accessed
+    # several times and might need to query NetworkManager or networkctl
+    @cached_property
     def type(self) -> str:
         nd_type = self.nd.get('Type') if self.nd else None
         if nd_type == 'none':
@@ -299,7 +365,7 @@ class Interface():
             return self.iproute_type
         return None
 
-    @property
+    @cached_property
     def backend(self) -> str:
         if (self.nd and
                 'unmanaged' not in self.nd.get('SetupState', '') and
@@ -309,7 +375,7 @@ class Interface():
             return 'NetworkManager'
         return None
 
-    @property
+    @cached_property
     def netdef_id(self) -> str:
         if self.backend == 'networkd':
             return self.nd.get('NetworkFile', '').split(
@@ -346,13 +412,15 @@ class Interface():
             return self.nd['Vendor'].strip()
         return None
 
-    @property
+    @cached_property
     def ssid(self) -> str:
         if self.type == 'wifi':
             if self.backend == "NetworkManager":
                 return self.query_nm_ssid(self.nm.get('name', ''))
-            # XXX: available from networkctl's JSON output as of v250:
-            #      https://github.com/systemd/systemd/commit/da7c995
+            # available from networkctl's JSON output as of v250:
+            # https://github.com/systemd/systemd/commit/da7c995
+            if self.nd and self.nd.get('SSID'):
+                return self.nd['SSID']
             # TODO: Retrieving the SSID from systemd seems to not be reliable.
             #       Sometimes it will return "(null)".
             for line in self._networkctl.splitlines():
@@ -368,11 +436,16 @@ class Interface():
                     return ssid if ssid else None
         return None
 
-    @property
+    @cached_property
     def activation_mode(self) -> str:
         if self.backend == 'networkd':
-            # XXX: available from networkctl's JSON output as of v250:
-            #      https://github.com/systemd/systemd/commit/3b60ede
+            # available from networkctl's JSON output as of v250:
+            # https://github.com/systemd/systemd/commit/3b60ede
+            if mode := self.nd.get('ActivationPolicy'):
+                return mode if mode != 'up' else None
+            # older systemd: the default policy needs no further query
+            if not self._network_file_sets('ActivationPolicy'):
+                return None
             for line in self._networkctl.splitlines():
                 line = line.strip()
                 key = 'Activation Policy: '
@@ -439,21 +512,130 @@ class SystemConfigState():
             logging.debug('systemd-networkd.service is not active. Starting...')
             utils.systemctl('start', ['systemd-networkd.service'], True)
 
+        self.ifname = ifname
+        self.all = all
+        # Only a single interface is shown: query just the data of this
+        # interface and of the interfaces related to it, see queries()
+        self.scoped = bool(ifname) and not all
+        if self.scoped:
+            try:
+                if_nametoindex(ifname)
+            except OSError:
+                logging.error('Could not find interface {}'.format(ifname))
+                sys.exit(1)
+        self._related: List[str] = []
+        self._nm_cache: dict = {}
+        self._data = self._collect(self.queries().keys())
+
         # required data: iproute2 and sd-networkd can be expected to exist,
         # due to hard package dependencies
-        iproute2 = self.query_iproute2()
-        networkd = self.query_networkd()
-        if not iproute2 or not networkd:
+        if not self._data['iproute2'] or not self._data['networkd']:
             logging.error('Could not query iproute2 or systemd-networkd')
             sys.exit(1)
 
-        # optional data
-        nmcli = self.query_nm()
-        route4, route6 = self.query_routes()
-        dns_addresses, dns_search = self.query_resolved()
+        self._interfaces = {}
+        self._update()
+        # XXX: bash completion (for interfaces names)
+        if ifname and ifname not in self.state:
+            logging.error('Could not find interface {}'.format(ifname))
+            sys.exit(1)
 
-        self.interface_list = [Interface(itf, networkd, nmcli, (dns_addresses, dns_search),
-                                         (route4, route6)) for itf in iproute2]
+    def queries(self) -> Dict[str, Callable]:
+        '''
+        The data sources of the system state, see collect(). If only a single
+        interface is shown, the data sources are filtered down to this interface,
+        its uplink and members, as well as the interfaces having a default route
+        (which determine the online state), instead of querying all interfaces.
+        '''
+        if self.scoped:
+            return {
+                'iproute2': lambda: self.query_iproute2(self.ifname, self._related),
+                'networkd': lambda: self.query_networkd(self.ifname),
+                'nm': self.query_nm,
+                'routes': lambda: self.query_routes(self.ifname),
+                'resolved': lambda: self.query_resolved([self.ifname] + self._related),
+            }
+        return {
+            'iproute2': self.query_iproute2,
+            'networkd': self.query_networkd,
+            'nm': self.query_nm,
+            'routes': self.query_routes,
+            'resolved': self.query_resolved,
+        }
+
+    def refresh(self, sources: Iterable[str]) -> Dict[str, JSON]:
+        '''
+        Query the given data sources again and update the state, re-creating
+        only the interfaces whose data changed. Returns the changed entries of
+        get_data(), using None for interfaces that are gone.
+        '''
+        data = self._collect(sources)
+        for name in ['iproute2', 'networkd']:
+            if name in data and not data[name]:  # keep the previous (required) data
+                del data[name]
+        self._data.update(data)
+        if 'nm' in data:
+            # The connection data queried by the NetworkManager interfaces might have changed
+            self._nm_cache.clear()
+            self._interfaces = {key: value for key, value in self._interfaces.items() if not value[1].nm}
+
+        previous = self.state
+        self._update()
+        changes = {key: value for key, value in self.state.items() if previous.get(key) != value}
+        changes.update({key: None for key in previous if key not in self.state})
+        return changes
+
+    def _collect(self, sources: Iterable[str]) -> Dict[str, JSON]:
+        queries = {name: query for name, query in self.queries().items() if name in sources}
+        data = {}
+        if self.scoped and 'routes' in queries:
+            # The related interfaces depend on the default routes, so query those
+            # first and query the related interfaces again, if they changed
+            data = self.collect({'routes': queries.pop('routes')})
+            related = self.default_route_interfaces(*data['routes'])
+            related = [name for name in related if name != self.ifname]
+            if related != self._related:
+                self._related = related
+                queries.update({name: query for name, query in self.queries().items()
+                                if name in ['iproute2', 'resolved']})
+        if queries:
+            data.update(self.collect(queries))
+        return data
+
+    def _update(self) -> None:
+        # optional data
+        nmcli = self._data['nm']
+        route4, route6 = self._data['routes']
+        dns_addresses, dns_search = self._data['resolved']
+
+        # Index all data sources once, so that each interface gets handed only
+        # its own slice of the data, instead of filtering the complete lists
+        nd_index = self.index_by(self._data['networkd'], lambda nd: nd['Index'])
+        nm_index = self.index_by(nmcli, lambda nm: nm['device'])
+        dns_index = self.index_by(dns_addresses, lambda dns: int(dns[0]))
+        search_index = self.index_by(dns_search, lambda search: int(search[0]))
+        route4_index = self.index_by(route4, lambda route: route.get('dev'))
+        route6_index = self.index_by(route6, lambda route: route.get('dev'))
+
+        # Keep the Interface objects (and their lazily queried data) of
+        # interfaces whose data did not change since the last update
+        interfaces = {}
+        self.interface_list = []
+        for itf in self._data['iproute2']:
+            idx = itf.get('ifindex', -1)
+            name = itf.get('ifname', 'unknown')
+            args = (itf, nd_index.get(idx, []), nm_index.get(name, []),
+                    (dns_index.get(idx), search_index.get(idx)),
+                    (route4_index.get(name), route6_index.get(name)))
+            cached_args, interface = self._interfaces.get((idx, name), (None, None))
+            if cached_args == args:
+                interface.bridge = interface.bond = interface.vrf = None
+                interface.members = []
+            else:
+                interface = Interface(*args, nm_cache=self._nm_cache)
+            interfaces[(idx, name)] = (args, interface)
+            self.interface_list.append(interface)
+        self._interfaces = interfaces
 
         # get bridge/bond/vrf data
         self.correlate_members_and_uplink(self.interface_list)
@@ -463,13 +645,8 @@ class SystemConfigState():
         # down interfaces do not contribute anything to the online state
         online_state = self.query_online_state(filtered)
         # show only a single interface, if requested
-        # XXX: bash completion (for interfaces names)
-        if ifname:
-            filtered = [next((itf for itf in self.interface_list if itf.name == ifname), None)]
-        filtered = [elem for elem in filtered if elem is not None]
-        if ifname and filtered == []:
-            logging.error('Could not find interface {}'.format(ifname))
-            sys.exit(1)
+        if self.ifname:
+            filtered = [itf for itf in self.interface_list if itf.name == self.ifname]
 
         # Global state
         self.state = {
@@ -479,7 +656,7 @@ class SystemConfigState():
             }
         }
         # Per interface
-        itf_iter = self.interface_list if all else filtered
+        itf_iter = self.interface_list if self.all else filtered
         for itf in itf_iter:
             ifname, obj = itf.json()
             self.state[ifname] = obj
@@ -508,6 +685,15 @@ class SystemConfigState():
             logging.warning('Cannot parse /etc/resolv.conf: {}'.format(str(e)))
         return res
 
+    @classmethod
+    def default_route_interfaces(cls, route4: JSON, route6: JSON) -> List[str]:
+        ''' The names of the interfaces having a default route '''
+        names = []
+        for route in (route4 or []) + (route6 or []):
+            if route.get('dst') == 'default' and route.get('dev') and route['dev'] not in names:
+                names.append(route['dev'])
+        return names
+
     @classmethod
     def query_online_state(cls, interfaces: list) -> bool:
         # TODO: fully implement network-online.target specification (FO020):
@@ -524,33 +710,88 @@ class SystemConfigState():
                     return True
         return False
 
+    @classmethod
+    def collect(cls, queries: Dict[str, Callable]) -> Dict[str, JSON]:
+        '''
+        Run the given data source queries concurrently and return their results.
+        Each query handles its own errors and timeouts (see QUERY_TIMEOUT),
+        so a hanging data source only degrades its own data.
+        '''
+        def timed(name: str, query: Callable) -> JSON:
+            start = time.monotonic()
+            try:
+                return query()
+            finally:
+                logging.debug('Queried {} data in {:.3f}s'.format(name, time.monotonic() - start))
+
+        with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+            futures = {name: executor.submit(timed, name, query) for name, query in queries.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    @classmethod
+    def index_by(cls, data: JSON, key: Callable) -> Dict[object, list]:
+        ''' Group a list of entries (which might be None) by the given key function '''
+        index = defaultdict(list)
+        for entry in data or []:
+            index[key(entry)].append(entry)
+        return index
+
     @classmethod
     def process_generic(cls, cmd_output: str) -> JSON:
         return json.loads(cmd_output)
 
     @classmethod
-    def query_iproute2(cls) -> JSON:
+    def query_iproute2(cls, ifname: str = None, related: List[str] = []) -> JSON:
+        '''
+        Query the links and addresses of all interfaces or only of the given
+        interface, including its uplink and members, and of the related interfaces.
+        '''
         data: JSON = None
         try:
-            output: str = subprocess.check_output(['ip', '-d', '-j', 'addr'],
-                                                  text=True)
-            data = cls.process_generic(output)
+            def show(selector: List[str]) -> JSON:
+                output: str = subprocess.check_output(['ip', '-d', '-j', 'addr'] + selector,
+                                                      text=True, timeout=QUERY_TIMEOUT)
+                return cls.process_generic(output)
+
+            if not ifname:
+                data = show([])
+            else:
+                data = show(['show', 'dev', ifname])
+                link = data[0] if data else {}
+                if link.get('linkinfo', {}).get('info_kind') in ['bond', 'bridge', 'vrf']:
+                    data += show(['show', 'master', ifname])  # wokeignore:rule=master
+                names = set(itf.get('ifname') for itf in data)
+                for name in [link.get('master')] + related:  # wokeignore:rule=master
+                    if not name or name in names:
+                        continue
+                    names.add(name)
+                    try:
+                        data += show(['show', 'dev', name])
+                    except subprocess.CalledProcessError:
+                        # the related interface is gone already
+                        logging.debug('Cannot query iproute2 interface data of {}'.format(name))
         except Exception as e:
             logging.critical('Cannot query iproute2 interface data: {}'.format(str(e)))
         return data
 
     @classmethod
     def process_networkd(cls, cmd_output) -> JSON:
-        return json.loads(cmd_output)['Interfaces']
+        data = json.loads(cmd_output)
+        # 'networkctl status <link>' describes only a single link
+        return data['Interfaces'] if 'Interfaces' in data else [data]
 
     @classmethod
-    def query_networkd(cls) -> JSON:
+    def query_networkd(cls, ifname: str = None) -> JSON:
         data: JSON = None
         try:
-            output: str = subprocess.check_output(['networkctl', '--json=short'],
-                                                  text=True)
+            output: str = subprocess.check_output(['networkctl', '--json=short'] + (['status', ifname] if ifname else []),
+                                                  text=True, timeout=QUERY_TIMEOUT)
             data = cls.process_networkd(output)
         except Exception as e:
+            if ifname:
+                # Older versions of networkctl cannot describe a single link in JSON
+                logging.debug('Cannot query networkd interface data of {}: {}'.format(ifname, str(e)))
+                return cls.query_networkd()
             logging.critical('Cannot query networkd interface data: {}'.format(str(e)))
         return data
 
@@ -577,116 +818,191 @@ class SystemConfigState():
         try:
             output: str = utils.nmcli_out(['-t', '-f',
                                            'DEVICE,NAME,UUID,FILENAME,TYPE,AUTOCONNECT',
-                                           'con', 'show'])
+                                           'con', 'show', '--active'], timeout=QUERY_TIMEOUT)
             data = cls.process_nm(output)
         except Exception as e:
             logging.debug('Cannot query NetworkManager interface data: {}'.format(str(e)))
         return data
 
     @classmethod
-    def query_routes(cls) -> tuple:
+    def stream_generic(cls, cmd: List[str], timeout: float = QUERY_TIMEOUT) -> Iterator[JSON]:
+        '''
+        Run a command printing a JSON array (such as 'ip -j ...') and yield its
+        elements one by one, as soon as they are read from the command's output.
+        This keeps the memory usage bounded, no matter how large the output is.
+        '''
+        decoder = json.JSONDecoder()
+        expired = threading.Event()
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) as proc:
+            def expire():
+                expired.set()
+                proc.kill()
+
+            timer = threading.Timer(timeout, expire)
+            timer.start()
+            try:
+                buf = ''
+                for chunk in iter(lambda: proc.stdout.read(STREAM_CHUNK_SIZE), ''):
+                    buf += chunk
+                    pos = 0
+                    while True:
+                        # skip the array brackets and separators between elements
+                        while pos < len(buf) and buf[pos] in '[,] \t\r\n':
+                            pos += 1
+                        try:
+                            elem, end = decoder.raw_decode(buf, pos)
+                        except json.JSONDecodeError:
+                            break  # incomplete element, read some more data
+                        yield elem
+                        pos = end
+                    buf = buf[pos:]
+                proc.wait()
+            finally:
+                timer.cancel()
+        if expired.is_set():
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+        if buf:
+            raise ValueError('Cannot parse JSON output of {}: {}'.format(cmd[0], buf[:80]))
+
+    @classmethod
+    def stream_routes(cls, family: str, ifname: str = None) -> Iterator[JSON]:
+        '''
+        Stream the routes of the given address family ('-4' or '-6') in all
+        tables. If an interface is given, stream only the routes of this interface
+        and the default routes of all interfaces (to determine the online state).
+        '''
+        cmd = ['ip', '-d', '-j', family, 'route', 'show', 'table', 'all']
+        if not ifname:
+            yield from cls.stream_generic(cmd)
+            return
+        for route in cls.stream_generic(cmd + ['dev', ifname]):
+            route['dev'] = ifname  # omitted by iproute2, when filtering by device
+            yield route
+        for route in cls.stream_generic(cmd + ['default']):
+            if route.get('dev') != ifname:
+                yield route
+
+    @classmethod
+    def process_routes(cls, routes: Iterable[JSON], family: int) -> JSON:
+        '''
+        Drop the routes installed by routing daemons (which cannot be configured
+        via netplan) and add the address family to the remaining ones.
+        '''
+        data = []
+        for route in routes:
+            if route.get('protocol') in FOREIGN_ROUTE_PROTOCOL_NAMES:
+                continue
+            route['family'] = family
+            data.append(route)
+        return data
+
+    @classmethod
+    def query_routes(cls, ifname: str = None) -> tuple:
+        # Routers might have full Internet routing tables (>1M routes), so the
+        # routes are streamed and filtered, instead of loading them all at once.
         data4 = None
         data6 = None
         try:
-            output4: str = subprocess.check_output(['ip', '-d', '-j', '-4', 'route', 'show', 'table', 'all'],
-                                                   text=True)
-            data4: JSON = cls.process_generic(output4)
-            output6: str = subprocess.check_output(['ip', '-d', '-j', '-6', 'route', 'show', 'table', 'all'],
-                                                   text=True)
-            data6: JSON = cls.process_generic(output6)
+            # IPv4: 2, IPv6: 10
+            data4: JSON = cls.process_routes(cls.stream_routes('-4', ifname), AF_INET.value)
+            data6: JSON = cls.process_routes(cls.stream_routes('-6', ifname), AF_INET6.value)
         except Exception as e:
             logging.debug('Cannot query iproute2 route data: {}'.format(str(e)))
-
-        # Add the address family to the data
-        # IPv4: 2, IPv6: 10
-        if data4:
-            for route in data4:
-                route.update({'family': AF_INET.value})
-        if data6:
-            for route in data6:
-                route.update({'family': AF_INET6.value})
         return (data4, data6)
 
     @classmethod
-    def query_resolved(cls) -> tuple:
+    def query_resolved_properties(cls, path: str, interface: str) -> dict:
+        busctl = shutil.which('busctl')
+        if busctl is None:
+            raise RuntimeError('missing busctl utility')
+        json_out = subprocess.check_output(
+            [busctl, '--json=short', 'call', '--system',
+             'org.freedesktop.resolve1',  # the service
+             path,  # the object
+             'org.freedesktop.DBus.Properties',  # the interface
+             'GetAll', 's',  # the method and signature
+             interface,  # the parameter
+             ], text=True, timeout=QUERY_TIMEOUT)
+        res = json.loads(json_out)
+        return res.get('data', [{}])[0]
+
+    @classmethod
+    def query_resolved(cls, ifnames: List[str] = None) -> tuple:
+        '''
+        Query the DNS addresses and search domains of all interfaces, or only
+        of the given interfaces (using their resolved link objects).
+        '''
         addresses = None
         search = None
         try:
-            busctl = shutil.which('busctl')
-            if busctl is None:
-                raise RuntimeError('missing busctl utility')
-            json_out = subprocess.check_output(
-                [busctl, '--json=short', 'call', '--system',
-                 'org.freedesktop.resolve1',  # the service
-                 '/org/freedesktop/resolve1',  # the object
-                 'org.freedesktop.DBus.Properties',  # the interface
-                 'GetAll', 's',  # the method and signature
-                 'org.freedesktop.resolve1.Manager',  # the parameter
-                 ], text=True)
-            res = json.loads(json_out)
-            data = res.get('data', [{}])[0]
-            # make sure the type doesn't change. We expect an array of two
-            # intergers and an array of bytes (IP address)
-            assert data.get('DNS', {}).get('type') == 'a(iiay)', 'DNS address type doesn\'t match'
-            addresses = data.get('DNS', {}).get('data')
-            # make sure the type dosn't change. We expect an array of an integer
-            # a string (DNS search domain) and a boolean
-            assert data.get('Domains', {}).get('type') == 'a(isb)', 'DNS search type doesn\'t match'
-            search = data.get('Domains', {}).get('data')
+            if ifnames is None:
+                data = cls.query_resolved_properties('/org/freedesktop/resolve1', 'org.freedesktop.resolve1.Manager')
+                # make sure the type doesn't change. We expect an array of two
+                # intergers and an array of bytes (IP address)
+                assert data.get('DNS', {}).get('type') == 'a(iiay)', 'DNS address type doesn\'t match'
+                addresses = data.get('DNS', {}).get('data')
+                # make sure the type dosn't change. We expect an array of an integer
+                # a string (DNS search domain) and a boolean
+                assert data.get('Domains', {}).get('type') == 'a(isb)', 'DNS search type doesn\'t match'
+                search = data.get('Domains', {}).get('data')
+            else:
+                addresses = []
+                search = []
+                for ifname in ifnames:
+                    try:
+                        idx = if_nametoindex(ifname)
+                    except OSError:  # the interface is gone already
+                        continue
+                    # The link object path is the escaped ifindex, e.g. '_32' for '2'
+                    data = cls.query_resolved_properties('/org/freedesktop/resolve1/link/_3{}'.format(idx),
+                                                         'org.freedesktop.resolve1.Link')
+                    # Same as the manager data above, but without the ifindex
+                    assert data.get('DNS', {}).get('type') == 'a(iay)', 'DNS address type doesn\'t match'
+                    addresses += [[idx] + dns for dns in data.get('DNS', {}).get('data', [])]
+                    assert data.get('Domains', {}).get('type') == 'a(sb)', 'DNS search type doesn\'t match'
+                    search += [[idx] + domain for domain in data.get('Domains', {}).get('data', [])]
         except Exception as err:
             logging.debug('Cannot query resolved DNS data: %s', str(err))
         return (addresses, search)
 
-    @classmethod
-    def query_members(cls, ifname: str) -> List[str]:
-        ''' Return a list containing the interfaces that are members of a bond/bridge/vrf '''
-        members = []
-        output: str = None
-        try:
-            output = subprocess.check_output(
-                ['ip', '-d', '-j', 'link', 'show', 'master', ifname], text=True)   # wokeignore:rule=master
-        except Exception as e:
-            logging.warning('Cannot query bridge: {}'.format(str(e)))
-            return []
-
-        output_json = json.loads(output)
-        for member in output_json:
-            members.append(member.get('ifname'))
-
-        return members
-
     @classmethod
     def correlate_members_and_uplink(cls, interfaces: List[Interface]) -> None:
         '''
         Associate interfaces with their members and parent interfaces.
         If an interface is a member of a bond/bridge/vrf, identify which interface
         if a member of. If an interface has members, identify what are the members.
+        The membership is derived from the iproute2 data of each member link,
+        so no additional queries are needed.
         '''
         uplink_types = ['bond', 'bridge', 'vrf']
-        members_to_uplink = {}
+        uplinks = {itf.name: itf for itf in interfaces if itf.type in uplink_types}
         uplink_to_members = defaultdict(list)
-        for interface in filter(lambda i: i.type in uplink_types, interfaces):
-            members = cls.query_members(interface.name)
-            for member in members:
-                member_tuple = namedtuple('Member', ['name', 'type'])
-                members_to_uplink[member] = member_tuple(interface.name, interface.type)
-            uplink_to_members[interface.name] = members
 
         for interface in interfaces:
-            if uplink := members_to_uplink.get(interface.name):
-                if uplink.type == 'bridge':
-                    interface.bridge = uplink.name
-                if uplink.type == 'bond':
-                    interface.bond = uplink.name
-                if uplink.type == 'vrf':
-                    interface.vrf = uplink.name
-
-            if interface.type in uplink_types:
-                if members := uplink_to_members.get(interface.name):
-                    interface.members = members
+            if not interface.uplink:
+                continue
+            uplink = uplinks.get(interface.uplink)
+            # The uplink might not have been queried (see SystemConfigState.queries()),
+            # use the kind of membership reported by iproute2 in this case
+            uplink_type = uplink.type if uplink else interface.uplink_kind
+            if uplink_type == 'bridge':
+                interface.bridge = interface.uplink
+            if uplink_type == 'bond':
+                interface.bond = interface.uplink
+            if uplink_type == 'vrf':
+                interface.vrf = interface.uplink
+            if uplink:
+                uplink_to_members[uplink.name].append(interface.name)
+
+        for name, members in uplink_to_members.items():
+            uplinks[name].members = members
 
     @property
     def number_of_interfaces(self) -> int:
+        if self.scoped:  # the other interfaces have not been queried
+            return len(self.state) - 1
         return len(self.interface_list)
 
     def get_data(self) -> dict:
@@ -16,10 +16,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import defaultdict
+import dataclasses
 import ipaddress
 import json
 from socket import AF_INET, AF_INET6
-from typing import AbstractSet
+from typing import AbstractSet, Dict, List, Union
 
 from netplan.netdef import NetplanRoute
 from netplan_cli.cli.state import SystemConfigState, NetplanConfigState, DEVICE_TYPES
@@ -47,6 +48,53 @@ class NetplanDiffState():
 
         self.route_lookup_table_names = {}
 
+        # Parsed IP addresses/networks, as the same ones show up in many addresses and routes
+        self._ip_interfaces: Dict[str, Union[ipaddress.IPv4Interface, ipaddress.IPv6Interface]] = {}
+        # Results derived from the system state, see _get_system_data()
+        self._system_data: dict = None
+        # System interfaces per netdef ID, see _system_interfaces_by_netdef()
+        self._netdef_index: Dict[str, List[str]] = None
+        # Data sources per system interface name
+        self._data_sources: Dict[str, dict] = None
+        # Netplan interfaces and per-interface diffs, computed on demand, see diff_for()
+        self._netplan_interfaces: dict = None
+        self._interface_diffs: Dict[str, dict] = {}
+        self._missing_interfaces: Dict[str, dict] = {}
+
+    def _ip_interface(self, address: str) -> Union[ipaddress.IPv4Interface, ipaddress.IPv6Interface]:
+        if (ip := self._ip_interfaces.get(address)) is None:
+            ip = self._ip_interfaces[address] = ipaddress.ip_interface(address)
+        return ip
+
+    def _get_system_data(self) -> dict:
+        '''
+        Return the data of the system state, dropping all the results derived from it
+        if the system state changed.
+        '''
+        system_interfaces = self.system_state.get_data()
+        if self._system_data is not system_interfaces:
+            self._system_data = system_interfaces
+            self._netdef_index = None
+            self._data_sources = None
+            self._netplan_interfaces = None
+            self._interface_diffs = {}
+            self._missing_interfaces = {}
+        return system_interfaces
+
+    def _system_interfaces_by_netdef(self) -> Dict[str, List[str]]:
+        '''
+        Return the names of the system interfaces pointing to each netdef ID, so that
+        netdefs and interfaces can be joined without scanning all the interfaces for
+        each netdef. The index is rebuilt if the system state changed.
+        '''
+        system_interfaces = self._get_system_data()
+        if self._netdef_index is None:
+            self._netdef_index = defaultdict(list)
+            for key, value in system_interfaces.items():
+                if netdef_id := value.get('id'):
+                    self._netdef_index[netdef_id].append(key)
+        return self._netdef_index
+
     def get_full_state(self) -> dict:
         '''
         Return the states of both the system and Netplan in a common representation
@@ -57,22 +105,8 @@ class NetplanDiffState():
             'interfaces': {}
         }
 
-        system_interfaces = self._get_system_interfaces()
-        netplan_interfaces = self._get_netplan_interfaces()
-
-        # Merge all the interfaces in the same data structure
-        all_interfaces = set(list(system_interfaces.keys()) + list(netplan_interfaces.keys()))
-        for interface in all_interfaces:
-            full_state['interfaces'][interface] = {}
-
-        for interface, config in system_interfaces.items():
-            full_state['interfaces'][interface].update(config)
-
-        for interface, config in netplan_interfaces.items():
-            full_state['interfaces'][interface].update(config)
-
-        for interface in self.system_state.interface_list:
-            full_state['interfaces'][interface.name]['data_sources'] = interface.data_sources
+        for interface in self._get_interface_names():
+            full_state['interfaces'][interface] = self._get_interface_config(interface)
 
         return full_state
 
@@ -86,36 +120,98 @@ class NetplanDiffState():
         absence of addresses that should be assigned by DHCP as a difference.
         '''
 
-        full_state = self.get_full_state()
-        interfaces = self._get_comparable_interfaces(full_state.get('interfaces', {}))
+        report = self._create_new_report()
+        report.update(self.get_missing_interfaces(interface))
 
-        if interface:
-            if config := interfaces.get(interface):
-                interfaces = {interface: config}
-            else:
-                interfaces = {}
+        for name in [interface] if interface else self._get_interface_names():
+            if iface := self.diff_for(name):
+                report['interfaces'][name] = iface
 
-        report = self._create_new_report()
+        # Sort the list of interfaces according to their indices.
+        report['interfaces'] = dict(sorted(report['interfaces'].items(), key=lambda iface: iface[1].get('index')))
+        return report
 
-        self._analyze_missing_interfaces(report, interface)
+    def diff_for(self, interface: str) -> dict:
+        '''
+        Compare a single interface, as found in the system, against its Netplan configuration.
+        Returns the same entry as found in get_diff()['interfaces'], or None if the interface
+        cannot be compared. The result is computed on demand and only once per interface.
+        '''
+        self._get_system_data()
+        if interface not in self._interface_diffs:
+            config = self._get_interface_config(interface)
+            iface = None
+            if self._is_comparable_interface(config):
+                netdef_id = config.get('system_state', {}).get('id')
+                index = config.get('system_state', {}).get('index')
+                iface = self._create_new_iface(netdef_id, interface, index)
+
+                self._analyze_ip_addresses(config, iface)
+                self._analyze_nameservers(config, iface)
+                self._analyze_search_domains(config, iface)
+                self._analyze_mac_addresses(config, iface)
+                self._analyze_routes(config, iface)
+                self._analyze_parent_links(config, iface)
+                iface = iface[interface]
+            self._interface_diffs[interface] = iface
+        return self._interface_diffs[interface]
+
+    def get_missing_interfaces(self, interface: str = '') -> dict:
+        '''
+        Return the interfaces that are found only in Netplan ('missing_interfaces_system') or
+        only in the system ('missing_interfaces_netplan'), as reported by get_diff().
+        '''
+        self._get_system_data()
+        if interface not in self._missing_interfaces:
+            report = self._create_new_report()
+            del report['interfaces']
+            self._analyze_missing_interfaces(report, interface)
+            self._missing_interfaces[interface] = report
+        return self._missing_interfaces[interface]
+
+    def has_any_diff(self) -> bool:
+        '''
+        Check if there is any difference between the system and Netplan, stopping at the
+        first one found instead of comparing all the interfaces.
+        '''
+        if any(self.get_missing_interfaces().values()):
+            return True
 
-        for interface, config in interfaces.items():
-            netdef_id = config.get('system_state', {}).get('id')
-            index = config.get('system_state', {}).get('index')
-            iface = self._create_new_iface(netdef_id, interface, index)
+        for interface in self._get_interface_names():
+            if (iface := self.diff_for(interface)) and (iface['system_state'] or iface['netplan_state']):
+                return True
+        return False
 
-            self._analyze_ip_addresses(config, iface)
-            self._analyze_nameservers(config, iface)
-            self._analyze_search_domains(config, iface)
-            self._analyze_mac_addresses(config, iface)
-            self._analyze_routes(config, iface)
-            self._analyze_parent_links(config, iface)
+    def _get_interface_names(self) -> List[str]:
+        system_interfaces = self._get_system_data()
+        netplan_interfaces = [name for name in self._get_netplan_interfaces_once() if name not in system_interfaces]
+        return [name for name in system_interfaces if name != 'netplan-global-state'] + netplan_interfaces
 
-            report['interfaces'].update(iface)
+    def _get_interface_config(self, interface: str) -> dict:
+        ''' Return the state of a single interface, see get_full_state() '''
+        config = {}
 
-        # Sort the list of interfaces according to their indices.
-        report['interfaces'] = dict(sorted(report['interfaces'].items(), key=lambda iface: iface[1].get('index')))
-        return report
+        system_interfaces = self._get_system_data()
+        if interface != 'netplan-global-state' and interface in system_interfaces:
+            config.update(self._get_system_interface(system_interfaces[interface]))
+
+        if netplan_config := self._get_netplan_interfaces_once().get(interface):
+            config.update(netplan_config)
+
+        if self._data_sources is None:
+            self._data_sources = {iface.name: iface.data_sources for iface in self.system_state.interface_list}
+        if interface in self._data_sources:
+            config['data_sources'] = self._data_sources[interface]
+
+        return config
+
+    def _get_netplan_interfaces_once(self) -> dict:
+        # The members of a netdef are only known after going through all of them,
+        # so the Netplan side is built at once and reused for every interface
+        self._get_system_data()
+        if self._netplan_interfaces is None:
+            self._netplan_interfaces = self._get_netplan_interfaces()
+        return self._netplan_interfaces
 
     def _create_new_report(self) -> dict:
         return {
@@ -145,7 +241,7 @@ class NetplanDiffState():
         link_local = config.get('netplan_state', {}).get('link_local', [])
         system_ips = set()
         for addr, addr_data in config.get('system_state', {}).get('addresses', {}).items():
-            ip = ipaddress.ip_interface(addr)
+            ip = self._ip_interface(addr)
             flags = addr_data.get('flags', [])
 
             # Select only static IPs
@@ -208,18 +304,13 @@ class NetplanDiffState():
             but will be missing in Netplan. That will happen when the user removes the interface
             only from Netplan but doesn't run netplan apply.
         '''
-        filtered = {}
-
-        for interface, config in interfaces.items():
-            if config.get('system_state') is None or config.get('netplan_state') is None:
-                continue
+        return {interface: config for interface, config in interfaces.items() if self._is_comparable_interface(config)}
 
-            if not config.get('system_state', {}).get('id'):
-                continue
-
-            filtered[interface] = config
+    def _is_comparable_interface(self, config: dict) -> bool:
+        if config.get('system_state') is None or config.get('netplan_state') is None:
+            return False
 
-        return filtered
+        return bool(config.get('system_state', {}).get('id'))
 
     def _normalize_ip_addresses(self, addresses: set) -> set:
         ''' Apply some transformations to IP addresses so their representation
@@ -240,7 +331,7 @@ class NetplanDiffState():
         If "address" is not an IPv6Address, return the original value
         '''
         try:
-            addr = ipaddress.ip_interface(address)
+            addr = self._ip_interface(address)
             if '/' in address:
                 return addr.with_prefixlen
             return str(addr.ip)
@@ -474,6 +565,10 @@ class NetplanDiffState():
         '''
         new_routes_set = set()
         for route in routes:
+            # The netplan_state (and its routes) is shared by all the interfaces
+            # matching the same netdef, so don't normalize the same route twice
+            route = dataclasses.replace(route)
+
             # If the table is unspecified we set it to main
             if route.table == NetplanRoute._TABLE_UNSPEC_:
                 route.table = self._default_route_tables_name_to_number('main')
@@ -509,8 +604,7 @@ class NetplanDiffState():
         system_interfaces = self.system_state.get_data()
         interface = config.get('id')
 
-        ifaces = [iface for iface in system_interfaces.values()
-                  if iface.get('id') == interface]
+        ifaces = [system_interfaces[name] for name in self._system_interfaces_by_netdef().get(interface, [])]
         routes = [route for iface in ifaces for route in iface.get('routes', [])]
 
         if gateway4 := config.get('gateway4'):
@@ -559,15 +653,15 @@ class NetplanDiffState():
         Netplan configuration so there is no point in comparing them against Netplan.
         '''
 
-        local_networks = [str(ipaddress.ip_interface(ip).network) for ip in system_addresses]
+        local_networks = {str(self._ip_interface(ip).network) for ip in system_addresses}
         # filter out the local link network as we give special treatment to it
-        local_networks = list(filter(lambda n: n != 'fe80::/64', local_networks))
-        addresses = [str(ipaddress.ip_interface(ip).ip) for ip in system_addresses]
+        local_networks.discard('fe80::/64')
+        addresses = {str(self._ip_interface(ip).ip) for ip in system_addresses}
         link_local = config.get('netplan_state', {}).get('link_local', [])
         routes = set()
         for route in system_routes:
             # Filter out link routes (but not link local as we handle them differently)
-            if route.scope == 'link' and route.to != 'default' and not ipaddress.ip_interface(route.to).is_link_local:
+            if route.scope == 'link' and route.to != 'default' and not self._ip_interface(route.to).is_link_local:
                 continue
 
             # Filter out routes installed by DHCP
@@ -582,7 +676,7 @@ class NetplanDiffState():
             # Filter out Link Local routes
             # We only filter them out if the respective 'link-local' setting is present in the netdef
             if route.to != 'default':
-                route_to = ipaddress.ip_interface(route.to)
+                route_to = self._ip_interface(route.to)
                 if route_to.is_link_local:
                     if route.family == AF_INET6.value and 'ipv6' in link_local:
                         continue
@@ -591,7 +685,7 @@ class NetplanDiffState():
 
             # Filter out host scoped routes
             if (route.scope == 'host' and route.type == 'local' and
-                    (route.to in addresses or ipaddress.ip_interface(route.to).is_loopback)):
+                    (route.to in addresses or self._ip_interface(route.to).is_loopback)):
                 continue
 
             # Filter out the default IPv6 multicast route
@@ -608,6 +702,7 @@ class NetplanDiffState():
 
     def _get_netplan_interfaces(self) -> dict:
         system_interfaces = self.system_state.get_data()
+        netdef_index = self._system_interfaces_by_netdef()
         interfaces = {}
         for interface, config in self.netplan_state.netdefs.items():
 
@@ -671,11 +766,9 @@ class NetplanDiffState():
                 # In these cases, we need to look for all the system's interfaces
                 # pointing to this netdef and add one netdef entry per device.
                 found_some = False
-                for key, value in system_interfaces.items():
-                    if netdef_id := value.get('id'):
-                        if netdef_id == interface:
-                            found_some = True
-                            interfaces[key] = iface[interface]
+                for key in netdef_index.get(interface, []):
+                    found_some = True
+                    interfaces[key] = iface[interface]
 
                 # If we don't find any system interface associated with the netdef
                 # that's because it's not matching any device. In this case, we add the
@@ -709,52 +802,57 @@ class NetplanDiffState():
             if interface == 'netplan-global-state':
                 continue
 
-            device_type = config.get('type')
-            interfaces[interface] = {'system_state': {'type': device_type}}
+            interfaces[interface] = self._get_system_interface(config)
 
-            if netdef_id := config.get('id'):
-                interfaces[interface]['system_state']['id'] = netdef_id
+        return interfaces
 
-            iface_ref = interfaces[interface]['system_state']
+    def _get_system_interface(self, config: dict) -> dict:
+        device_type = config.get('type')
+        interface = {'system_state': {'type': device_type}}
 
-            if index := config.get('index'):
-                iface_ref['index'] = index
+        if netdef_id := config.get('id'):
+            interface['system_state']['id'] = netdef_id
 
-            addresses = {}
-            for addr in config.get('addresses', []):
-                ip = list(addr.keys())[0]
-                prefix = addr.get(ip).get('prefix')
-                full_addr = f'{ip}/{prefix}'
+        iface_ref = interface['system_state']
 
-                addresses[full_addr] = {'flags': addr.get(ip).get('flags', [])}
-            if addresses:
-                iface_ref['addresses'] = addresses
+        if index := config.get('index'):
+            iface_ref['index'] = index
 
-            if nameservers := config.get('dns_addresses'):
-                iface_ref['nameservers_addresses'] = nameservers
+        addresses = {}
+        for addr in config.get('addresses', []):
+            ip = list(addr.keys())[0]
+            prefix = addr.get(ip).get('prefix')
+            full_addr = f'{ip}/{prefix}'
 
-            if search := config.get('dns_search'):
-                iface_ref['nameservers_search'] = search
+            addresses[full_addr] = {'flags': addr.get(ip).get('flags', [])}
+        if addresses:
+            iface_ref['addresses'] = addresses
 
-            if routes := config.get('routes'):
-                iface_ref['routes'] = [self._system_route_to_netplan(route) for route in routes]
+        if nameservers := config.get('dns_addresses'):
+            iface_ref['nameservers_addresses'] = nameservers
 
-            if mac := config.get('macaddress'):
-                iface_ref['macaddress'] = mac
+        if search := config.get('dns_search'):
+            iface_ref['nameservers_search'] = search
 
-            if uplink_interfaces := config.get('interfaces'):
-                iface_ref['interfaces'] = uplink_interfaces
+        if routes := config.get('routes'):
+            iface_ref['routes'] = [self._system_route_to_netplan(route) for route in routes]
 
-            if bond := config.get('bond'):
-                iface_ref['bond'] = bond
+        if mac := config.get('macaddress'):
+            iface_ref['macaddress'] = mac
 
-            if bridge := config.get('bridge'):
-                iface_ref['bridge'] = bridge
+        if uplink_interfaces := config.get('interfaces'):
+            iface_ref['interfaces'] = uplink_interfaces
 
-            if vrf := config.get('vrf'):
-                iface_ref['vrf'] = vrf
+        if bond := config.get('bond'):
+            iface_ref['bond'] = bond
 
-        return interfaces
+        if bridge := config.get('bridge'):
+            iface_ref['bridge'] = bridge
+
+        if vrf := config.get('vrf'):
+            iface_ref['vrf'] = vrf
+
+        return interface
 
     def _system_route_to_netplan(self, system_route: dict) -> NetplanRoute:
         route = {}
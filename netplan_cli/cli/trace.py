@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2025 Canonical, Ltd.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Opt-in tracing of netplan phases, enabled via 'NETPLAN_TRACE=<file>' or the
+'--trace <file>' argument of some commands.
+
+Every phase is recorded as a complete event ("ph": "X") in the Chrome trace
+event format, including its wall time and the number of subprocesses spawned.
+The events are appended to the trace file as lines of a JSON array, so that
+the C binaries (generate/configure) can add their own spans to the same file,
+using the same (CLOCK_MONOTONIC) time base. The netplan process that started
+the trace turns it into a proper JSON object once it is done.
+'''
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_ENV = 'NETPLAN_TRACE'
+TRACE_OWNER_ENV = 'NETPLAN_TRACE_OWNER'
+
+_path = None
+_owner = False
+_subprocesses = 0
+_hook_installed = False
+
+
+def _audit_hook(event, args):  # pragma: nocover (audit hooks run untraced)
+    global _subprocesses
+    if event == 'subprocess.Popen':
+        _subprocesses += 1
+
+
+def _now_usec() -> int:
+    return time.monotonic_ns() // 1000
+
+
+def enabled() -> bool:
+    return _path is not None
+
+
+def start(path: str = None):
+    '''Start tracing into the given file, or into $NETPLAN_TRACE'''
+    global _path, _owner, _hook_installed
+    path = path or os.environ.get(TRACE_ENV)
+    if not path or _path:
+        return
+    _path = os.path.abspath(path)
+    # Let child processes (e.g. the generate/configure binaries) add their spans
+    os.environ[TRACE_ENV] = _path
+    if os.environ.get(TRACE_OWNER_ENV) is None:
+        os.environ[TRACE_OWNER_ENV] = str(os.getpid())
+        _owner = True
+        with open(_path, 'w') as f:
+            f.write('[\n')
+    if not _hook_installed:
+        sys.addaudithook(_audit_hook)
+        _hook_installed = True
+
+
+def finish():
+    '''Stop tracing and turn the trace file into a JSON object, if we own it'''
+    global _path, _owner
+    if not _path:
+        return
+    if _owner:
+        events = load(_path)
+        tmp = _path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        os.replace(tmp, _path)
+        del os.environ[TRACE_OWNER_ENV]
+        logging.debug('Wrote %d trace events to %s', len(events), _path)
+    _path = None
+    _owner = False
+
+
+def load(path: str) -> list:
+    '''Read the events of a (finished or unfinished) trace file'''
+    with open(path, 'r') as f:
+        content = f.read()
+    try:
+        data = json.loads(content)
+        return data.get('traceEvents', []) if isinstance(data, dict) else data
+    except json.JSONDecodeError:
+        pass
+    events = []
+    for line in content.splitlines():
+        line = line.strip().rstrip(',')
+        if line in ('', '[', ']'):
+            continue
+        events.append(json.loads(line))
+    return events
+
+
+def _write_event(name: str, start_usec: int, dur_usec: int, args: dict):
+    event = {'name': name, 'cat': 'netplan', 'ph': 'X',
+             'ts': start_usec, 'dur': dur_usec,
+             'pid': os.getpid(), 'tid': threading.get_native_id(),
+             'args': args}
+    try:
+        with open(_path, 'a') as f:
+            f.write(json.dumps(event) + ',\n')
+    except OSError as e:
+        logging.debug('Cannot write trace file %s: %s', _path, e)
+
+
+def mark() -> tuple:
+    '''Remember the beginning of a phase, to be passed to record()'''
+    return (_now_usec(), _subprocesses)
+
+
+def record(name: str, begin: tuple):
+    '''Record the wall time and subprocess count of a phase, if tracing'''
+    if not _path:
+        return
+    start_usec, start_subprocesses = begin
+    _write_event(name, start_usec, _now_usec() - start_usec,
+                 {'subprocesses': _subprocesses - start_subprocesses})
+
+
+@contextmanager
+def span(name: str):
+    '''Context manager (or decorator) recording a phase, if tracing'''
+    begin = mark()
+    try:
+        yield
+    finally:
+        record(name, begin)
@@ -23,7 +23,8 @@ import subprocess
 import fnmatch
 import re
 import json
-from typing import Optional
+import shutil
+from typing import Dict, List, Optional
 
 from ..configmanager import ConfigurationError
 from netplan import NetDefinition, NetplanException
@@ -31,6 +32,8 @@ from netplan import NetDefinition, NetplanException
 
 NM_SERVICE_NAME = 'NetworkManager.service'
 NM_SNAP_SERVICE_NAME = 'snap.network-manager.networkmanager.service'
+NM_DBUS_NAME = 'org.freedesktop.NetworkManager'
+NM_DBUS_PATH = '/org/freedesktop/NetworkManager'
 
 OLD_RT_TABLES_PATH = '/etc/iproute2/rt_tables'
 NEW_RT_TABLES_PATH = '/usr/share/iproute2/rt_tables'
@@ -58,10 +61,10 @@ def nmcli(args):  # pragma: nocover (covered in autopkgtest)
     subprocess.check_call(['nmcli'] + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 
-def nmcli_out(args: list) -> str:  # pragma: nocover (covered in autopkgtest)
+def nmcli_out(args: list, timeout: float = None) -> str:  # pragma: nocover (covered in autopkgtest)
     # 'nmcli' could be /usr/bin/nmcli or /snap/bin/nmcli -> /snap/bin/network-manager.nmcli
     # PATH is defined in cli/core.py
-    return subprocess.check_output(['nmcli'] + args, text=True)
+    return subprocess.check_output(['nmcli'] + args, text=True, timeout=timeout)
 
 
 def nm_running():  # pragma: nocover (covered in autopkgtest)
@@ -102,6 +105,69 @@ def nm_bring_interface_up(connection: str) -> None:  # pragma: nocover (must be
         pass
 
 
+def nm_keyfile_connection(path: str) -> dict:
+    '''Read the [connection] section of a NetworkManager keyfile'''
+    settings = {}
+    section = None
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('['):
+                section = line
+            elif section == '[connection]' and '=' in line:
+                key, value = line.split('=', 1)
+                settings[key] = value
+    return settings
+
+
+def nm_dbus_call(obj: str, interface: str, method: str, args: Optional[list] = None) -> list:
+    '''Call a NetworkManager D-Bus method and return its (JSON decoded) reply data'''
+    busctl = shutil.which('busctl')
+    if busctl is None:
+        raise RuntimeError('missing busctl utility')
+    out = subprocess.check_output([busctl, '--json=short', 'call', '--system',
+                                   NM_DBUS_NAME, obj, NM_DBUS_NAME + interface, method] + (args or []),
+                                  text=True, stderr=subprocess.DEVNULL)
+    if not out.strip():
+        return []
+    return json.loads(out).get('data', [])
+
+
+def nm_reload_connections() -> None:
+    '''Make NetworkManager re-read all connection profiles from disk'''
+    res = nm_dbus_call(NM_DBUS_PATH + '/Settings', '.Settings', 'ReloadConnections')
+    if res != [True]:
+        raise RuntimeError('NetworkManager failed to reload its connection profiles')
+
+
+def nm_active_connections() -> Dict[str, str]:
+    '''Map the UUIDs of the active NetworkManager connections to the interface they are active on'''
+    active = {}
+    for line in nmcli_out(['-t', '-f', 'UUID,DEVICE', 'connection', 'show', '--active']).splitlines():
+        uuid, _, device = line.partition(':')
+        device = device.replace('\\:', ':')  # terse mode escapes colons in values
+        if uuid and device:
+            active[uuid] = device
+    return active
+
+
+def nm_reapply_connection(uuid: str, interface: str) -> None:
+    '''
+    Bring the changed profile of a connection, that is active on the given
+    interface, into effect. It is reapplied in place, or gets re-activated on
+    the same device if NM refuses to reapply the changes.
+    '''
+    [connection] = nm_dbus_call(NM_DBUS_PATH + '/Settings', '.Settings', 'GetConnectionByUuid', ['s', uuid])
+    [device] = nm_dbus_call(NM_DBUS_PATH, '', 'GetDeviceByIpIface', ['s', interface])
+    try:
+        # An empty settings dict reapplies the updated profile of the active connection
+        nm_dbus_call(device, '.Device', 'Reapply', ['a{sa{sv}}tu', '0', '0', '0'])
+        return
+    except subprocess.CalledProcessError:
+        logging.debug('Cannot reapply connection %s on %s, re-activating it', uuid, interface)
+    nm_dbus_call(NM_DBUS_PATH, '', 'ActivateConnection', ['ooo', connection, device, '/'])
+
+
 def systemctl_network_manager(action, sync=False):
     # If the network-manager snap is installed use its service
     # name rather than the one of the deb packaged NetworkManager
@@ -240,14 +306,24 @@ def get_interface_macaddress(interface: str) -> Optional[str]:
     return mac
 
 
-def find_matching_iface(interfaces: list, netdef):
+def match_interfaces(interfaces: list, np_state) -> Dict[str, List[str]]:
+    '''
+    Match all netdefs of np_state against the given system interfaces at once,
+    querying the driver and MAC address of each interface only once.
+    Returns a dict of netdef IDs, mapping to the names of their matching interfaces.
+    '''
+    matches, _ = np_state._match_interfaces(
+        [(itf, get_interface_driver_name(itf), get_interface_macaddress(itf)) for itf in interfaces])
+    return matches
+
+
+def find_matching_iface(interfaces: list, netdef, matches: Dict[str, List[str]] = None):
     assert isinstance(netdef, NetDefinition)
     assert netdef._has_match
 
-    matches = list(filter(lambda itf: netdef._match_interface(
-            iface_name=itf,
-            iface_driver=get_interface_driver_name(itf),
-            iface_mac=get_interface_macaddress(itf)), interfaces))
+    if matches is None:
+        matches = match_interfaces(interfaces, netdef._parent)
+    matches = matches.get(netdef.id, [])
 
     # Return current name of unique matched interface, if available
     if len(matches) != 1:
@@ -291,6 +367,7 @@ class NetplanCommand(argparse.Namespace):
         self.debug = False
         self.breakpoint = False
         self.commandclass = None
+        self.commandloader = None
         self.subcommands = {}
         self.subcommand = None
         self.func = None
@@ -324,6 +401,10 @@ class NetplanCommand(argparse.Namespace):
             print('You need to specify a command', file=sys.stderr)
             self.print_usage()
 
+        if self.commandloader:
+            self.commandclass = self.commandloader()()
+            self.func = self.commandclass.run
+
     def run_command(self):
         if self.commandclass:
             self.commandclass.update(self._args)
@@ -340,26 +421,14 @@ class NetplanCommand(argparse.Namespace):
         self.parser.print_help(file=sys.stderr)
         sys.exit(os.EX_USAGE)
 
-    def _add_subparser_from_class(self, name, commandclass):
-        instance = commandclass()
-
-        self.subcommands[name] = {}
-        self.subcommands[name]['class'] = name
-        self.subcommands[name]['instance'] = instance
-
-        if instance.testing:
-            if not os.environ.get('ENABLE_TEST_COMMANDS', None):
-                return
+    def _add_lazy_subparser(self, command_id, description, loader, testing=False):
+        '''Register a subcommand, whose class is only obtained via loader() once it got selected'''
+        if testing and not os.environ.get('ENABLE_TEST_COMMANDS', None):
+            return
 
-        p = self.subparsers.add_parser(instance.command_id,
-                                       description=instance.description,
-                                       help=instance.description,
+        p = self.subparsers.add_parser(command_id,
+                                       description=description,
+                                       help=description,
                                        add_help=False)
-        p.set_defaults(func=instance.run, commandclass=instance)
-        self.subcommands[name]['parser'] = p
-
-    def _import_subcommands(self, submodules):
-        import inspect
-        for name, obj in inspect.getmembers(submodules):
-            if inspect.isclass(obj) and issubclass(obj, NetplanCommand):
-                self._add_subparser_from_class(name, obj)
+        p.set_defaults(commandloader=loader)
+        self.subcommands[command_id] = {'loader': loader, 'parser': p}
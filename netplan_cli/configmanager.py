@@ -17,16 +17,39 @@
 
 '''netplan configuration manager'''
 
+import errno
+import fcntl
+import filecmp
+import glob
 import io
 import logging
 import netplan
 import os
 import shutil
+import stat
 import sys
 import tempfile
 
 from typing import Optional
 
+from .cli import trace
+
+# ioctl request to clone a file as a copy-on-write reflink: _IOW(0x94, 9, int), see linux/fs.h
+FICLONE = 0x40049409
+# (source, destination) device pairs that cannot be reflinked, e.g. on tmpfs or across filesystems
+_reflink_unsupported = set()
+# Generator output next to the backend configuration, which is not restored
+# by revert() and changes to which need a full 'netplan apply' to take effect
+GENERATOR_OUTPUT_GLOBS = [
+    'run/NetworkManager/conf.d/netplan.conf',
+    'run/NetworkManager/conf.d/10-globally-managed-devices.conf',
+    'run/netplan/wpa-*.conf',
+    'run/systemd/system/netplan-*',
+    'run/systemd/system/*.wants/netplan-*',
+    'run/systemd/system/systemd-networkd-wait-online.service.d/10-netplan*.conf',
+    'run/udev/rules.d/*netplan*.rules',
+]
+
 
 class ConfigManager(object):
     def __init__(self, prefix="/", extra_files={}):
@@ -34,6 +57,7 @@ class ConfigManager(object):
         self.extra_files = extra_files
         self.new_interfaces = set()
         self.np_state: Optional[netplan.State] = None
+        self._np_state_key: Optional[tuple] = None
 
     def __getattr__(self, attr):
         if attr == '_tempdir':
@@ -64,14 +88,22 @@ class ConfigManager(object):
         interfaces.update(self.np_state.vrfs)
         return interfaces
 
+    @trace.span('ConfigManager.parse')
     def parse(self, extra_config=None):
         """
         Parse all our config files to return an object that describes the system's
         entire configuration, so that it can later be interrogated.
+        The result is memoized, as long as the set of config files and their
+        modification times stay the same, so all phases can share it.
 
         Returns a libnetplan State wrapper
         """
 
+        key = self._config_files_key(extra_config)
+        if self.np_state is not None and key == self._np_state_key:
+            logging.debug('Re-using parsed config of {}'.format(self.prefix))
+            return self.np_state
+
         # /run/netplan shadows /etc/netplan/, which shadows /lib/netplan
         parser = netplan.Parser()
         try:
@@ -84,16 +116,34 @@ class ConfigManager(object):
             self.np_state = netplan.State()
             self.np_state.import_parser_results(parser)
         except netplan.NetplanException as e:
+            self.np_state = None
+            self._np_state_key = None
             raise ConfigurationError(str(e))
+        self._np_state_key = key
 
         # Convoluted way to dump the parsed config to the logs...
-        with io.StringIO() as tmp:
-            self.np_state._dump_yaml(output_file=tmp)
-            tmp.seek(0)
-            logging.debug("Merged config:\n{}".format(tmp.read()))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            with io.StringIO() as tmp:
+                self.np_state._dump_yaml(output_file=tmp)
+                tmp.seek(0)
+                logging.debug("Merged config:\n{}".format(tmp.read()))
 
         return self.np_state
 
+    def _config_files_key(self, extra_config=None) -> tuple:
+        '''Identify the current set of config files, including their mtimes'''
+        files = []
+        for subdir in ('lib', 'etc', 'run'):
+            files.extend(sorted(glob.glob(os.path.join(self.prefix, subdir, 'netplan', '*.yaml'))))
+        key = []
+        for f in files + list(extra_config or []):
+            try:
+                st = os.stat(f)
+                key.append((f, st.st_ino, st.st_size, st.st_mtime_ns))
+            except OSError:
+                key.append((f, None))
+        return tuple(key)
+
     def add(self, config_dict):
         for config_file in config_dict:
             self._copy_file(config_file, config_dict[config_file])
@@ -101,6 +151,7 @@ class ConfigManager(object):
 
         # Invalidate the current parsed state
         self.np_state = None
+        self._np_state_key = None
 
     @property
     def tempdir(self):
@@ -122,23 +173,20 @@ class ConfigManager(object):
         self.copy_tree(os.path.join(self.prefix, "run/systemd/network"),
                        os.path.join(temp_run, "systemd", "network"),
                        missing_ok=True)
+        temp_generated = os.path.join(self.tempdir, "generated")
+        os.makedirs(temp_generated, exist_ok=True)
+        for path in self._generator_output(self.prefix):
+            os.makedirs(os.path.dirname(os.path.join(temp_generated, path)), exist_ok=True)
+            shutil.copy(os.path.join(self.prefix, path), os.path.join(temp_generated, path), follow_symlinks=False)
 
     def revert(self):
         try:
             for extra_file in dict(self.extra_files):
                 os.unlink(self.extra_files[extra_file])
                 del self.extra_files[extra_file]
-            temp_run = os.path.join(self.tempdir, "run")
-            temp_nm_path = "{}/NetworkManager/system-connections".format(temp_run)
-            temp_networkd_path = "{}/systemd/network".format(temp_run)
-            if os.path.exists(temp_nm_path):
-                shutil.rmtree(os.path.join(self.prefix, "run/NetworkManager/system-connections"))
-                self.copy_tree(temp_nm_path,
-                               os.path.join(self.prefix, "run/NetworkManager/system-connections"))
-            if os.path.exists(temp_networkd_path):
-                shutil.rmtree(os.path.join(self.prefix, "run/systemd/network"))
-                self.copy_tree(temp_networkd_path,
-                               os.path.join(self.prefix, "run/systemd/network"))
+            for backup, path in self._backend_dirs():
+                if os.path.exists(backup):
+                    self.restore_tree(backup, path)
         except Exception as e:  # pragma: nocover (only relevant to filesystem failures)
             # If we reach here, we're in big trouble. We may have wiped out
             # file NM or networkd are using, and we most likely removed the
@@ -150,6 +198,44 @@ class ConfigManager(object):
             logging.error("You should verify the netplan YAML in /etc/netplan and probably run 'netplan apply' again.")
             sys.exit(-1)
 
+    def changed_files(self):
+        '''
+        Returns the generated backend configuration files that have been added,
+        removed or changed since the last backup(), i.e. the files that revert()
+        is going to touch, followed by the other generator output (systemd units,
+        udev rules, ...) that changed, which revert() leaves alone.
+        '''
+        changes = []
+        for backup, path in self._backend_dirs():
+            if os.path.exists(backup):
+                stale, changed = self._tree_changes(backup, path)
+                changes.extend(stale + [f for f in changed if f not in stale])
+        temp_generated = os.path.join(self.tempdir, "generated")
+        if os.path.isdir(temp_generated):
+            backed_up = self._generator_output(temp_generated)
+            current = self._generator_output(self.prefix)
+            for path in sorted(backed_up | current):
+                if (path not in backed_up or path not in current
+                        or not _same_file(os.path.join(temp_generated, path), os.path.join(self.prefix, path))):
+                    changes.append(os.path.join(self.prefix, path))
+        return changes
+
+    @staticmethod
+    def _generator_output(root):
+        '''Returns the paths of the generator output in root, relative to root'''
+        paths = set()
+        for pattern in GENERATOR_OUTPUT_GLOBS:
+            paths.update(os.path.relpath(path, root) for path in glob.glob(os.path.join(root, pattern))
+                         if os.path.islink(path) or os.path.isfile(path))
+        return paths
+
+    def _backend_dirs(self):
+        temp_run = os.path.join(self.tempdir, "run")
+        return [(os.path.join(temp_run, "NetworkManager", "system-connections"),
+                 os.path.join(self.prefix, "run/NetworkManager/system-connections")),
+                (os.path.join(temp_run, "systemd", "network"),
+                 os.path.join(self.prefix, "run/systemd/network"))]
+
     def cleanup(self):
         if not hasattr(self, '_tempdir'):
             return
@@ -174,11 +260,101 @@ class ConfigManager(object):
             else:
                 raise
 
+    def restore_tree(self, src, dst):
+        '''
+        Restore the dst directory to the src snapshot, only touching the files
+        that have been added, removed or whose content changed since then.
+        Returns the list of touched paths.
+        '''
+        stale, changed = self._tree_changes(src, dst)
+        # Drop anything that is not part of the snapshot
+        for path in stale:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+        # Copy back the files that changed
+        os.makedirs(dst, exist_ok=True)
+        for path in changed:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            copy_with_ownership(os.path.join(src, os.path.relpath(path, dst)), path)
+        return stale + [path for path in changed if path not in stale]
+
+    def _tree_changes(self, src, dst):
+        '''
+        Compare the dst directory to the src snapshot. Returns the paths in dst
+        that are not part of the snapshot or are not regular files/directories
+        (e.g. symlinks, which must be replaced rather than written through),
+        and the files that are missing or whose content changed since then.
+        '''
+        stale = []
+        changed = []
+        regular = set()
+        for root, dirs, files in os.walk(dst):
+            snapshot = os.path.join(src, os.path.relpath(root, dst))
+            for name in list(dirs):
+                path = os.path.join(root, name)
+                if os.path.islink(path) or not os.path.isdir(os.path.join(snapshot, name)):
+                    stale.append(path)
+                    dirs.remove(name)
+            for name in files:
+                path = os.path.join(root, name)
+                if not stat.S_ISREG(os.lstat(path).st_mode) or not os.path.isfile(os.path.join(snapshot, name)):
+                    stale.append(path)
+                else:
+                    regular.add(path)
+        for root, dirs, files in os.walk(src):
+            target = os.path.normpath(os.path.join(dst, os.path.relpath(root, src)))
+            for name in files:
+                path = os.path.join(target, name)
+                if path not in regular or not filecmp.cmp(os.path.join(root, name), path, shallow=False):
+                    changed.append(path)
+        return stale, changed
+
+
+def _same_file(a, b) -> bool:
+    '''Compare two files by content, or symlinks by their target'''
+    if os.path.islink(a) or os.path.islink(b):
+        return os.path.islink(a) and os.path.islink(b) and os.readlink(a) == os.readlink(b)
+    return filecmp.cmp(a, b, shallow=False)
+
+
+def reflink(src, dst, follow_symlinks=True) -> bool:
+    '''
+    Try to clone src to dst as a copy-on-write reflink, without copying any data.
+    Returns False if that is not possible, e.g. if the filesystem does not
+    support it or src is a symlink that should not be followed.
+    '''
+    if not follow_symlinks and os.path.islink(src):
+        return False
+    devices = (os.stat(src).st_dev, os.stat(os.path.dirname(os.path.abspath(dst))).st_dev)
+    if devices in _reflink_unsupported:
+        return False
+    try:
+        with open(src, 'rb') as fsrc:
+            # Never write through a symlink at dst
+            fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600)
+            try:
+                fcntl.ioctl(fd, FICLONE, fsrc.fileno())
+            finally:
+                os.close(fd)
+    except OSError as e:
+        if e.errno in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL):
+            _reflink_unsupported.add(devices)
+        return False
+    return True
+
 
 def copy_with_ownership(src, dst, follow_symlinks=True):
-    shutil.copy2(src, dst, follow_symlinks=follow_symlinks)
-    stat = os.stat(src, follow_symlinks=follow_symlinks)
-    os.chown(dst, stat.st_uid, stat.st_gid, follow_symlinks=follow_symlinks)
+    # Replace a symlink at dst, instead of writing to its target
+    if os.path.islink(dst):
+        os.unlink(dst)
+    if reflink(src, dst, follow_symlinks=follow_symlinks):
+        shutil.copystat(src, dst, follow_symlinks=follow_symlinks)
+    else:
+        shutil.copy2(src, dst, follow_symlinks=follow_symlinks)
+    st = os.stat(src, follow_symlinks=follow_symlinks)
+    os.chown(dst, st.st_uid, st.st_gid, follow_symlinks=follow_symlinks)
 
 
 class ConfigurationError(Exception):
@@ -45,6 +45,18 @@ ffibuilder.cdef("""
     struct nameserver_iter { ...; };
     struct route_iter { ...; };
 
+    typedef struct {
+        const char* name;
+        const char* mac;
+        const char* driver;
+    } NetplanInterfaceInfo;
+
+    typedef struct {
+        const NetplanNetDefinition* netdef;
+        size_t iface_index;
+        gboolean duplicate;
+    } NetplanInterfaceMatch;
+
     // TODO: Introduce getters for all these fields to avoid exposing the raw struct
     typedef struct {
         gint family;
@@ -92,6 +104,11 @@ ffibuilder.cdef("""
     gboolean netplan_state_dump_yaml(const NetplanState* np_state, int output_fd, NetplanError** error);
     NetplanNetDefinition* netplan_state_get_netdef(const NetplanState* np_state, const char* id);
     guint netplan_state_get_netdefs_size(const NetplanState* np_state);
+    ssize_t netplan_state_match_interfaces(
+        const NetplanState* np_state, const NetplanInterfaceInfo* ifaces, size_t n_ifaces,
+        NetplanInterfaceMatch* out_matches, size_t out_size);
+    gboolean netplan_state_regenerate_netdef(
+        const NetplanState* np_state, const char* netdef_id, const char* rootdir, NetplanError** error);
 
     // NetDefinition
     ssize_t netplan_netdef_get_id(const NetplanNetDefinition* netdef, char* out_buffer, size_t out_buffer_size);
@@ -124,6 +141,7 @@ ffibuilder.cdef("""
     gboolean _netplan_netdef_is_trivial_compound_itf(const NetplanNetDefinition* netdef);
     int _netplan_state_get_vf_count_for_def(
         const NetplanState* np_state, const NetplanNetDefinition* netdef, NetplanError** error);
+    gboolean _netplan_state_patch_overrides_other_files(const NetplanState* np_state, int patch_fd, const char* filename);
     ssize_t _netplan_netdef_get_bond_mode(const NetplanNetDefinition* netdef, char* out_buffer, size_t out_buf_size);
     ssize_t _netplan_netdef_get_gateway4(const NetplanNetDefinition* netdef, char* out_buffer, size_t out_buffer_size);
     ssize_t _netplan_netdef_get_gateway6(const NetplanNetDefinition* netdef, char* out_buffer, size_t out_buffer_size);
@@ -16,12 +16,12 @@
 # from enum import IntEnum
 from io import StringIO
 import os
-from typing import IO
+from typing import IO, Dict, List, Optional, Set, Tuple
 
 from ._netplan_cffi import ffi, lib
 from .netdef import NetDefinition, NetDefinitionIterator
 from .parser import Parser
-from ._utils import _checked_lib_call
+from ._utils import _checked_lib_call, NetplanBackendException, NetplanException, NETPLAN_BACKEND_ERRORS
 
 
 # class NETPLAN_STORAGE(IntEnum):
@@ -65,6 +65,71 @@ class State():
         root = rootdir.encode('utf-8') if rootdir else ffi.NULL
         _checked_lib_call(lib.netplan_state_update_yaml_hierarchy, self._ptr, name, root)
 
+    def _regenerate_netdef(self, netdef_id: str, rootdir: str = None) -> bool:
+        '''
+        Rewrite the backend configuration of a single netdef (and the definitions linked to it),
+        leaving all other generated files alone. Returns False if a full regeneration is needed instead.
+        '''
+        root = rootdir.encode('utf-8') if rootdir else ffi.NULL
+        try:
+            _checked_lib_call(lib.netplan_state_regenerate_netdef, self._ptr, netdef_id.encode('utf-8'), root)
+        except NetplanBackendException as e:
+            if e.error == NETPLAN_BACKEND_ERRORS.NETPLAN_ERROR_UNSUPPORTED:
+                return False
+            raise  # pragma: nocover (backend validation errors)
+        return True
+
+    def _patch_overrides_other_files(self, patch: IO, filename: str) -> bool:
+        '''
+        Check if any netdef touched by a YAML patch is defined by another file than the origin-hint
+        filename, i.e. the origin-hint file cannot be written from this state as-is.
+        '''
+        return bool(lib._netplan_state_patch_overrides_other_files(self._ptr, patch.fileno(), filename.encode('utf-8')))
+
+    def _match_interfaces(self, interfaces: List[Tuple[str, Optional[str], Optional[str]]]
+                          ) -> Tuple[Dict[str, List[str]], Set[str]]:
+        '''
+        Match all netdefs against a list of (name, driver, mac) interface tuples at once.
+        Returns a dict of netdef IDs, mapping to the names of their matching interfaces,
+        and the set of interface names that are matched by more than one netdef.
+        '''
+        keepalive = []
+
+        def cstr(value: Optional[str]):
+            if not value:
+                return ffi.NULL
+            keepalive.append(ffi.new('char[]', value.encode('utf-8')))
+            return keepalive[-1]
+
+        table = ffi.new('NetplanInterfaceInfo[]', len(interfaces))
+        for info, (name, driver, mac) in zip(table, interfaces):
+            info.name = cstr(name)
+            info.driver = cstr(driver)
+            info.mac = cstr(mac)
+
+        size = max(len(interfaces), 16)
+        while True:
+            out = ffi.new('NetplanInterfaceMatch[]', size)
+            count = lib.netplan_state_match_interfaces(self._ptr, table, len(interfaces), out, size)
+            if count != -2:  # NETPLAN_BUFFER_TOO_SMALL
+                break
+            size = size * 2
+        if count < 0:  # pragma: nocover (unexpected libnetplan error)
+            raise NetplanException('Cannot match interfaces (error {})'.format(count), 0, 0)
+
+        matches = {}
+        duplicates = set()
+        ids = {}
+        for match in out[0:count]:
+            ptr = match.netdef
+            if ptr not in ids:
+                ids[ptr] = NetDefinition(self, ptr).id
+            name = interfaces[match.iface_index][0]
+            matches.setdefault(ids[ptr], []).append(name)
+            if match.duplicate:
+                duplicates.add(name)
+        return matches, duplicates
+
     def _dump_yaml(self, output_file: IO):
         if isinstance(output_file, StringIO):
             fd = os.memfd_create(name='netplan_temp_file')
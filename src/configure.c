@@ -75,6 +75,8 @@ int main(int argc, char** argv)
     char* ignore_errors_env = NULL;
     NetplanParser* npp = NULL;
     NetplanState* np_state = NULL;
+    gint64 start_usec = g_get_monotonic_time();
+    gint64 span_usec = 0;
 
     /* Parse CLI options */
     opt_context = g_option_context_new(NULL);
@@ -120,6 +122,7 @@ int main(int argc, char** argv)
         // LCOV_EXCL_STOP
     }
 
+    span_usec = g_get_monotonic_time();
     npp = netplan_parser_new();
     if (ignore_errors)
         netplan_parser_set_flags(npp, NETPLAN_PARSER_IGNORE_ERRORS, &error);
@@ -134,12 +137,16 @@ int main(int argc, char** argv)
 
     np_state = netplan_state_new();
     CHECK_CALL(netplan_state_import_parser_results(np_state, npp, &error), ignore_errors);
+    _netplan_trace_span("configure: parse", span_usec);
 
     /* Clean up generated config from previous runs */
+    span_usec = g_get_monotonic_time();
     if (!nm_only) _netplan_networkd_cleanup(rootdir);
     _netplan_nm_cleanup(rootdir);
     if (!nm_only) _netplan_ovs_cleanup(rootdir);
     if (!nm_only) _netplan_sriov_cleanup(rootdir);
+    _netplan_trace_span("configure: cleanup", span_usec);
+    span_usec = g_get_monotonic_time();
 
     /* Generate backend specific configuration files from merged data. */
     // sd-generator late-stage validation
@@ -194,12 +201,14 @@ int main(int argc, char** argv)
      * (which restricts NM to wifi and wwan) if "renderer: NetworkManager" is used anywhere */
     if (netplan_state_get_backend(np_state) == NETPLAN_BACKEND_NM || any_nm)
         _netplan_g_string_free_to_file(g_string_new(NULL), rootdir, "/run/NetworkManager/conf.d/10-globally-managed-devices.conf", NULL);
+    _netplan_trace_span("configure: write", span_usec);
 
     if (nm_only) goto cleanup;
 
     // Only logic that is not relevant for NetworkManager config below this point
 
 cleanup:
+    _netplan_trace_span("configure", start_usec);
     g_option_context_free(opt_context);
     if (error)
         g_error_free(error);
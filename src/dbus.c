@@ -1,10 +1,12 @@
 #include <errno.h>
 #include <stdbool.h>
+#include <stddef.h>
 #include <unistd.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <signal.h>
 #include <glob.h>
+#include <sys/mman.h>
 #include <sys/types.h>
 #include <sys/wait.h>
 
@@ -24,6 +26,21 @@ typedef struct {
 
 typedef struct {
     sd_bus *bus;
+    sd_bus_slot *slot;
+    sd_event_source *child_es;
+    sd_event_source *timer_es;
+    GPid pid; /* running 'netplan apply' child process, or -1 */
+    int output_fd; /* memfd collecting the child's stdout/stderr */
+    uint64_t started_usec;
+    char *path; /* /io/netplan/Netplan/job/<N> object path */
+    char *phase; /* io.netplan.Netplan.Job.Phase property */
+    int success; /* io.netplan.Netplan.Job.Success property ('b' needs an int) */
+} NetplanJob;
+
+typedef struct {
+    sd_bus *bus;
+    NetplanJob *job; /* last ApplyAsync() job. There can only be one running at a time */
+    guint job_count;
     sd_event_source *try_es;
     GPid try_pid; /* semaphore. There can only be one 'netplan try' child process at a time */
     const char *config_id; /* current config ID, during any io.netplan.Netplan.Config calls */
@@ -49,6 +66,108 @@ invalidate_other_config(gpointer key, gpointer value, gpointer user_data)
         cd->invalidated = TRUE;
 }
 
+static gboolean
+job_is_running(const NetplanJob *job)
+{
+    return job && job->pid > 0;
+}
+
+static void
+job_free(NetplanJob *job)
+{
+    sd_bus_slot_unref(job->slot);
+    sd_event_source_unref(job->child_es);
+    sd_event_source_unref(job->timer_es);
+    if (job->output_fd >= 0)
+        close(job->output_fd);
+    g_free(job->path);
+    g_free(job->phase);
+    g_free(job);
+}
+
+static void
+job_emit_progress(NetplanJob *job, const char *phase)
+{
+    uint64_t now = 0;
+    int r = 0;
+
+    g_free(job->phase);
+    job->phase = g_strdup(phase);
+    sd_event_now(sd_bus_get_event(job->bus), CLOCK_MONOTONIC, &now);
+    r = sd_bus_emit_properties_changed(job->bus, job->path, "io.netplan.Netplan.Job", "Phase", NULL);
+    if (r >= 0)
+        r = sd_bus_emit_signal(job->bus, job->path, "io.netplan.Netplan.Job", "Progress",
+                               "st", phase, now - job->started_usec);
+    if (r < 0)
+        fprintf(stderr, "Could not send .Progress() signal: %s\n", strerror(-r)); // LCOV_EXCL_LINE
+}
+
+static int
+job_timer_cb(sd_event_source *es, uint64_t usec, void *userdata)
+{
+    NetplanJob *job = userdata;
+
+    /* Report the elapsed time every second, while the job is running */
+    job_emit_progress(job, "running");
+    sd_event_source_set_time(es, usec + G_USEC_PER_SEC);
+    return sd_event_source_set_enabled(es, SD_EVENT_ONESHOT);
+}
+
+static int
+job_finished_cb(__unused sd_event_source *es, const siginfo_t *si, void *userdata)
+{
+    NetplanJob *job = userdata;
+    g_autofree gchar *output = NULL;
+    g_autofree gchar *message = NULL;
+    uint64_t now = 0;
+    off_t size = 0;
+    int r = 0;
+
+    /* Cleanup the 'netplan apply' child process */
+    job->child_es = sd_event_source_unref(job->child_es);
+    job->timer_es = sd_event_source_unref(job->timer_es);
+    g_spawn_close_pid(job->pid);
+    job->pid = -1; /* unlock semaphore */
+
+    /* Collect the output of the child process */
+    size = lseek(job->output_fd, 0, SEEK_END);
+    output = g_malloc0(size > 0 ? (gsize)size + 1 : 1);
+    if (size > 0 && pread(job->output_fd, output, (size_t)size, 0) < 0)
+        output[0] = '\0'; // LCOV_EXCL_LINE
+    close(job->output_fd);
+    job->output_fd = -1;
+
+    job->success = si->si_code == CLD_EXITED && si->si_status == 0;
+    if (si->si_code != CLD_EXITED)
+        message = g_strdup_printf("netplan apply was killed by signal %d\noutput: '%s'", si->si_status, output); // LCOV_EXCL_LINE
+    else if (si->si_status != 0)
+        message = g_strdup_printf("netplan apply failed with exit code %d\noutput: '%s'", si->si_status, output);
+    else
+        message = g_strdup("");
+
+    r = sd_bus_emit_properties_changed(job->bus, job->path, "io.netplan.Netplan.Job", "Success", NULL);
+    if (r < 0)
+        fprintf(stderr, "Could not send .PropertiesChanged() signal: %s\n", strerror(-r)); // LCOV_EXCL_LINE
+    job_emit_progress(job, job->success ? "finished" : "failed");
+
+    /* Send .Finished() signal on DBus */
+    sd_event_now(sd_bus_get_event(job->bus), CLOCK_MONOTONIC, &now);
+    r = sd_bus_emit_signal(job->bus, job->path, "io.netplan.Netplan.Job", "Finished",
+                           "bts", job->success, now - job->started_usec, message);
+    if (r < 0)
+        fprintf(stderr, "Could not send .Finished() signal: %s\n", strerror(-r)); // LCOV_EXCL_LINE
+    return 0;
+}
+
+static const sd_bus_vtable job_vtable[] = {
+    SD_BUS_VTABLE_START(0),
+    SD_BUS_PROPERTY("Phase", "s", NULL, offsetof(NetplanJob, phase), SD_BUS_VTABLE_PROPERTY_EMITS_CHANGE),
+    SD_BUS_PROPERTY("Success", "b", NULL, offsetof(NetplanJob, success), SD_BUS_VTABLE_PROPERTY_EMITS_CHANGE),
+    SD_BUS_SIGNAL("Progress", "st", 0),
+    SD_BUS_SIGNAL("Finished", "bts", 0),
+    SD_BUS_VTABLE_END
+};
+
 static int
 terminate_try_child_process(int status, NetplanData *d, const char *config_id)
 {
@@ -241,6 +360,9 @@ method_apply(sd_bus_message *m, void *userdata, sd_bus_error *ret_error)
     gint exit_status = 0;
     NetplanData *d = userdata;
 
+    if (job_is_running(d->job))
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
+                                 "Another ApplyAsync() is currently in progress: PID %d\n", d->job->pid);
     /* Accept the current 'netplan try', if active.
      * Otherwise execute 'netplan apply' directly. */
     if (d->try_pid > 0)
@@ -272,14 +394,96 @@ method_apply(sd_bus_message *m, void *userdata, sd_bus_error *ret_error)
     return sd_bus_reply_method_return(m, "b", true);
 }
 
+/* netplan-feature: dbus-apply-async */
+static int
+method_apply_async(sd_bus_message *m, void *userdata, sd_bus_error *ret_error)
+{
+    g_autoptr(GError) err = NULL;
+    NetplanData *d = userdata;
+    sd_event *event = sd_bus_get_event(d->bus);
+    NetplanJob *job = NULL;
+    int r = 0;
+
+    if (job_is_running(d->job))
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
+                                 "Another ApplyAsync() is currently in progress: PID %d\n", d->job->pid);
+    if (d->try_pid > 0)
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
+                                 "A Try() is currently in progress, use Apply() to accept it\n");
+    gchar *argv[] = {SBINDIR "/" "netplan", "apply", NULL};
+
+    // for tests only: allow changing what netplan to run
+    if (getenv("DBUS_TEST_NETPLAN_CMD") != 0)
+       argv[0] = getenv("DBUS_TEST_NETPLAN_CMD");
+
+    /* Only keep the last job object around */
+    if (d->job)
+        job_free(d->job);
+    job = d->job = g_new0(NetplanJob, 1);
+    job->bus = d->bus;
+    job->pid = -1;
+    job->phase = g_strdup("started");
+    job->path = g_strdup_printf("/io/netplan/Netplan/job/%u", ++d->job_count);
+    job->output_fd = memfd_create("netplan-apply.log", 0);
+    // LCOV_EXCL_START
+    if (job->output_fd < 0)
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
+                                 "cannot create output buffer: %s", strerror(errno));
+    // LCOV_EXCL_STOP
+
+    /* Launch 'netplan apply' child process, lock 'job->pid' to real PID */
+    g_spawn_async_with_fds("/", argv, NULL, G_SPAWN_DO_NOT_REAP_CHILD, NULL, NULL,
+                           &job->pid, -1, job->output_fd, job->output_fd, &err);
+    // LCOV_EXCL_START
+    if (err) {
+        job->pid = -1;
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
+                                 "cannot run netplan apply: %s", err->message);
+    }
+    // LCOV_EXCL_STOP
+
+    /* Register the job object and event handlers, trigged every second and
+     * when the child process exits */
+    sd_event_now(event, CLOCK_MONOTONIC, &job->started_usec);
+    r = sd_bus_add_object_vtable(d->bus, &job->slot, job->path,
+                                 "io.netplan.Netplan.Job", job_vtable, job);
+    if (r >= 0)
+        r = sd_event_add_child(event, &job->child_es, job->pid, WEXITED, job_finished_cb, job);
+    if (r >= 0)
+        r = sd_event_add_time(event, &job->timer_es, CLOCK_MONOTONIC,
+                              job->started_usec + G_USEC_PER_SEC, 0, job_timer_cb, job);
+    if (r < 0) {
+        // LCOV_EXCL_START
+        /* Nobody would reap the child and unlock 'job->pid', which would
+         * block any further ApplyAsync() call. Stop it and drop the job. */
+        kill(job->pid, SIGTERM);
+        waitpid(job->pid, NULL, 0);
+        g_spawn_close_pid(job->pid);
+        job_free(job);
+        d->job = NULL;
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
+                                 "cannot watch 'netplan apply' child: %s", strerror(-r));
+        // LCOV_EXCL_STOP
+    }
+
+    r = sd_bus_reply_method_return(m, "o", job->path);
+    job_emit_progress(job, "started");
+    return r;
+}
+
 static int
-method_generate(sd_bus_message *m, __unused void *userdata, sd_bus_error *ret_error)
+method_generate(sd_bus_message *m, void *userdata, sd_bus_error *ret_error)
 {
     g_autoptr(GError) err = NULL;
     g_autofree gchar *stdout = NULL;
     g_autofree gchar *stderr = NULL;
+    NetplanData *d = userdata;
     gint exit_status = 0;
 
+    /* Don't write to /run while 'netplan apply' is doing the same */
+    if (job_is_running(d->job))
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
+                                 "Another ApplyAsync() is currently in progress: PID %d\n", d->job->pid);
     gchar *argv[] = {SBINDIR "/" "netplan", "generate", NULL};
 
     // for tests only: allow changing what netplan to run
@@ -350,37 +554,86 @@ method_info(sd_bus_message *m, __unused void *userdata, __unused sd_bus_error *r
     return sd_bus_send(NULL, reply, NULL);
 }
 
+typedef struct {
+    GString *messages;
+    GLogFunc default_handler;
+} LogCollector;
+
+/* Collect libnetplan warnings emitted while serving a Get() or Set() request,
+ * to report them back to the caller, like the stderr of the 'netplan' CLI.
+ * Less severe messages (debug, info, ...) keep going to the default handler. */
+static void
+collect_log_messages(const gchar *log_domain, GLogLevelFlags log_level,
+                     const gchar *message, gpointer user_data)
+{
+    LogCollector *collector = user_data;
+    if (log_level & (G_LOG_LEVEL_ERROR | G_LOG_LEVEL_CRITICAL | G_LOG_LEVEL_WARNING))
+        g_string_append_printf(collector->messages, "%s\n", message);
+    else
+        collector->default_handler(log_domain, log_level, message, NULL);
+}
+
 static int
 method_get(sd_bus_message *m, void *userdata, sd_bus_error *ret_error)
 {
     NetplanData *d = userdata;
     g_autoptr(GError) err = NULL;
-    g_autofree gchar *stdout = NULL;
-    g_autofree gchar *stderr = NULL;
+    g_autoptr(GString) messages = g_string_new(NULL);
     g_autofree gchar *root_dir = NULL;
-    gint exit_status = 0;
+    g_autofree gchar *yaml = NULL;
+    LogCollector collector = { .messages = messages };
+    gboolean ok = FALSE;
+    off_t size = 0;
+    int fd = -1;
+
+    root_dir = g_strdup_printf("%s/run/netplan/config-%s", NETPLAN_ROOT, d->config_id);
+    fd = memfd_create("netplan-get.yaml", 0);
+    if (fd < 0)
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "cannot run netplan get: %m"); // LCOV_EXCL_LINE
+
+    collector.default_handler = g_log_set_default_handler(collect_log_messages, &collector);
+    ok = _netplan_util_get_all(root_dir, fd, &err);
+    g_log_set_default_handler(collector.default_handler, NULL);
+    if (!ok) {
+        close(fd);
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "netplan get failed: %s\nstderr: '%s'", err->message, messages->str);
+    }
 
-    if (d->config_id)
-        root_dir = g_strdup_printf("--root-dir=%s/run/netplan/config-%s", NETPLAN_ROOT, d->config_id);
-    gchar *argv[] = {SBINDIR "/" "netplan", "get", "all", root_dir, NULL};
+    size = lseek(fd, 0, SEEK_CUR);
+    yaml = g_malloc0((gsize)size + 1);
+    if (pread(fd, yaml, (size_t)size, 0) != size) {
+        // LCOV_EXCL_START
+        close(fd);
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "cannot read netplan get output: %m");
+        // LCOV_EXCL_STOP
+    }
+    close(fd);
 
-    // for tests only: allow changing what netplan to run
-    if (getenv("DBUS_TEST_NETPLAN_CMD") != 0)
-       argv[0] = getenv("DBUS_TEST_NETPLAN_CMD");
+    return sd_bus_reply_method_return(m, "s", yaml);
+}
 
-    g_spawn_sync("/", argv, NULL, 0, NULL, NULL, &stdout, &stderr, &exit_status, &err);
-    if (err != NULL)
-        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "cannot run netplan get: %s", err->message); // LCOV_EXCL_LINE
+static int
+read_set_many_settings(sd_bus_message *m, GPtrArray *key_values)
+{
+    char *key = NULL;
+    char *value = NULL;
+    int r = sd_bus_message_enter_container(m, 'a', "{ss}");
+    if (r < 0)
+        return r; // LCOV_EXCL_LINE
 
-    #if GLIB_CHECK_VERSION (2, 70, 0)
-    g_spawn_check_wait_status(exit_status, &err);
-    #else
-    g_spawn_check_exit_status(exit_status, &err);
-    #endif
-    if (err != NULL)
-       return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "netplan get failed: %s\nstdout: '%s'\nstderr: '%s'", err->message, stdout, stderr); // LCOV_EXCL_LINE
+    while ((r = sd_bus_message_enter_container(m, 'e', "ss")) > 0) {
+        r = sd_bus_message_read(m, "ss", &key, &value);
+        if (r < 0)
+            return r; // LCOV_EXCL_LINE
+        g_ptr_array_add(key_values, g_strdup_printf("%s=%s", key, value));
+        r = sd_bus_message_exit_container(m);
+        if (r < 0)
+            return r; // LCOV_EXCL_LINE
+    }
+    if (r < 0)
+        return r; // LCOV_EXCL_LINE
 
-    return sd_bus_reply_method_return(m, "s", stdout);
+    return sd_bus_message_exit_container(m);
 }
 
 static int
@@ -388,47 +641,33 @@ method_set(sd_bus_message *m, void *userdata, sd_bus_error *ret_error)
 {
     NetplanData *d = userdata;
     g_autoptr(GError) err = NULL;
-    g_autofree gchar *stdout = NULL;
-    g_autofree gchar *stderr = NULL;
-    g_autofree gchar *origin = NULL;
+    g_autoptr(GString) messages = g_string_new(NULL);
+    g_autoptr(GPtrArray) key_values = g_ptr_array_new_with_free_func(g_free);
     g_autofree gchar *root_dir = NULL;
-    gint exit_status = 0;
-    char *args[2] = {NULL, NULL};
+    LogCollector collector = { .messages = messages };
     char *config_delta = NULL;
     char *origin_hint = NULL;
-    guint cur_arg = 0;
-
-    if (sd_bus_message_read(m, "ss", &config_delta, &origin_hint) < 0)
-        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "cannot extract config_delta or origin_hint"); // LCOV_EXCL_LINE
-
-    if (!!strcmp(origin_hint, "")) {
-        origin = g_strdup_printf("--origin-hint=%s", origin_hint);
-        args[cur_arg] = origin;
-        cur_arg++;
-    }
-
-    if (d->config_id) {
-        root_dir = g_strdup_printf("--root-dir=%s/run/netplan/config-%s", NETPLAN_ROOT, d->config_id);
-        args[cur_arg] = root_dir;
-        cur_arg++;
+    gboolean ok = FALSE;
+
+    /* Set() takes a single "key=value" config delta, SetMany() a dict of key => value */
+    if (sd_bus_message_is_method_call(m, NULL, "SetMany")) {
+        if (   read_set_many_settings(m, key_values) < 0
+            || sd_bus_message_read(m, "s", &origin_hint) < 0)
+            return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "cannot extract settings or origin_hint"); // LCOV_EXCL_LINE
+    } else {
+        if (sd_bus_message_read(m, "ss", &config_delta, &origin_hint) < 0)
+            return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "cannot extract config_delta or origin_hint"); // LCOV_EXCL_LINE
+        g_ptr_array_add(key_values, g_strdup(config_delta));
     }
-    gchar *argv[] = {SBINDIR "/" "netplan", "set", config_delta, args[0], args[1], NULL};
+    g_ptr_array_add(key_values, NULL);
 
-    // for tests only: allow changing what netplan to run
-    if (getenv("DBUS_TEST_NETPLAN_CMD") != 0)
-       argv[0] = getenv("DBUS_TEST_NETPLAN_CMD");
-
-    g_spawn_sync("/", argv, NULL, 0, NULL, NULL, &stdout, &stderr, &exit_status, &err);
-    if (err != NULL)
-        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "cannot run netplan set %s: %s", config_delta, err->message); // LCOV_EXCL_LINE
-
-    #if GLIB_CHECK_VERSION (2, 70, 0)
-    g_spawn_check_wait_status(exit_status, &err);
-    #else
-    g_spawn_check_exit_status(exit_status, &err);
-    #endif
-    if (err != NULL)
-       return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "netplan set failed: %s\nstdout: '%s'\nstderr: '%s'", err->message, stdout, stderr); // LCOV_EXCL_LINE
+    root_dir = g_strdup_printf("%s/run/netplan/config-%s", NETPLAN_ROOT, d->config_id);
+    collector.default_handler = g_log_set_default_handler(collect_log_messages, &collector);
+    ok = _netplan_util_set((const char* const*) key_values->pdata, strcmp(origin_hint, "") ? origin_hint : NULL,
+                           root_dir, &err);
+    g_log_set_default_handler(collector.default_handler, NULL);
+    if (!ok)
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED, "netplan set failed: %s\nstderr: '%s'", err->message, messages->str);
 
     return sd_bus_reply_method_return(m, "b", true);
 }
@@ -548,6 +787,11 @@ method_config_apply(sd_bus_message *m, void *userdata, sd_bus_error *ret_error)
     int r = 0;
     /* trim 27 chars (i.e. "/io/netplan/Netplan/config/") from path to get the config ID */
     d->config_id = sd_bus_message_get_path(m) + 27;
+    if (job_is_running(d->job)) {
+        d->config_id = NULL;
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
+                                 "Another ApplyAsync() is currently in progress: PID %d\n", d->job->pid);
+    }
     NetplanConfigData *cd = g_hash_table_lookup(d->config_data, d->config_id);
     if (cd->invalidated)
         return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
@@ -622,6 +866,9 @@ method_config_try(sd_bus_message *m, void *userdata, sd_bus_error *ret_error)
     if (d->try_pid > 0)
         return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
                                  "Another Try() is currently in progress: PID %d\n", d->try_pid);
+    if (job_is_running(d->job))
+        return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
+                                 "Another ApplyAsync() is currently in progress: PID %d\n", d->job->pid);
     NetplanConfigData *cd = g_hash_table_lookup(d->config_data, config_id);
     if (cd->invalidated)
         return sd_bus_error_setf(ret_error, SD_BUS_ERROR_FAILED,
@@ -695,6 +942,7 @@ static const sd_bus_vtable config_vtable[] = {
     SD_BUS_METHOD("Apply", "", "b", method_config_apply, 0),
     SD_BUS_METHOD("Get", "", "s", method_config_get, 0),
     SD_BUS_METHOD("Set", "ss", "b", method_config_set, 0),
+    SD_BUS_METHOD("SetMany", "a{ss}s", "b", method_config_set, 0),
     SD_BUS_METHOD("Try", "u", "b", method_config_try, 0),
     SD_BUS_METHOD("Cancel", "", "b", method_config_cancel, 0),
     SD_BUS_VTABLE_END
@@ -767,6 +1015,7 @@ method_config(sd_bus_message *m, void *userdata, sd_bus_error *ret_error)
 static const sd_bus_vtable netplan_vtable[] = {
     SD_BUS_VTABLE_START(0),
     SD_BUS_METHOD("Apply", "", "b", method_apply, 0),
+    SD_BUS_METHOD("ApplyAsync", "", "o", method_apply_async, 0),
     SD_BUS_METHOD("Generate", "", "b", method_generate, 0),
     SD_BUS_METHOD("Info", "", "a(sv)", method_info, 0),
     SD_BUS_METHOD("Config", "", "o", method_config, 0),
@@ -818,6 +1067,8 @@ main(__unused int argc, __unused char *argv[])
 
     /* Initialize the userdata */
     data->bus = bus;
+    data->job = NULL;
+    data->job_count = 0;
     data->try_pid = -1;
     data->config_id = NULL;
     data->handler_id = NULL;
@@ -863,6 +1114,8 @@ main(__unused int argc, __unused char *argv[])
     if (r < 0)
         fprintf(stderr, "Failed mainloop: %s\n", strerror(-r)); // LCOV_EXCL_LINE
 finish:
+    if (data->job)
+        job_free(data->job);
     g_free(data);
     sd_event_unref(event);
     sd_bus_slot_unref(slot);
@@ -95,32 +95,122 @@ typedef struct wait_online_data {
 } WaitOnlineData;
 
 /**
- * Enumerate all network interfaces (/sys/clas/net/...) and check
- * netplan_netdef_match_interface() to see if they match the current NetDef
+ * Inventory of network interfaces and their sysfs data (MAC address, driver).
+ * Every interface is queried at most once per generator run, the inventory
+ * is meant to be shared by all generator stages needing such data.
  */
+struct netplan_sysfs_inventory {
+    gchar* rootdir;
+    // Interface name -> NetplanInterfaceInfo*, as queried from sysfs
+    GHashTable* interfaces;
+    // Set of all current system interfaces, potentially not yet renamed
+    GHashTable* system_interfaces;
+    // Table of NetplanInterfaceInfo of all system interfaces (borrowed from @interfaces)
+    GArray* system_infos;
+};
+
 STATIC void
-_netplan_enumerate_interfaces(const NetplanNetDefinition* def, GHashTable* ifaces, GHashTable* tbl, const char* set_name, WaitOnlineData* data, const char* rootdir)
+_netplan_interface_info_free(gpointer data)
+{
+    NetplanInterfaceInfo* info = data;
+    g_free((gchar*)info->name);
+    g_free((gchar*)info->mac);
+    g_free((gchar*)info->driver);
+    g_free(info);
+}
+
+NetplanSysfsInventory*
+_netplan_sysfs_inventory_new(const char* rootdir)
+{
+    NetplanSysfsInventory* inventory = g_new0(NetplanSysfsInventory, 1);
+    inventory->rootdir = g_strdup(rootdir);
+    inventory->interfaces = g_hash_table_new_full(g_str_hash, g_str_equal, NULL, _netplan_interface_info_free);
+    return inventory;
+}
+
+void
+_netplan_sysfs_inventory_free(NetplanSysfsInventory* inventory)
+{
+    if (!inventory)
+        return;
+    if (inventory->system_infos)
+        g_array_free(inventory->system_infos, TRUE);
+    if (inventory->system_interfaces)
+        g_hash_table_destroy(inventory->system_interfaces);
+    g_hash_table_destroy(inventory->interfaces);
+    g_free(inventory->rootdir);
+    g_free(inventory);
+}
+
+const NetplanInterfaceInfo*
+_netplan_sysfs_inventory_lookup(NetplanSysfsInventory* inventory, const char* ifname)
+{
+    g_assert(inventory != NULL);
+    NetplanInterfaceInfo* info = g_hash_table_lookup(inventory->interfaces, ifname);
+    if (!info) {
+        info = g_new0(NetplanInterfaceInfo, 1);
+        info->name = g_strdup(ifname);
+        info->mac = _netplan_sysfs_get_mac_by_ifname(ifname, inventory->rootdir);
+        info->driver = _netplan_sysfs_get_driver_by_ifname(ifname, inventory->rootdir);
+        g_hash_table_insert(inventory->interfaces, (gpointer)info->name, info);
+    }
+    return info;
+}
+
+STATIC GHashTable*
+_netplan_sysfs_inventory_get_system_interfaces(NetplanSysfsInventory* inventory)
+{
+    if (!inventory->system_interfaces) {
+        inventory->system_interfaces = g_hash_table_new_full(g_str_hash, g_str_equal, g_free, NULL);
+        _netplan_query_system_interfaces(inventory->system_interfaces);
+    }
+    return inventory->system_interfaces;
+}
+
+/**
+ * Query sysfs for the MAC address and driver of every system interface,
+ * to be matched against all NetDefs at once.
+ */
+STATIC const GArray*
+_netplan_sysfs_inventory_get_system_infos(NetplanSysfsInventory* inventory)
 {
-    g_assert(ifaces != NULL);
+    if (!inventory->system_infos) {
+        GHashTable* ifaces = _netplan_sysfs_inventory_get_system_interfaces(inventory);
+        inventory->system_infos = g_array_sized_new(FALSE, FALSE, sizeof(NetplanInterfaceInfo), g_hash_table_size(ifaces));
+
+        GHashTableIter iter;
+        gpointer key;
+        g_hash_table_iter_init (&iter, ifaces);
+        while (g_hash_table_iter_next (&iter, &key, NULL)) {
+            const NetplanInterfaceInfo* info = _netplan_sysfs_inventory_lookup(inventory, key);
+            g_array_append_vals(inventory->system_infos, info, 1);
+        }
+    }
+    return inventory->system_infos;
+}
+
+/**
+ * Add all system interfaces matched by the current NetDef, looking them up
+ * in the result of _netplan_state_match_interfaces()
+ */
+STATIC void
+_netplan_enumerate_interfaces(const NetplanNetDefinition* def, GHashTable* matches, const GArray* infos, GHashTable* tbl, const char* set_name, WaitOnlineData* data)
+{
+    g_assert(matches != NULL);
+    g_assert(infos != NULL);
     g_assert(tbl != NULL);
 
-    GHashTableIter iter;
-    gpointer key;
-    g_hash_table_iter_init (&iter, ifaces);
-    while (g_hash_table_iter_next (&iter, &key, NULL)) {
-        const char* ifname = key;
+    const GArray* positions = g_hash_table_lookup(matches, def);
+    for (guint i = 0; positions && i < positions->len; i++) {
+        const char* ifname = g_array_index(infos, NetplanInterfaceInfo, g_array_index(positions, size_t, i)).name;
         if (g_hash_table_contains(tbl, ifname) || (set_name && g_hash_table_contains(tbl, set_name))) {
             continue;
         }
-        g_autofree gchar* mac = _netplan_sysfs_get_mac_by_ifname(ifname, rootdir);
-        g_autofree gchar* driver = _netplan_sysfs_get_driver_by_ifname(ifname, rootdir);
-        if (netplan_netdef_match_interface(def, ifname, mac, driver)) {
-            // Duplicate the data for every interface matched,
-            // so we can have them free'ed one-by-one in the end.
-            WaitOnlineData* d = g_malloc0(sizeof(WaitOnlineData));
-            *d = *data;
-            g_hash_table_replace(tbl, set_name ? g_strdup(set_name) : g_strdup(ifname), d);
-        }
+        // Duplicate the data for every interface matched,
+        // so we can have them free'ed one-by-one in the end.
+        WaitOnlineData* d = g_malloc0(sizeof(WaitOnlineData));
+        *d = *data;
+        g_hash_table_replace(tbl, set_name ? g_strdup(set_name) : g_strdup(ifname), d);
     }
 }
 
@@ -278,15 +368,21 @@ _netplan_netdef_generate_networkd(
  * https://discourse.ubuntu.com/t/spec-definition-of-an-online-system/27838
  */
 gboolean
-_netplan_networkd_generate_wait_online(const NetplanState* np_state, const char* rootdir, const char* generator_dir)
+_netplan_networkd_generate_wait_online_with_inventory(
+        const NetplanState* np_state,
+        NetplanSysfsInventory* inventory,
+        const char* generator_dir)
 {
+    g_assert(inventory != NULL);
     g_assert(generator_dir != NULL);
     // Set of all current network interfaces, potentially not yet renamed
-    g_autoptr (GHashTable) system_interfaces = g_hash_table_new_full(g_str_hash, g_str_equal, g_free, NULL);
-    _netplan_query_system_interfaces(system_interfaces);
+    GHashTable* system_interfaces = _netplan_sysfs_inventory_get_system_interfaces(inventory);
 
     // Hash set of non-optional interfaces to wait for
     g_autoptr (GHashTable) non_optional_interfaces = g_hash_table_new_full(g_str_hash, g_str_equal, g_free, g_free);
+    // Match conditions of all NetDefs, evaluated at once when first needed
+    const GArray* system_interface_infos = NULL;
+    g_autoptr (GHashTable) matches = NULL;
 
     // Walk over non-optional NetDefs managed by networkd
     NetplanStateIterator iter;
@@ -335,11 +431,15 @@ _netplan_networkd_generate_wait_online(const NetplanState* np_state, const char*
                 WaitOnlineData* data = g_malloc0(sizeof(WaitOnlineData));
                 *data = *d;
                 g_hash_table_replace(non_optional_interfaces, g_strdup(def->id), data);
-            } else if (def->set_name) { // matching on a single interface, to be renamed
-                _netplan_enumerate_interfaces(def, system_interfaces, non_optional_interfaces, def->set_name, d, rootdir);
-            } else { // matching on potentially multiple interfaces
-                // XXX: we shouldn't run this enumeration for every NetDef...
-                _netplan_enumerate_interfaces(def, system_interfaces, non_optional_interfaces, NULL, d, rootdir);
+            } else {
+                if (!matches) {
+                    system_interface_infos = _netplan_sysfs_inventory_get_system_infos(inventory);
+                    matches = _netplan_state_match_interfaces(np_state, (const NetplanInterfaceInfo*)system_interface_infos->data,
+                                                              system_interface_infos->len);
+                }
+                // matching on a single interface, to be renamed (set-name)
+                // OR: matching on potentially multiple interfaces
+                _netplan_enumerate_interfaces(def, matches, system_interface_infos, non_optional_interfaces, def->set_name, d);
             }
 
             g_free(d);
@@ -410,3 +510,16 @@ _netplan_networkd_generate_wait_online(const NetplanState* np_state, const char*
     umask(orig_umask);
     return TRUE;
 }
+
+/**
+ * Same as _netplan_networkd_generate_wait_online_with_inventory(), querying
+ * the system interfaces below @rootdir. Kept for ABI compatibility.
+ */
+gboolean
+_netplan_networkd_generate_wait_online(const NetplanState* np_state, const char* rootdir, const char* generator_dir)
+{
+    NetplanSysfsInventory* inventory = _netplan_sysfs_inventory_new(rootdir);
+    gboolean ret = _netplan_networkd_generate_wait_online_with_inventory(np_state, inventory, generator_dir);
+    _netplan_sysfs_inventory_free(inventory);
+    return ret;
+}
@@ -91,13 +91,10 @@ enable_networkd(const char* generator_dir, gboolean enable_wait_online)
  * main() below.
  */
 static int
-find_interface(gchar* interface, GHashTable* netdefs)
+find_interface(gchar* interface, GHashTable* netdefs, NetplanSysfsInventory* inventory)
 {
     GPtrArray *found;
-    GFileInfo *info;
-    GFile *driver_file;
-    gchar *driver_path;
-    gchar *driver = NULL;
+    const gchar *driver = NULL;
     gpointer key, value;
     GHashTableIter iter;
     int ret = EXIT_FAILURE;
@@ -105,20 +102,7 @@ find_interface(gchar* interface, GHashTable* netdefs)
     found = g_ptr_array_new ();
 
     /* Try to get the driver name for the interface... */
-    driver_path = g_strdup_printf("/sys/class/net/%s/device/driver", interface);
-    driver_file = g_file_new_for_path (driver_path);
-    info = g_file_query_info (driver_file,
-                              G_FILE_ATTRIBUTE_STANDARD_SYMLINK_TARGET,
-                              0, NULL, NULL);
-    if (info != NULL) {
-        /* testing for driver matching is done via autopkgtest */
-        // LCOV_EXCL_START
-        driver = g_path_get_basename (g_file_info_get_symlink_target (info));
-        g_object_unref (info);
-        // LCOV_EXCL_STOP
-    }
-    g_object_unref (driver_file);
-    g_free (driver_path);
+    driver = _netplan_sysfs_inventory_lookup(inventory, interface)->driver;
 
     g_hash_table_iter_init (&iter, netdefs);
     while (g_hash_table_iter_next (&iter, &key, &value)) {
@@ -142,9 +126,6 @@ find_interface(gchar* interface, GHashTable* netdefs)
         // LCOV_EXCL_STOP
     }
 
-    if (driver)
-        g_free (driver); // LCOV_EXCL_LINE
-
     if (found->len != 1) {
         goto exit_find;
     }
@@ -189,8 +170,11 @@ int main(int argc, char** argv)
     char* ignore_errors_env = NULL;
     NetplanParser* npp = NULL;
     NetplanState* np_state = NULL;
+    NetplanSysfsInventory* inventory = NULL;
     const char* generator_normal_dir = NULL;
     const char* generator_late_dir = NULL;
+    gint64 start_usec = g_get_monotonic_time();
+    gint64 span_usec = 0;
 
     /* Parse CLI options */
     opt_context = g_option_context_new(NULL);
@@ -249,6 +233,7 @@ int main(int argc, char** argv)
         // LCOV_EXCL_STOP
     }
 
+    span_usec = g_get_monotonic_time();
     npp = netplan_parser_new();
     if ((ignore_errors || called_as_generator) && !no_ignore_errors)
         netplan_parser_set_flags(npp, NETPLAN_PARSER_IGNORE_ERRORS, &error);
@@ -258,6 +243,10 @@ int main(int argc, char** argv)
 
     np_state = netplan_state_new();
     CHECK_CALL(netplan_state_import_parser_results(np_state, npp, &error), ignore_errors);
+    _netplan_trace_span("generate: parse", span_usec);
+
+    // Interfaces are queried from sysfs at most once, shared by all stages below
+    inventory = _netplan_sysfs_inventory_new(rootdir);
 
     // XXX: Remove this code path, it's only still supported for legacy reasons
     // and not supposed to be called in the scope of a systemd generator. The
@@ -265,7 +254,7 @@ int main(int argc, char** argv)
     // the 'configure' binary to keep legacy functionality around?
     if (mapping_iface) {
         if (np_state->netdefs)
-            error_code = find_interface(mapping_iface, np_state->netdefs);
+            error_code = find_interface(mapping_iface, np_state->netdefs, inventory);
         else
             error_code = 1;
 
@@ -273,6 +262,7 @@ int main(int argc, char** argv)
     }
 
     /* Generate specific systemd units from merged data. */
+    span_usec = g_get_monotonic_time();
     // network-configurator late-stage validation
     CHECK_CALL(_netplan_state_set_flags(np_state, NETPLAN_STATE_VALIDATION_ONLY, &error), ignore_errors);
     CHECK_CALL(netplan_state_finish_ovs_write(np_state, NULL, &error), ignore_errors);
@@ -323,9 +313,13 @@ int main(int argc, char** argv)
         CHECK_CALL(_netplan_state_finish_sriov_generate(np_state, generator_late_dir, &error), ignore_errors);
     }
 
+    _netplan_trace_span("generate: write", span_usec);
+
     gboolean enable_wait_online = FALSE;
+    span_usec = g_get_monotonic_time();
     if (any_networkd)
-        enable_wait_online = _netplan_networkd_generate_wait_online(np_state, rootdir, generator_late_dir);
+        enable_wait_online = _netplan_networkd_generate_wait_online_with_inventory(np_state, inventory, generator_late_dir);
+    _netplan_trace_span("generate: wait-online", span_usec);
 
     if (called_as_generator) {
         /* Ensure networkd starts if we have any configuration for it */
@@ -342,6 +336,7 @@ int main(int argc, char** argv)
     }
 
 cleanup:
+    _netplan_trace_span("generate", start_usec);
     g_option_context_free(opt_context);
     if (error)
         g_error_free(error);
@@ -349,5 +344,6 @@ cleanup:
         netplan_parser_clear(&npp);
     if (np_state)
         netplan_state_clear(&np_state);
+    _netplan_sysfs_inventory_free(inventory);
     return error_code;
 }
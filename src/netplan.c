@@ -1141,14 +1141,46 @@ file_error:
     return FALSE;
 }
 
+/* Write the given netdefs into a temporary file next to @path and rename it
+ * into place, so that readers never see a partially written file. */
+STATIC gboolean
+write_yaml_file_atomically(const NetplanState* np_state, GList* netdefs, const char* path, gboolean is_fallback, GError** error)
+{
+    g_autofree gchar* tmp_path = g_strdup_printf("%s.XXXXXX", path);
+    int out_fd;
+
+    /*
+     * glibc will create a file with mode 600 by default.
+     * Although, mkstemp manpage says that the POSIX spec doesn't say anything
+     * about file modes and the application should make sure umask is set
+     * appropriately before calling mkstemp().
+     */
+    mode_t old_umask = umask(077);
+    out_fd = mkstemp(tmp_path); // permissions 0600 by default
+    umask(old_umask);
+    if (out_fd < 0) {
+        g_set_error(error, NETPLAN_FILE_ERROR, errno, "%m");
+        return FALSE;
+    }
+
+    gboolean ret = netplan_netdef_list_write_yaml(np_state, netdefs, out_fd, path, is_fallback, error);
+    close(out_fd);
+    if (ret) {
+        if (rename(tmp_path, path) == 0)
+            return TRUE;
+        g_set_error(error, NETPLAN_FILE_ERROR, errno, "%m");
+    }
+    /* Something went wrong, clean up the tempfile! */
+    unlink(tmp_path);
+    return FALSE;
+}
+
 gboolean
 netplan_state_write_yaml_file(const NetplanState* np_state, const char* filename, const char* rootdir, GError** error)
 {
     GList* iter = np_state->netdefs_ordered;
     g_autofree gchar* path = NULL;
-    g_autofree gchar* tmp_path = NULL;
     GList* to_write = NULL;
-    int out_fd;
 
     path = g_build_path(G_DIR_SEPARATOR_S, rootdir != NULL ? rootdir : G_DIR_SEPARATOR_S, "etc", "netplan", filename, NULL);
 
@@ -1170,32 +1202,9 @@ netplan_state_write_yaml_file(const NetplanState* np_state, const char* filename
         return TRUE;
     }
 
-    tmp_path = g_strdup_printf("%s.XXXXXX", path);
-    /*
-     * glibc will create a file with mode 600 by default.
-     * Although, mkstemp manpage says that the POSIX spec doesn't say anything
-     * about file modes and the application should make sure umask is set
-     * appropriately before calling mkstemp().
-     */
-    mode_t old_umask = umask(077);
-    out_fd = mkstemp(tmp_path); // permissions 0600 by default
-    umask(old_umask);
-    if (out_fd < 0) {
-        g_set_error(error, NETPLAN_FILE_ERROR, errno, "%m");
-        return FALSE;
-    }
-
-    gboolean ret = netplan_netdef_list_write_yaml(np_state, to_write, out_fd, path, TRUE, error);
+    gboolean ret = write_yaml_file_atomically(np_state, to_write, path, TRUE, error);
     g_list_free(to_write);
-    close(out_fd);
-    if (ret) {
-        if (rename(tmp_path, path) == 0)
-            return TRUE;
-        g_set_error(error, NETPLAN_FILE_ERROR, errno, "%m");
-    }
-    /* Something went wrong, clean up the tempfile! */
-    unlink(tmp_path);
-    return FALSE;
+    return ret;
 }
 
 gboolean
@@ -1207,6 +1216,68 @@ netplan_state_dump_yaml(const NetplanState* np_state, int out_fd, GError** error
     return netplan_netdef_list_write_yaml(np_state, np_state->netdefs_ordered, out_fd, NULL, TRUE, error);
 }
 
+/* Collect the files that need to be rewritten to reflect the changes of any
+ * YAML patch: The default file, files containing nullified data and the files
+ * of each netdef that was amended by a patch. As a netdef is always written
+ * to a single file (its filepath), every other file it is defined in needs to
+ * be rewritten, too, which might in turn affect other netdefs.
+ * Files referenced by any netdef are added to @referenced.
+ * Returns NULL if no patch was applied to this state, i.e. every file needs
+ * to be rewritten. */
+STATIC GHashTable*
+get_patched_files(const NetplanState* np_state, const char* default_path, GHashTable* referenced)
+{
+    GHashTable* patched = NULL;
+    GHashTableIter hash_iter;
+    gpointer key;
+    gboolean changed = TRUE;
+
+    gboolean has_patch = np_state->patched_sources != NULL;
+    for (GList* iter = np_state->netdefs_ordered; iter && !has_patch; iter = iter->next) {
+        NetplanNetDefinition* netdef = iter->data;
+        has_patch = netdef->_private && netdef->_private->patched;
+    }
+    if (!has_patch)
+        return NULL;
+
+    patched = g_hash_table_new(g_str_hash, g_str_equal);
+    g_hash_table_add(patched, (gpointer)default_path);
+    if (np_state->patched_sources) {
+        g_hash_table_iter_init(&hash_iter, np_state->patched_sources);
+        while (g_hash_table_iter_next(&hash_iter, &key, NULL))
+            g_hash_table_add(patched, key);
+    }
+
+    while (changed) {
+        changed = FALSE;
+        for (GList* iter = np_state->netdefs_ordered; iter; iter = iter->next) {
+            NetplanNetDefinition* netdef = iter->data;
+            GHashTable* origins = netdef->_private ? netdef->_private->origins : NULL;
+            const char* filename = netdef->filepath ? netdef->filepath : default_path;
+            gboolean dirty = (netdef->_private && netdef->_private->patched)
+                             || g_hash_table_contains(patched, filename);
+
+            if (origins) {
+                g_hash_table_iter_init(&hash_iter, origins);
+                while (g_hash_table_iter_next(&hash_iter, &key, NULL)) {
+                    g_hash_table_add(referenced, key);
+                    dirty = dirty || g_hash_table_contains(patched, key);
+                }
+            }
+            if (!dirty)
+                continue;
+
+            changed |= g_hash_table_add(patched, (gpointer)filename);
+            if (origins) {
+                g_hash_table_iter_init(&hash_iter, origins);
+                while (g_hash_table_iter_next(&hash_iter, &key, NULL))
+                    changed |= g_hash_table_add(patched, key);
+            }
+        }
+    }
+    return patched;
+}
+
 gboolean
 netplan_state_update_yaml_hierarchy(const NetplanState* np_state, const char* default_filename, const char* rootdir, GError** error)
 {
@@ -1215,12 +1286,15 @@ netplan_state_update_yaml_hierarchy(const NetplanState* np_state, const char* de
     GHashTableIter hash_iter;
     gpointer key, value;
     GHashTable *perfile_netdefs;
+    GHashTable *patched_files;
+    GHashTable *referenced_files;
 
     g_assert(default_filename != NULL && *default_filename != '\0');
 
     perfile_netdefs = g_hash_table_new_full(g_str_hash, g_str_equal, NULL, (GDestroyNotify)g_list_free);
     default_path = g_build_path(G_DIR_SEPARATOR_S, rootdir != NULL ? rootdir : G_DIR_SEPARATOR_S, "etc", "netplan", default_filename, NULL);
-    int out_fd = -1;
+    referenced_files = g_hash_table_new(g_str_hash, g_str_equal);
+    patched_files = get_patched_files(np_state, default_path, referenced_files);
 
     /* Dump global conf to the default path */
     if (!np_state->netdefs || g_hash_table_size(np_state->netdefs) == 0) {
@@ -1258,27 +1332,29 @@ netplan_state_update_yaml_hierarchy(const NetplanState* np_state, const char* de
         }
     }
 
+    /* Only rewrite the files affected by a patch, if any, leaving the others untouched. */
     g_hash_table_iter_init(&hash_iter, perfile_netdefs);
     while (g_hash_table_iter_next (&hash_iter, &key, &value)) {
         const char *filename = key;
         gboolean is_fallback = (g_strcmp0(filename, default_path) == 0);
         GList* netdefs = value;
-        out_fd = open(filename, O_WRONLY | O_CREAT | O_TRUNC, 0600);
-        if (out_fd < 0)
-            goto file_error;
-        if (!netplan_netdef_list_write_yaml(np_state, netdefs, out_fd, filename, is_fallback, error))
-            goto cleanup; // LCOV_EXCL_LINE
-        close(out_fd);
-        out_fd = -1;
+        if (patched_files && !g_hash_table_contains(patched_files, filename))
+            continue;
+        if (!write_yaml_file_atomically(np_state, netdefs, filename, is_fallback, error))
+            goto cleanup;
     }
 
     /* Remove any referenced source file that doesn't have any associated data.
        Presumably, it is data that has been obsoleted by files loaded
-       afterwards, typically via `netplan set`. */
+       afterwards, typically via `netplan set`. Files which still contribute
+       to an unchanged netdef are kept as-is. */
     if (np_state->sources) {
         g_hash_table_iter_init(&hash_iter, np_state->sources);
         while (g_hash_table_iter_next (&hash_iter, &key, &value)) {
-            if (!g_hash_table_contains(perfile_netdefs, key)) {
+            if (   !g_hash_table_contains(perfile_netdefs, key)
+                && (   !patched_files
+                    || g_hash_table_contains(patched_files, key)
+                    || !g_hash_table_contains(referenced_files, key))) {
                 if (unlink(key) && errno != ENOENT)
                     goto file_error; // LCOV_EXCL_LINE
             }
@@ -1291,8 +1367,9 @@ file_error:
     g_set_error(error, NETPLAN_FILE_ERROR, errno, "%m");
     ret = FALSE;
 cleanup:
-    if (out_fd >= 0)
-        close(out_fd); // LCOV_EXCL_LINE
     g_hash_table_destroy(perfile_netdefs);
+    if (patched_files)
+        g_hash_table_destroy(patched_files);
+    g_hash_table_destroy(referenced_files);
     return ret;
 }
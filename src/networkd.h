@@ -22,6 +22,9 @@
 
 #define NETWORKD_GROUP "systemd-network"
 
+// Per-run cache of network interfaces and their sysfs data (MAC address, driver)
+typedef struct netplan_sysfs_inventory NetplanSysfsInventory;
+
 NETPLAN_INTERNAL gboolean
 _netplan_netdef_write_networkd(
         const NetplanState* np_state,
@@ -50,8 +53,23 @@ _netplan_netdef_write_network_file(
 NETPLAN_INTERNAL gboolean
 _netplan_networkd_write_wait_online(const NetplanState* np_state, const char* rootdir);
 
+NETPLAN_INTERNAL NetplanSysfsInventory*
+_netplan_sysfs_inventory_new(const char* rootdir);
+
+NETPLAN_INTERNAL void
+_netplan_sysfs_inventory_free(NetplanSysfsInventory* inventory);
+
+NETPLAN_INTERNAL const NetplanInterfaceInfo*
+_netplan_sysfs_inventory_lookup(NetplanSysfsInventory* inventory, const char* ifname);
+
 NETPLAN_INTERNAL gboolean
 _netplan_networkd_generate_wait_online(const NetplanState* np_state, const char* rootdir, const char* generator_dir);
 
+NETPLAN_INTERNAL gboolean
+_netplan_networkd_generate_wait_online_with_inventory(
+        const NetplanState* np_state,
+        NetplanSysfsInventory* inventory,
+        const char* generator_dir);
+
 NETPLAN_INTERNAL void
 _netplan_networkd_cleanup(const char* rootdir);
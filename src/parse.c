@@ -3229,7 +3229,9 @@ handle_network_ovs_settings_global_ports(NetplanParser* npp, yaml_node_t* node,
                 g_free(component1->filepath);
 
             component1->filepath = g_strdup(npp->current.filepath);
-        }
+            mark_netdef_origin(component1, npp->current.filepath);
+        } else
+            mark_netdef_patched(component1);
 
         if (component1->peer && g_strcmp0(component1->peer, escaped_peer))
             return yaml_error(npp, port, error, "Open vSwitch port '%s' is already assigned to peer '%s'",
@@ -3248,7 +3250,9 @@ handle_network_ovs_settings_global_ports(NetplanParser* npp, yaml_node_t* node,
                 g_free(component2->filepath);
 
             component2->filepath = g_strdup(npp->current.filepath);
-        }
+            mark_netdef_origin(component2, npp->current.filepath);
+        } else
+            mark_netdef_patched(component2);
 
         if (component2->peer && g_strcmp0(component2->peer, escaped_port))
             return yaml_error(npp, peer, error, "Open vSwitch port '%s' is already assigned to peer '%s'",
@@ -3293,6 +3297,27 @@ node_is_nulled_out(yaml_document_t* doc, yaml_node_t* node, const char* key_pref
     return TRUE;
 }
 
+STATIC gboolean
+node_has_null_fields(yaml_document_t* doc, yaml_node_t* node, const char* key_prefix, GHashTable* null_fields)
+{
+    if (node->type != YAML_MAPPING_NODE)
+        return FALSE;
+
+    for (yaml_node_pair_t* entry = node->data.mapping.pairs.start; entry < node->data.mapping.pairs.top; entry++) {
+        yaml_node_t* key, *value;
+        g_autofree char* full_key = NULL;
+
+        key = yaml_document_get_node(doc, entry->key);
+        value = yaml_document_get_node(doc, entry->value);
+
+        full_key = g_strdup_printf("%s\t%s", key_prefix, key->data.scalar.value);
+        if (   g_hash_table_contains(null_fields, full_key)
+            || node_has_null_fields(doc, value, full_key, null_fields))
+            return TRUE;
+    }
+    return FALSE;
+}
+
 /**
  * Callback for a net device type entry like "ethernets:" in "network:"
  * @data: netdef_type (as pointer)
@@ -3362,7 +3387,9 @@ handle_network_type(NetplanParser* npp, yaml_node_t* node, const char* key_prefi
             if (npp->current.netdef->filepath)
                 g_free(npp->current.netdef->filepath);
             npp->current.netdef->filepath = g_strdup(npp->current.filepath);
-        }
+            mark_netdef_origin(npp->current.netdef, npp->current.filepath);
+        } else
+            mark_netdef_patched(npp->current.netdef);
 
         // XXX: breaks multi-pass parsing.
         //if (!g_hash_table_add(ids_in_file, npp->current.netdef->id))
@@ -3619,6 +3646,15 @@ _netplan_parser_load_single_file(NetplanParser* npp, const char *opt_filepath, y
     if (yaml_document_get_root_node(doc) == NULL)
         return TRUE;
 
+    /* Track files that contain data about to be deleted by a YAML patch, so
+     * they can be updated on disk. */
+    if (   opt_filepath && npp->null_fields
+        && node_has_null_fields(doc, yaml_document_get_root_node(doc), "", npp->null_fields)) {
+        if (!npp->patched_sources)
+            npp->patched_sources = g_hash_table_new_full(g_str_hash, g_str_equal, g_free, NULL);
+        g_hash_table_add(npp->patched_sources, g_strdup(opt_filepath));
+    }
+
     g_assert(npp->ids_in_file == NULL);
     npp->ids_in_file = g_hash_table_new(g_str_hash, NULL);
 
@@ -3755,6 +3791,12 @@ netplan_state_import_parser_results(NetplanState* np_state, NetplanParser* npp,
         g_hash_table_foreach_steal(npp->global_renderer, insert_kv_into_hash, np_state->global_renderer);
     }
 
+    if (npp->patched_sources) {
+        if (!np_state->patched_sources)
+            np_state->patched_sources = g_hash_table_new_full(g_str_hash, g_str_equal, g_free, NULL);
+        g_hash_table_foreach_steal(npp->patched_sources, insert_kv_into_hash, np_state->patched_sources);
+    }
+
     /* We need to reset those fields manually as we transfered ownership of the underlying
        data to out. If we don't do this, netplan_clear_parser will deallocate data
        that we don't own anymore. */
@@ -3839,6 +3881,11 @@ netplan_parser_reset(NetplanParser* npp)
         npp->global_renderer = NULL;
     }
 
+    if (npp->patched_sources) {
+        g_hash_table_destroy(npp->patched_sources);
+        npp->patched_sources = NULL;
+    }
+
     npp->flags = 0;
     npp->error_count = 0;
 }
@@ -4010,3 +4057,59 @@ netplan_parser_load_nullable_overrides(
     yaml_document_delete(&doc);
     return TRUE;
 }
+
+/**
+ * Check if any netdef overridden by the YAML patch in @patch_fd is defined
+ * (in parts) by a YAML file other than the origin-hint @filename.
+ *
+ * If not, the origin-hint file can be written from the fully parsed @np_state
+ * directly. Otherwise those netdefs need to be parsed again, ignoring their
+ * definitions from other files (see netplan_parser_load_nullable_overrides).
+ */
+gboolean
+_netplan_state_patch_overrides_other_files(const NetplanState* np_state, int patch_fd, const char* filename)
+{
+    yaml_document_t doc;
+    GHashTable* overrides = NULL;
+    GHashTableIter iter;
+    gpointer key, value;
+    gboolean ret = FALSE;
+
+    if (!load_yaml_from_fd(patch_fd, &doc, NULL))
+        return TRUE; // LCOV_EXCL_LINE
+
+    /* empty file? */
+    if (yaml_document_get_root_node(&doc) == NULL) {
+        // LCOV_EXCL_START
+        yaml_document_delete(&doc);
+        return FALSE;
+        // LCOV_EXCL_STOP
+    }
+
+    overrides = g_hash_table_new_full(g_str_hash, g_str_equal, g_free, g_free);
+    extract_null_fields(&doc, yaml_document_get_root_node(&doc), overrides, g_strdup(""), filename);
+    yaml_document_delete(&doc);
+
+    g_hash_table_iter_init(&iter, overrides);
+    while (!ret && g_hash_table_iter_next(&iter, &key, &value)) {
+        NetplanNetDefinition* netdef = NULL;
+        GHashTableIter origins;
+        gpointer origin;
+
+        /* Only netdef IDs are overridden while parsing, see handle_network_type().
+         * NULL values are fields about to be deleted, not overrides. */
+        if (!value || g_strcmp0(key, "\tnetwork\trenderer") == 0)
+            continue;
+        netdef = np_state->netdefs ? g_hash_table_lookup(np_state->netdefs, strrchr(key, '\t') + 1) : NULL;
+        if (!netdef || !netdef->_private || !netdef->_private->origins)
+            continue;
+
+        g_hash_table_iter_init(&origins, netdef->_private->origins);
+        while (!ret && g_hash_table_iter_next(&origins, &origin, NULL)) {
+            g_autofree gchar* basename = g_path_get_basename(origin);
+            ret = g_strcmp0(basename, filename) != 0;
+        }
+    }
+    g_hash_table_destroy(overrides);
+    return ret;
+}
@@ -69,6 +69,10 @@ typedef struct missing_node {
 
 struct private_netdef_data {
     GHashTable* dirty_fields;
+    /* Set of the YAML files defining (parts of) this netdef */
+    GHashTable* origins;
+    /* Was this netdef defined or amended by an unnamed YAML patch? */
+    gboolean patched;
 };
 
 typedef enum {
@@ -204,6 +208,9 @@ struct netplan_state {
      * char*) and is initialized with g_hash_table_new_full to avoid leaks. */
     GHashTable* sources;
     GHashTable* global_renderer;
+    /* Hashset of the source files containing data that was nullified by a
+     * YAML patch, i.e. files that need to be rewritten. Owns its data. */
+    GHashTable* patched_sources;
 
     /* Flags used to change the state's behavior */
     unsigned int flags;
@@ -267,6 +274,8 @@ struct netplan_parser {
     GHashTable* null_fields;
     GHashTable* null_overrides;
     GHashTable* global_renderer;
+    /* Which source files contain any of the null_fields? */
+    GHashTable* patched_sources;
 
     /* Flags used to change the parser's behavior */
     unsigned int flags;
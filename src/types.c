@@ -187,6 +187,10 @@ reset_private_netdef_data(struct private_netdef_data* data) {
     if (data->dirty_fields)
         g_hash_table_destroy(data->dirty_fields);
     data->dirty_fields = NULL;
+    if (data->origins)
+        g_hash_table_destroy(data->origins);
+    data->origins = NULL;
+    data->patched = FALSE;
 }
 
 void
@@ -463,6 +467,11 @@ netplan_state_reset(NetplanState* np_state)
         np_state->global_renderer = NULL;
     }
 
+    if (np_state->patched_sources) {
+        g_hash_table_destroy(np_state->patched_sources);
+        np_state->patched_sources = NULL;
+    }
+
     np_state->flags = 0;
 }
 
@@ -79,6 +79,12 @@ systemd_escape(char* string);
 void
 mark_data_as_dirty(NetplanParser* npp, const void* data_ptr);
 
+void
+mark_netdef_origin(NetplanNetDefinition* netdef, const char* filepath);
+
+void
+mark_netdef_patched(NetplanNetDefinition* netdef);
+
 const char*
 tunnel_mode_to_string(NetplanTunnelMode mode);
 
@@ -106,6 +112,9 @@ complex_object_is_dirty(const NetplanNetDefinition* def, const void* obj, size_t
 gboolean
 is_multicast_address(const char*);
 
+GHashTable*
+_netplan_state_match_interfaces(const NetplanState* np_state, const NetplanInterfaceInfo* ifaces, size_t n_ifaces);
+
 NETPLAN_INTERNAL int
 _netplan_state_get_vf_count_for_def(const NetplanState* np_state, const NetplanNetDefinition* netdef, NetplanError** error);
 
@@ -230,3 +239,15 @@ _netplan_scrub_string(const char* content);
 
 gchar*
 _netplan_scrub_systemd_unit_contents(const char* content);
+
+NETPLAN_INTERNAL void
+_netplan_trace_span(const char* name, gint64 start_usec);
+
+NETPLAN_INTERNAL gboolean
+_netplan_state_patch_overrides_other_files(const NetplanState* np_state, int patch_fd, const char* filename);
+
+NETPLAN_INTERNAL gboolean
+_netplan_util_get_all(const char* rootdir, int output_fd, GError** error);
+
+NETPLAN_INTERNAL gboolean
+_netplan_util_set(const char* const* key_values, const char* origin_hint, const char* rootdir, GError** error);
@@ -20,6 +20,7 @@
 #include <arpa/inet.h>
 #include <fnmatch.h>
 #include <errno.h>
+#include <fcntl.h>
 #include <regex.h>
 #include <string.h>
 #include <sys/mman.h>
@@ -37,6 +38,8 @@
 #include "netplan.h"
 #include "parse.h"
 #include "names.h"
+#include "networkd.h"
+#include "nm.h"
 #include "yaml-helpers.h"
 
 GHashTable*
@@ -621,6 +624,182 @@ cleanup:
     return ret;
 }
 
+/**
+ * Build a tab-separated YAML path from a dotted 'netplan set/get' key, e.g.
+ * "ethernets.eth0\.1.dhcp4" => "network\tethernets\teth0.1\tdhcp4"
+ */
+static gchar*
+_yaml_path_from_key(const char* key)
+{
+    GString* path = g_string_new(NULL);
+
+    if (!g_str_has_prefix(key, "network"))
+        g_string_append(path, "network\t");
+    for (const char* c = key; *c; c++) {
+        if (*c == '\\' && c[1] == '.') {
+            /* escaped dot, part of the key itself */
+            g_string_append_c(path, '.');
+            c++;
+        } else if (*c == '.')
+            g_string_append_c(path, '\t');
+        else
+            g_string_append_c(path, *c);
+    }
+    return g_string_free(path, FALSE);
+}
+
+/**
+ * Dump the full YAML configuration found in @rootdir into @output_fd,
+ * same as 'netplan get all --root-dir=...'.
+ */
+gboolean
+_netplan_util_get_all(const char* rootdir, int output_fd, GError** error)
+{
+    gboolean ret = FALSE;
+    NetplanParser* parser = netplan_parser_new();
+    NetplanState* state = netplan_state_new();
+
+    if (   netplan_parser_load_yaml_hierarchy(parser, rootdir, error)
+        && netplan_state_import_parser_results(state, parser, error)
+        && netplan_state_dump_yaml(state, output_fd, error))
+        ret = TRUE;
+
+    netplan_parser_clear(&parser);
+    netplan_state_clear(&state);
+    return ret;
+}
+
+/**
+ * Load the YAML @patch_fds on top of the existing YAML hierarchy in @rootdir.
+ * Fields that are about to be deleted (e.g. some.setting=NULL) are ignored from
+ * the hierarchy, as well as netdefs and globals to be written to the
+ * origin-hint @filename, if given (LP: #2003727).
+ */
+static gboolean
+_load_yaml_patches(NetplanParser* npp, GArray* patch_fds, const char* filename, const char* rootdir, GError** error)
+{
+    int fd = -1;
+
+    for (guint i = 0; i < patch_fds->len; i++) {
+        fd = g_array_index(patch_fds, int, i);
+        lseek(fd, 0, SEEK_SET);
+        if (!netplan_parser_load_nullable_fields(npp, fd, error))
+            return FALSE; // LCOV_EXCL_LINE
+        if (filename) {
+            lseek(fd, 0, SEEK_SET);
+            if (!netplan_parser_load_nullable_overrides(npp, fd, filename, error))
+                return FALSE; // LCOV_EXCL_LINE
+        }
+    }
+
+    if (!netplan_parser_load_yaml_hierarchy(npp, rootdir, error))
+        return FALSE;
+
+    for (guint i = 0; i < patch_fds->len; i++) {
+        fd = g_array_index(patch_fds, int, i);
+        lseek(fd, 0, SEEK_SET);
+        if (!netplan_parser_load_yaml_from_fd(npp, fd, error))
+            return FALSE;
+    }
+    return TRUE;
+}
+
+/**
+ * Apply a NULL-terminated list of "some.key=value" updates to the YAML
+ * configuration found in @rootdir, same as
+ * 'netplan set [--origin-hint=...] --root-dir=... some.key=value [...]'.
+ * All updates are validated together, before anything is written.
+ */
+gboolean
+_netplan_util_set(const char* const* key_values, const char* origin_hint, const char* rootdir, GError** error)
+{
+    g_autofree gchar* filename = NULL;
+    GArray* patch_fds = g_array_new(FALSE, FALSE, sizeof(int));
+    gboolean overrides_other_files = FALSE;
+    gboolean ret = FALSE;
+    int patch_fd = -1;
+
+    NetplanParser* parser = NULL;
+    NetplanState* state = NULL;
+    NetplanParser* output_parser = NULL;
+    NetplanState* output_state = NULL;
+
+    if (origin_hint && !*origin_hint) {
+        g_set_error(error, NETPLAN_FORMAT_ERROR, NETPLAN_ERROR_FORMAT_INVALID_YAML, "Invalid/empty origin-hint");
+        goto cleanup;
+    }
+
+    /* create a temporary file in memory for each YAML patch */
+    for (const char* const* key_value = key_values; *key_value; key_value++) {
+        g_autofree gchar* key = NULL;
+        g_autofree gchar* yaml_path = NULL;
+        const char* value = strchr(*key_value, '=');
+
+        if (!value) {
+            g_set_error(error, NETPLAN_FORMAT_ERROR, NETPLAN_ERROR_FORMAT_INVALID_YAML, "Invalid value specified");
+            goto cleanup;
+        }
+        key = g_strndup(*key_value, (gsize)(value - *key_value));
+        yaml_path = _yaml_path_from_key(key);
+
+        patch_fd = memfd_create("patch.yaml", 0);
+        if (patch_fd < 0) {
+            // LCOV_EXCL_START
+            g_set_error(error, NETPLAN_FILE_ERROR, errno, "Cannot create memfd: %m");
+            goto cleanup;
+            // LCOV_EXCL_STOP
+        }
+        g_array_append_val(patch_fds, patch_fd);
+        if (!netplan_util_create_yaml_patch(yaml_path, value + 1, patch_fd, error))
+            goto cleanup;
+    }
+
+    /* Validate the final state, including all the patches */
+    parser = netplan_parser_new();
+    state = netplan_state_new();
+    if (   !_load_yaml_patches(parser, patch_fds, NULL, rootdir, error)
+        || !netplan_state_import_parser_results(state, parser, error))
+        goto cleanup;
+
+    if (!origin_hint) {
+        ret = netplan_state_update_yaml_hierarchy(state, FALLBACK_FILENAME, rootdir, error);
+        goto cleanup;
+    }
+
+    /* Only act on the output file (a.k.a. "origin-hint"): netdefs and globals
+     * touched by the patches must end up in that file. Unless they are defined
+     * by other YAML files, too, the validated state can be written as-is. */
+    filename = g_strconcat(origin_hint, ".yaml", NULL);
+    for (guint i = 0; i < patch_fds->len && !overrides_other_files; i++) {
+        patch_fd = g_array_index(patch_fds, int, i);
+        lseek(patch_fd, 0, SEEK_SET);
+        overrides_other_files = _netplan_state_patch_overrides_other_files(state, patch_fd, filename);
+    }
+    if (!overrides_other_files) {
+        ret = netplan_state_write_yaml_file(state, filename, rootdir, error);
+        goto cleanup;
+    }
+
+    /* Otherwise, parse the hierarchy again, ignoring the definitions of those
+     * netdefs from the pre-existing YAML files */
+    output_parser = netplan_parser_new();
+    output_state = netplan_state_new();
+    if (   !_load_yaml_patches(output_parser, patch_fds, filename, rootdir, error)
+        || !netplan_state_import_parser_results(output_state, output_parser, error))
+        goto cleanup; // LCOV_EXCL_LINE
+    ret = netplan_state_write_yaml_file(output_state, filename, rootdir, error);
+
+cleanup:
+    if (parser) netplan_parser_clear(&parser);
+    if (state) netplan_state_clear(&state);
+    if (output_parser) netplan_parser_clear(&output_parser);
+    if (output_state) netplan_state_clear(&output_state);
+    for (guint i = 0; i < patch_fds->len; i++)
+        close(g_array_index(patch_fds, int, i));
+    g_array_free(patch_fds, TRUE);
+    return ret;
+}
+
 /**
  * Extract the netplan netdef ID from a NetworkManager connection profile (keyfile),
  * generated by netplan. Used by the NetworkManager YAML backend.
@@ -688,6 +867,162 @@ netplan_netdef_get_output_filename(const NetplanNetDefinition* netdef, const cha
     return 0;
 }
 
+/* Definitions sharing backend configuration, e.g. VLANs referring to their
+ * parent's (generated) connection UUID or bridge ports carrying bridge settings */
+STATIC gboolean
+netdefs_are_linked(const NetplanNetDefinition* a, const NetplanNetDefinition* b)
+{
+    const NetplanNetDefinition* pairs[][2] = {{a, b}, {b, a}};
+    for (guint i = 0; i < G_N_ELEMENTS(pairs); i++) {
+        const NetplanNetDefinition* nd = pairs[i][0];
+        const NetplanNetDefinition* other = pairs[i][1];
+        if (nd->vlan_link == other || nd->sriov_link == other || nd->vrf_link == other
+            || nd->bridge_link == other || nd->bond_link == other || nd->peer_link == other
+            || nd->veth_peer_link == other || (nd->vxlan && nd->vxlan->link == other))
+            return TRUE;
+    }
+    return FALSE;
+}
+
+/* Definitions rendered by networkd or OVS, or using SR-IOV, also feed the
+ * systemd generator output (wait-online, wpa_supplicant, OVS and SR-IOV units) */
+STATIC gboolean
+netdef_needs_generator(const NetplanNetDefinition* def)
+{
+    return def->backend != NETPLAN_BACKEND_NM
+           || def->sriov_explicit_vf_count < G_MAXUINT || def->sriov_link || def->embedded_switch_mode;
+}
+
+STATIC gboolean
+has_networkd_output(const char* netdef_id, const char* rootdir)
+{
+    g_autofree char* escaped_netdef_id = g_uri_escape_string(netdef_id, NULL, TRUE);
+    g_autofree char* network = g_strjoin(NULL, rootdir != NULL ? rootdir : "",
+                                         "/run/systemd/network/10-netplan-", escaped_netdef_id, ".network", NULL);
+    g_autofree char* netdev = g_strjoin(NULL, rootdir != NULL ? rootdir : "",
+                                        "/run/systemd/network/10-netplan-", escaped_netdef_id, ".netdev", NULL);
+    return g_file_test(network, G_FILE_TEST_EXISTS) || g_file_test(netdev, G_FILE_TEST_EXISTS);
+}
+
+/* Remove the files written for @netdef_id in a previous run, keeping those of
+ * other definitions whose escaped ID starts with "<netdef_id>-" */
+STATIC void
+unlink_netdef_output(const NetplanState* np_state, const char* netdef_id, const char* rootdir)
+{
+    g_autofree char* escaped_netdef_id = g_uri_escape_string(netdef_id, NULL, TRUE);
+    g_autofree char* link_file = g_strjoin(NULL, rootdir != NULL ? rootdir : "",
+                                           "/run/systemd/network/10-netplan-", escaped_netdef_id, ".link", NULL);
+    g_autofree char* rules_file = g_strjoin(NULL, rootdir != NULL ? rootdir : "",
+                                            "/run/udev/rules.d/99-netplan-", escaped_netdef_id, ".rules", NULL);
+    g_autofree char* nm_glob = g_strjoin(NULL, rootdir != NULL ? rootdir : "",
+                                         "/run/NetworkManager/system-connections/netplan-", escaped_netdef_id,
+                                         "{,-*}.nmconnection", NULL);
+    size_t prefix_len = strlen("netplan-") + strlen(escaped_netdef_id);
+    glob_t gl;
+
+    unlink(link_file);
+    unlink(rules_file);
+
+    if (glob(nm_glob, GLOB_BRACE, NULL, &gl) != 0)
+        return;
+    for (size_t i = 0; i < gl.gl_pathc; ++i) {
+        const char* name = strrchr(gl.gl_pathv[i], '/') + 1;
+        gboolean other = FALSE;
+        for (GList* it = np_state->netdefs_ordered; it && !other; it = it->next) {
+            const NetplanNetDefinition* nd = it->data;
+            g_autofree char* escaped_id = g_uri_escape_string(nd->id, NULL, TRUE);
+            size_t len = strlen("netplan-") + strlen(escaped_id);
+            other = len > prefix_len && g_str_has_prefix(name + strlen("netplan-"), escaped_id)
+                    && (name[len] == '-' || name[len] == '.');
+        }
+        if (!other)
+            unlink(gl.gl_pathv[i]);
+    }
+    globfree(&gl);
+}
+
+/* netplan-feature: generate-only */
+gboolean
+netplan_state_regenerate_netdef(
+        const NetplanState* np_state,
+        const char* netdef_id,
+        const char* rootdir,
+        GError** error)
+{
+    const NetplanNetDefinition* def = netplan_state_get_netdef(np_state, netdef_id);
+    g_autoptr(GHashTable) affected = g_hash_table_new(g_direct_hash, g_direct_equal);
+    g_autoptr(GList) ordered = NULL;
+    gboolean any_nm = netplan_state_get_backend(np_state) == NETPLAN_BACKEND_NM;
+    gboolean changed = TRUE;
+
+    /* Collect all definitions linked to @def, directly or indirectly */
+    if (def)
+        g_hash_table_add(affected, (gpointer)def);
+    while (changed) {
+        changed = FALSE;
+        for (GList* it = np_state->netdefs_ordered; it; it = it->next) {
+            GHashTableIter iter;
+            gpointer key;
+            if (g_hash_table_contains(affected, it->data))
+                continue;
+            g_hash_table_iter_init(&iter, affected);
+            while (g_hash_table_iter_next(&iter, &key, NULL)) {
+                if (netdefs_are_linked(it->data, key)) {
+                    g_hash_table_add(affected, it->data);
+                    changed = TRUE;
+                    break;
+                }
+            }
+        }
+    }
+
+    /* Check everything before touching any file */
+    if (!def && has_networkd_output(netdef_id, rootdir)) {
+        g_set_error(error, NETPLAN_BACKEND_ERROR, NETPLAN_ERROR_UNSUPPORTED,
+                    "%s: Configuration needs a full regeneration\n", netdef_id);
+        return FALSE;
+    }
+    for (GList* it = np_state->netdefs_ordered; it; it = it->next) {
+        const NetplanNetDefinition* nd = it->data;
+        any_nm = any_nm || nd->backend == NETPLAN_BACKEND_NM;
+        if (!g_hash_table_contains(affected, nd))
+            continue;
+        if (netdef_needs_generator(nd) || has_networkd_output(nd->id, rootdir)) {
+            g_set_error(error, NETPLAN_BACKEND_ERROR, NETPLAN_ERROR_UNSUPPORTED,
+                        "%s: Configuration needs a full regeneration\n", nd->id);
+            return FALSE;
+        }
+        ordered = g_list_append(ordered, (gpointer)nd);
+    }
+
+    if (!def)
+        unlink_netdef_output(np_state, netdef_id, rootdir);
+    for (GList* it = ordered; it; it = it->next) {
+        const NetplanNetDefinition* nd = it->data;
+        unlink_netdef_output(np_state, nd->id, rootdir);
+        if (!_netplan_netdef_write_networkd(np_state, nd, rootdir, NULL, error)
+            || !_netplan_netdef_write_nm(np_state, nd, rootdir, NULL, error))
+            return FALSE;
+    }
+
+    /* Refresh the configuration shared with all other definitions */
+    g_autofree char* nm_conf = g_strjoin(NULL, rootdir != NULL ? rootdir : "",
+                                         "/run/NetworkManager/conf.d/netplan.conf", NULL);
+    g_autofree char* udev_rules = g_strjoin(NULL, rootdir != NULL ? rootdir : "",
+                                            "/run/udev/rules.d/90-netplan.rules", NULL);
+    g_autofree char* global_manage = g_strjoin(NULL, rootdir != NULL ? rootdir : "",
+                                               "/run/NetworkManager/conf.d/10-globally-managed-devices.conf", NULL);
+    unlink(nm_conf);
+    unlink(udev_rules);
+    if (!netplan_state_finish_nm_write(np_state, rootdir, error))
+        return FALSE; // LCOV_EXCL_LINE
+    if (any_nm)
+        _netplan_g_string_free_to_file(g_string_new(NULL), rootdir, "/run/NetworkManager/conf.d/10-globally-managed-devices.conf", NULL);
+    else
+        unlink(global_manage);
+    return TRUE;
+}
+
 gboolean
 netplan_parser_load_yaml_hierarchy(NetplanParser* npp, const char* rootdir, GError** error)
 {
@@ -970,6 +1305,25 @@ mark_data_as_dirty(NetplanParser* npp, const void* data_ptr)
     g_hash_table_insert(npp->current.netdef->_private->dirty_fields, (void*)data_ptr, (void*)data_ptr);
 }
 
+void
+mark_netdef_origin(NetplanNetDefinition* netdef, const char* filepath)
+{
+    if (!netdef->_private)
+        netdef->_private = g_new0(struct private_netdef_data, 1);
+    if (!netdef->_private->origins)
+        netdef->_private->origins = g_hash_table_new_full(g_str_hash, g_str_equal, g_free, NULL);
+    if (!g_hash_table_contains(netdef->_private->origins, filepath))
+        g_hash_table_add(netdef->_private->origins, g_strdup(filepath));
+}
+
+void
+mark_netdef_patched(NetplanNetDefinition* netdef)
+{
+    if (!netdef->_private)
+        netdef->_private = g_new0(struct private_netdef_data, 1);
+    netdef->_private->patched = TRUE;
+}
+
 gboolean
 complex_object_is_dirty(const NetplanNetDefinition* def, const void* obj, size_t obj_size) {
     const char* ptr = obj;
@@ -1048,6 +1402,148 @@ netplan_netdef_match_interface(const NetplanNetDefinition* netdef, const char* n
     return TRUE;
 }
 
+/**
+ * Build an index of interfaces (as positions in @ifaces), keyed by the given
+ * interface property, to avoid walking the whole table for every NetDef.
+ */
+STATIC GHashTable*
+_netplan_index_interfaces(const NetplanInterfaceInfo* ifaces, size_t n_ifaces, gboolean by_mac)
+{
+    GHashTable* index = g_hash_table_new_full(g_str_hash, g_str_equal, g_free, (GDestroyNotify)g_array_unref);
+    for (size_t i = 0; i < n_ifaces; i++) {
+        gchar* key = NULL;
+        if (by_mac)
+            key = g_ascii_strdown(ifaces[i].mac ? ifaces[i].mac : "", -1);
+        else if (ifaces[i].name)
+            key = g_strdup(ifaces[i].name);
+        else
+            continue;
+
+        GArray* positions = g_hash_table_lookup(index, key);
+        if (!positions) {
+            positions = g_array_new(FALSE, FALSE, sizeof(size_t));
+            g_hash_table_insert(index, key, positions);
+        } else {
+            g_free(key);
+        }
+        g_array_append_val(positions, i);
+    }
+    return index;
+}
+
+/**
+ * Evaluate the name and driver match conditions of @def against a single
+ * interface. The MAC address is resolved via the index beforehand.
+ */
+STATIC gboolean
+_netplan_netdef_match_candidate(const NetplanNetDefinition* def, gchar** drivers, const NetplanInterfaceInfo* iface)
+{
+    if (def->match.original_name) {
+        if (!iface->name || fnmatch(def->match.original_name, iface->name, 0))
+            return FALSE;
+    }
+
+    if (drivers) {
+        if (!iface->driver)
+            return FALSE;
+        for (gchar** it = drivers; *it; it++) {
+            if (fnmatch(*it, iface->driver, 0) == 0)
+                return TRUE;
+        }
+        return FALSE;
+    }
+
+    return TRUE;
+}
+
+/**
+ * Match all NetDefs of @np_state against a table of system interfaces.
+ * The match conditions of each NetDef are compiled once: MAC addresses and
+ * literal names are resolved through a hash index, only globs need a scan.
+ *
+ * Returns a hash table, mapping each matching NetDef to a (sorted) GArray of
+ * positions in @ifaces. The caller owns the returned table.
+ */
+GHashTable*
+_netplan_state_match_interfaces(const NetplanState* np_state, const NetplanInterfaceInfo* ifaces, size_t n_ifaces)
+{
+    GHashTable* matches = g_hash_table_new_full(g_direct_hash, g_direct_equal, NULL, (GDestroyNotify)g_array_unref);
+    g_autoptr(GHashTable) by_name = _netplan_index_interfaces(ifaces, n_ifaces, FALSE);
+    g_autoptr(GHashTable) by_mac = NULL;
+
+    for (GList* it = np_state ? np_state->netdefs_ordered : NULL; it; it = it->next) {
+        const NetplanNetDefinition* def = it->data;
+        g_auto(GStrv) drivers = NULL;
+        const GArray* candidates = NULL;
+        gboolean scan_all = FALSE;
+
+        if (!def->has_match) {
+            candidates = g_hash_table_lookup(by_name, def->id);
+        } else if (def->match.mac) {
+            if (!by_mac)
+                by_mac = _netplan_index_interfaces(ifaces, n_ifaces, TRUE);
+            g_autofree gchar* mac = g_ascii_strdown(def->match.mac, -1);
+            candidates = g_hash_table_lookup(by_mac, mac);
+        } else if (def->match.original_name && !strpbrk(def->match.original_name, "*?[\\")) {
+            candidates = g_hash_table_lookup(by_name, def->match.original_name);
+        } else {
+            scan_all = TRUE;
+        }
+        if (def->has_match && def->match.driver)
+            drivers = g_strsplit(def->match.driver, "\t", -1);
+
+        size_t n_candidates = scan_all ? n_ifaces : (candidates ? candidates->len : 0);
+        GArray* positions = NULL;
+        for (size_t i = 0; i < n_candidates; i++) {
+            size_t pos = scan_all ? i : g_array_index(candidates, size_t, i);
+            if (def->has_match && !_netplan_netdef_match_candidate(def, drivers, &ifaces[pos]))
+                continue;
+            if (!positions)
+                positions = g_array_new(FALSE, FALSE, sizeof(size_t));
+            g_array_append_val(positions, pos);
+        }
+        if (positions)
+            g_hash_table_insert(matches, (gpointer)def, positions);
+    }
+    return matches;
+}
+
+ssize_t
+netplan_state_match_interfaces(
+        const NetplanState* np_state,
+        const NetplanInterfaceInfo* ifaces,
+        size_t n_ifaces,
+        NetplanInterfaceMatch* out_matches,
+        size_t out_size)
+{
+    g_autoptr(GHashTable) matches = _netplan_state_match_interfaces(np_state, ifaces, n_ifaces);
+    g_autofree guint* netdefs_per_iface = g_new0(guint, n_ifaces);
+    size_t n_matches = 0;
+
+    for (GList* it = np_state ? np_state->netdefs_ordered : NULL; it; it = it->next) {
+        const GArray* positions = g_hash_table_lookup(matches, it->data);
+        for (guint i = 0; positions && i < positions->len; i++) {
+            netdefs_per_iface[g_array_index(positions, size_t, i)]++;
+            n_matches++;
+        }
+    }
+    if (n_matches > out_size)
+        return NETPLAN_BUFFER_TOO_SMALL;
+
+    size_t n = 0;
+    for (GList* it = np_state ? np_state->netdefs_ordered : NULL; it; it = it->next) {
+        const GArray* positions = g_hash_table_lookup(matches, it->data);
+        for (guint i = 0; positions && i < positions->len; i++) {
+            size_t pos = g_array_index(positions, size_t, i);
+            out_matches[n].netdef = it->data;
+            out_matches[n].iface_index = pos;
+            out_matches[n].duplicate = netdefs_per_iface[pos] > 1;
+            n++;
+        }
+    }
+    return (ssize_t)n_matches;
+}
+
 ssize_t
 netplan_netdef_get_set_name(const NetplanNetDefinition* netdef, char* out_buffer, size_t out_buf_size)
 {
@@ -1334,3 +1830,41 @@ _netplan_scrub_systemd_unit_contents(const char* content)
 
     return g_string_free(s, FALSE);
 }
+
+/**
+ * Append a complete ("ph": "X") event in the Chrome trace event format to the
+ * file named by $NETPLAN_TRACE, if set. The span covers the time since
+ * @start_usec, as returned by g_get_monotonic_time(), so that it lines up with
+ * the spans recorded by the netplan CLI (using the same CLOCK_MONOTONIC).
+ * Events are written as lines of a JSON array, which the CLI finalizes.
+ */
+void
+_netplan_trace_span(const char* name, gint64 start_usec)
+{
+    const char* path = getenv("NETPLAN_TRACE");
+    struct stat st;
+    gint64 now = 0;
+    int fd = -1;
+
+    if (!path || !*path)
+        return;
+
+    now = g_get_monotonic_time();
+    fd = open(path, O_WRONLY | O_APPEND | O_CREAT | O_CLOEXEC, 0640);
+    if (fd < 0) {
+        g_debug("Cannot open trace file %s: %s", path, g_strerror(errno));
+        return;
+    }
+
+    GString* s = g_string_new(NULL);
+    if (fstat(fd, &st) == 0 && st.st_size == 0)
+        g_string_append(s, "[\n");
+    g_string_append_printf(s, "{\"name\": \"%s\", \"cat\": \"netplan\", \"ph\": \"X\", "
+                              "\"ts\": %" G_GINT64_FORMAT ", \"dur\": %" G_GINT64_FORMAT ", "
+                              "\"pid\": %d, \"tid\": %d},\n",
+                           name, start_usec, now - start_usec, getpid(), getpid());
+    if (write(fd, s->str, s->len) < 0)
+        g_debug("Cannot write trace file %s: %s", path, g_strerror(errno)); // LCOV_EXCL_LINE
+    g_string_free(s, TRUE);
+    close(fd);
+}
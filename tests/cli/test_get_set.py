@@ -22,12 +22,14 @@ import unittest
 import tempfile
 import shutil
 import glob
+from unittest.mock import patch
 
 import yaml
 
 from netplan_cli.cli.commands.set import FALLBACK_FILENAME
 from netplan_cli.cli.ovs import OVS_VSCTL_PATH
 
+import netplan
 from netplan import NetplanException
 from tests.test_utils import call_cli
 
@@ -101,6 +103,62 @@ class TestSet(unittest.TestCase):
         with open(p, 'r') as f:
             self.assertIs(True, yaml.safe_load(f)['network']['ethernets']['eth0']['dhcp4'])
 
+    def test_set_origin_hint_single_parse(self):
+        # eth0 is not defined in any other file, no need to parse the hierarchy again
+        with patch('netplan.Parser._load_nullable_overrides') as mock:
+            self._set(['ethernets.eth0.dhcp4=true', '--origin-hint=99_snapd'])
+            mock.assert_not_called()
+        with open(os.path.join(self.workdir.name, 'etc', 'netplan', '99_snapd.yaml'), 'r') as f:
+            self.assertIs(True, yaml.safe_load(f)['network']['ethernets']['eth0']['dhcp4'])
+        # eth0 is defined in 99_snapd.yaml only
+        with patch('netplan.Parser._load_nullable_overrides') as mock:
+            self._set(['ethernets.eth0.dhcp6=true', '--origin-hint=99_snapd'])
+            mock.assert_not_called()
+        # eth0 is defined in another file, too
+        with open(os.path.join(self.workdir.name, 'etc', 'netplan', '0-defaults.yaml'), 'w') as f:
+            f.write('network: {ethernets: {eth0: {mtu: 1500}}}')
+        with patch('netplan.Parser._load_nullable_overrides', autospec=True,
+                   side_effect=netplan.Parser._load_nullable_overrides) as mock:
+            self._set(['ethernets.eth0.dhcp4=false', '--origin-hint=99_snapd'])
+            mock.assert_called_once()
+        with open(os.path.join(self.workdir.name, 'etc', 'netplan', '99_snapd.yaml'), 'r') as f:
+            self.assertEqual({'dhcp4': False, 'dhcp6': True}, yaml.safe_load(f)['network']['ethernets']['eth0'])
+
+    def test_set_keep_unchanged_files(self):
+        confdir = os.path.join(self.workdir.name, 'etc', 'netplan')
+        a = os.path.join(confdir, '10-a.yaml')
+        with open(a, 'w') as f:
+            f.write('network: {ethernets: {eth0: {dhcp4: true}}}')
+        b = os.path.join(confdir, '20-b.yaml')
+        with open(b, 'w') as f:
+            f.write('network:\n  ethernets:\n    eth1: {dhcp4: true}  # keep me\n')
+        c = os.path.join(confdir, '30-c.yaml')
+        with open(c, 'w') as f:
+            f.write('network: {ethernets: {eth2: {mtu: 1500}}}')
+        d = os.path.join(confdir, '40-d.yaml')
+        with open(d, 'w') as f:
+            f.write('network: {ethernets: {eth2: {dhcp4: true}}}')
+        inode_b = os.stat(b).st_ino
+        self._set(['ethernets.eth0.dhcp6=true'])
+        with open(a, 'r') as f:
+            self.assertEqual({'dhcp4': True, 'dhcp6': True}, yaml.safe_load(f)['network']['ethernets']['eth0'])
+        # files not affected by the patch are left untouched
+        self.assertEqual(inode_b, os.stat(b).st_ino)
+        with open(b, 'r') as f:
+            self.assertIn('# keep me', f.read())
+        with open(c, 'r') as f:
+            self.assertEqual('network: {ethernets: {eth2: {mtu: 1500}}}', f.read())
+        # eth2 is consolidated into its last file, once it is changed
+        self._set(['ethernets.eth2.dhcp6=true'])
+        self.assertFalse(os.path.isfile(c))
+        with open(d, 'r') as f:
+            self.assertEqual({'mtu': 1500, 'dhcp4': True, 'dhcp6': True}, yaml.safe_load(f)['network']['ethernets']['eth2'])
+        self.assertEqual(inode_b, os.stat(b).st_ino)
+        # files containing nullified data are updated
+        self._set(['ethernets.eth1.dhcp4=NULL'])
+        self.assertFalse(os.path.isfile(b))
+        self.assertFalse(os.path.isfile(self.path))
+
     def test_set_origin_hint_update(self):
         hint = os.path.join(self.workdir.name, 'etc', 'netplan', 'hint.yaml')
         with open(hint, 'w') as f:
@@ -324,6 +382,58 @@ class TestSet(unittest.TestCase):
             self.assertEqual(2, yml['network']['version'])
             self.assertEqual('networkd', yml['network']['renderer'])
 
+    def test_set_many(self):
+        self._set(['ethernets.eth0.dhcp4=true', 'ethernets.eth0.dhcp6=true', 'ethernets.eth1.dhcp4=false'])
+        with open(self.path, 'r') as f:
+            yml = yaml.safe_load(f)
+            self.assertEqual({'dhcp4': True, 'dhcp6': True}, yml['network']['ethernets']['eth0'])
+            self.assertEqual({'dhcp4': False}, yml['network']['ethernets']['eth1'])
+
+    def test_set_many_origin_hint(self):
+        self._set(['ethernets.eth0.dhcp4=true', 'renderer=NetworkManager', '--origin-hint=90-snapd'])
+        self.assertFalse(os.path.isfile(self.path))
+        with open(os.path.join(self.workdir.name, 'etc', 'netplan', '90-snapd.yaml'), 'r') as f:
+            yml = yaml.safe_load(f)
+            self.assertIs(True, yml['network']['ethernets']['eth0']['dhcp4'])
+            self.assertEqual('NetworkManager', yml['network']['renderer'])
+
+    def test_set_many_invalid(self):
+        with self.assertRaises(Exception) as context:
+            self._set(['ethernets.eth0.dhcp4=true', 'xxx.yyy=abc'])
+        self.assertIn('unknown key \'xxx\'', str(context.exception))
+        # nothing is written if any of the pairs is invalid
+        self.assertFalse(os.path.isfile(self.path))
+
+    def test_set_patch(self):
+        patch = os.path.join(self.workdir.name, 'patch.json')
+        with open(patch, 'w') as f:
+            f.write('{"network": {"ethernets": {"eth0": {"dhcp4": true}}}}')
+        self._set(['--patch', patch, 'ethernets.eth0.dhcp6=true'])
+        with open(self.path, 'r') as f:
+            self.assertEqual({'dhcp4': True, 'dhcp6': True}, yaml.safe_load(f)['network']['ethernets']['eth0'])
+
+    def test_set_patch_without_network_key(self):
+        patch = os.path.join(self.workdir.name, 'patch.yaml')
+        with open(patch, 'w') as f:
+            f.write('ethernets:\n  eth0:\n    dhcp4: true\n')
+        self._set(['--patch', patch])
+        with open(self.path, 'r') as f:
+            self.assertIs(True, yaml.safe_load(f)['network']['ethernets']['eth0']['dhcp4'])
+
+    def test_set_patch_invalid(self):
+        patch = os.path.join(self.workdir.name, 'patch.yaml')
+        with open(patch, 'w') as f:
+            f.write('- eth0\n')
+        with self.assertRaises(Exception) as context:
+            self._set(['--patch', patch])
+        self.assertIn('Invalid patch document', str(context.exception))
+        self.assertFalse(os.path.isfile(self.path))
+
+    def test_set_nothing(self):
+        with self.assertRaises(Exception) as context:
+            self._set([])
+        self.assertIn('No key=value pair or patch document specified', str(context.exception))
+
     def test_set_invalid(self):
         with self.assertRaises(Exception) as context:
             self._set(['xxx.yyy=abc'])
@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+# Closed-box tests of netplan CLI. These are run during "make check" and don't
+# touch the system configuration at all.
+#
+# Copyright (C) 2025 Canonical, Ltd.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import errno
+import os
+import selectors
+import struct
+import unittest
+from unittest.mock import MagicMock, patch
+
+from netplan_cli.cli import monitor
+from netplan_cli.cli.monitor import DBusMonitor, RtnlMonitor
+
+from tests.test_utils import MockCmd
+
+
+def nlmsg(msg_type: int, payload: bytes) -> bytes:
+    length = monitor.NLMSGHDR.size + len(payload)
+    data = monitor.NLMSGHDR.pack(length, msg_type, 0, 0, 0) + payload
+    return data + b'\0' * ((4 - length % 4) % 4)
+
+
+def rtmsg(protocol: int) -> bytes:
+    # family, dst_len, src_len, tos, table, protocol, scope, type, flags
+    return struct.pack('=BBBBBBBBI', 2, 24, 0, 0, 254, protocol, 0, 1, 0)
+
+
+IFINFOMSG = struct.pack('=BxHiII', 0, 1, 42, 0, 0)
+IFADDRMSG = struct.pack('=BBBBI', 2, 24, 0, 0, 42)
+
+
+class TestRtnlMonitor(unittest.TestCase):
+    '''Test netplan status --watch rtnetlink events'''
+
+    def test_parse(self):
+        self.assertEqual(RtnlMonitor.parse(nlmsg(monitor.RTM_NEWLINK, IFINFOMSG)), {'iproute2'})
+        self.assertEqual(RtnlMonitor.parse(nlmsg(monitor.RTM_DELADDR, IFADDRMSG)), {'iproute2'})
+        self.assertEqual(RtnlMonitor.parse(nlmsg(monitor.RTM_NEWROUTE, rtmsg(4))), {'routes'})  # static
+        self.assertEqual(RtnlMonitor.parse(nlmsg(monitor.RTM_DELROUTE, rtmsg(16))), {'routes'})  # dhcp
+        self.assertEqual(RtnlMonitor.parse(nlmsg(monitor.RTM_NEWROUTE, rtmsg(186))), set())  # bgp
+        self.assertEqual(RtnlMonitor.parse(nlmsg(3, b'')), set())  # NLMSG_DONE
+
+    def test_parse_multipart(self):
+        bgp = nlmsg(monitor.RTM_NEWROUTE, rtmsg(186))
+        self.assertEqual(RtnlMonitor.parse(bgp * 1000), set())
+        self.assertEqual(RtnlMonitor.parse(bgp * 10 + nlmsg(monitor.RTM_NEWADDR, IFADDRMSG) + bgp),
+                         {'iproute2'})
+        self.assertEqual(RtnlMonitor.parse(nlmsg(monitor.RTM_NEWLINK, IFINFOMSG) + bgp +
+                                           nlmsg(monitor.RTM_DELROUTE, rtmsg(3))),  # boot
+                         {'iproute2', 'routes'})
+
+    def test_parse_invalid(self):
+        self.assertEqual(RtnlMonitor.parse(b''), set())
+        self.assertEqual(RtnlMonitor.parse(b'\1\2\3'), set())
+        self.assertEqual(RtnlMonitor.parse(monitor.NLMSGHDR.pack(0, monitor.RTM_NEWLINK, 0, 0, 0)), set())
+        # truncated rtmsg
+        self.assertEqual(RtnlMonitor.parse(monitor.NLMSGHDR.pack(20, monitor.RTM_NEWROUTE, 0, 0, 0)), set())
+
+    def test_read(self):
+        rtnl = RtnlMonitor()
+        self.assertGreaterEqual(rtnl.fileno(), 0)
+        rtnl.close()
+        rtnl.sock = MagicMock()
+        rtnl.sock.recv.side_effect = [nlmsg(monitor.RTM_NEWROUTE, rtmsg(186)), BlockingIOError()]
+        self.assertEqual(rtnl.read(), set())
+        rtnl.sock.recv.side_effect = [nlmsg(monitor.RTM_NEWADDR, IFADDRMSG),
+                                      OSError(errno.ENOBUFS, 'No buffer space available'),
+                                      BlockingIOError()]
+        with self.assertLogs(level='DEBUG') as cm:
+            self.assertEqual(rtnl.read(), {'iproute2', 'routes'})
+            self.assertIn('DEBUG:root:rtnetlink notifications overrun', cm.output)
+
+
+class TestDBusMonitor(unittest.TestCase):
+    '''Test netplan status --watch D-Bus events'''
+
+    def setUp(self):
+        self.mock_busctl = MockCmd('busctl')
+        self.path_env = os.environ['PATH']
+        os.environ['PATH'] = os.path.dirname(self.mock_busctl.path) + os.pathsep + self.path_env
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path_env
+
+    def test_parse(self):
+        self.assertEqual(DBusMonitor.parse(b'{"type":"signal","path":"/org/freedesktop/network1/link/_32"}'),
+                         {'networkd'})
+        self.assertEqual(DBusMonitor.parse(b'{"path":"/org/freedesktop/NetworkManager/Devices/3"}'), {'nm'})
+        self.assertEqual(DBusMonitor.parse(b'{"path":"/org/freedesktop/resolve1"}'), {'resolved'})
+        self.assertEqual(DBusMonitor.parse(b'{"path":"/org/freedesktop/resolve1x"}'), set())
+        self.assertEqual(DBusMonitor.parse(b'{"path":"/org/freedesktop/login1"}'), set())
+        self.assertEqual(DBusMonitor.parse(b'[]'), set())
+        self.assertEqual(DBusMonitor.parse(b'garbage'), set())
+
+    def test_read(self):
+        self.mock_busctl.set_output('''{"type":"signal","path":"/org/freedesktop/network1/link/_32"}
+{"type":"signal","path":"/org/freedesktop/resolve1"}''')
+        dbus = DBusMonitor()
+        sources = set()
+        with selectors.DefaultSelector() as selector:
+            selector.register(dbus, selectors.EVENT_READ)
+            with self.assertLogs(level='DEBUG') as cm:
+                while selector.select(5):
+                    if (affected := dbus.read()) is None:
+                        break
+                    sources.update(affected)
+                self.assertIn('DEBUG:root:Cannot monitor D-Bus property changes, busctl exited with 0', cm.output)
+        dbus.close()
+        self.assertEqual(sources, {'networkd', 'resolved'})
+        self.assertEqual(self.mock_busctl.calls(), [[
+            'busctl', '--system', '--json=short', 'monitor', '--match',
+            "type='signal',interface='org.freedesktop.DBus.Properties',member='PropertiesChanged'"]])
+
+    def test_read_partial_line(self):
+        dbus = DBusMonitor()
+        with patch('os.read') as mock:
+            mock.side_effect = [b'{"path":"/org/freedesktop/res', b'olve1"}\n{"path":"/org/freedesktop/NetworkMan']
+            self.assertEqual(dbus.read(), set())
+            self.assertEqual(dbus.read(), {'resolved'})
+            self.assertEqual(dbus.buffer, b'{"path":"/org/freedesktop/NetworkMan')
+        dbus.close()
+
+    @patch('shutil.which')
+    def test_missing_busctl(self, mock):
+        mock.return_value = None
+        with self.assertRaises(RuntimeError):
+            DBusMonitor()
@@ -23,13 +23,16 @@ import json
 import os
 import shutil
 import subprocess
+import sys
 import tempfile
+import threading
+import tracemalloc
 import unittest
 from unittest.mock import call, mock_open, patch
 
 import yaml
 
-from netplan_cli.cli.state import (Interface, NetplanConfigState,
+from netplan_cli.cli.state import (QUERY_TIMEOUT, Interface, NetplanConfigState,
                                    SystemConfigState)
 
 from .test_status import (BRIDGE, DNS_ADDRESSES, DNS_IP4, DNS_SEARCH, FAKE_DEV,
@@ -46,7 +49,7 @@ class TestSystemState(unittest.TestCase):
     def test_query_iproute2(self, mock):
         mock.return_value = IPROUTE2
         res = SystemConfigState.query_iproute2()
-        mock.assert_called_with(['ip', '-d', '-j', 'addr'], text=True)
+        mock.assert_called_with(['ip', '-d', '-j', 'addr'], text=True, timeout=QUERY_TIMEOUT)
         self.assertEqual(len(res), 7)
         self.assertListEqual([itf.get('ifname') for itf in res],
                              ['lo', 'enp0s31f6', 'wlan0', 'wg0', 'wwan0', 'tun0', 'tun1'])
@@ -56,15 +59,52 @@ class TestSystemState(unittest.TestCase):
         mock.side_effect = subprocess.CalledProcessError(1, '', 'ERR')
         with self.assertLogs() as cm:
             res = SystemConfigState.query_iproute2()
-            mock.assert_called_with(['ip', '-d', '-j', 'addr'], text=True)
+            mock.assert_called_with(['ip', '-d', '-j', 'addr'], text=True, timeout=QUERY_TIMEOUT)
             self.assertIsNone(res)
             self.assertIn('CRITICAL:root:Cannot query iproute2 interface data:', cm.output[0])
 
+    @patch('subprocess.check_output')
+    def test_query_iproute2_scoped(self, mock):
+        links = {
+            'dev br0': [{'ifname': 'br0', 'master': 'vrf0',  # wokeignore:rule=master
+                         'linkinfo': {'info_kind': 'bridge', 'info_slave_kind': 'vrf'}}],
+            'master br0': [{'ifname': 'eth0', 'master': 'br0'},  # wokeignore:rule=master
+                           {'ifname': 'eth1', 'master': 'br0'}],  # wokeignore:rule=master
+            'dev vrf0': [{'ifname': 'vrf0', 'linkinfo': {'info_kind': 'vrf'}}],
+            'dev wlan0': [{'ifname': 'wlan0'}],
+        }
+
+        def ip(cmd, **kwargs):
+            if (selector := ' '.join(cmd[-2:])) not in links:
+                raise subprocess.CalledProcessError(1, cmd, 'Device does not exist')
+            return json.dumps(links[selector])
+
+        mock.side_effect = ip
+        with self.assertLogs(level='DEBUG') as cm:
+            res = SystemConfigState.query_iproute2('br0', ['eth1', 'wlan0', 'gone0'])
+            self.assertIn('DEBUG:root:Cannot query iproute2 interface data of gone0', cm.output)
+        self.assertListEqual([itf.get('ifname') for itf in res], ['br0', 'eth0', 'eth1', 'vrf0', 'wlan0'])
+        mock.assert_has_calls([
+            call(['ip', '-d', '-j', 'addr', 'show', 'dev', 'br0'], text=True, timeout=QUERY_TIMEOUT),
+            call(['ip', '-d', '-j', 'addr', 'show', 'master', 'br0'],  # wokeignore:rule=master
+                 text=True, timeout=QUERY_TIMEOUT),
+            call(['ip', '-d', '-j', 'addr', 'show', 'dev', 'vrf0'], text=True, timeout=QUERY_TIMEOUT),
+            call(['ip', '-d', '-j', 'addr', 'show', 'dev', 'wlan0'], text=True, timeout=QUERY_TIMEOUT),
+            call(['ip', '-d', '-j', 'addr', 'show', 'dev', 'gone0'], text=True, timeout=QUERY_TIMEOUT),
+            ])
+        self.assertEqual(mock.call_count, 5)
+
+        # the members of other interfaces are not queried
+        mock.reset_mock()
+        res = SystemConfigState.query_iproute2('wlan0')
+        self.assertListEqual([itf.get('ifname') for itf in res], ['wlan0'])
+        mock.assert_called_once_with(['ip', '-d', '-j', 'addr', 'show', 'dev', 'wlan0'], text=True, timeout=QUERY_TIMEOUT)
+
     @patch('subprocess.check_output')
     def test_query_networkd(self, mock):
         mock.return_value = NETWORKD
         res = SystemConfigState.query_networkd()
-        mock.assert_called_with(['networkctl', '--json=short'], text=True)
+        mock.assert_called_with(['networkctl', '--json=short'], text=True, timeout=QUERY_TIMEOUT)
         self.assertEqual(len(res), 10)
         self.assertListEqual([itf.get('Name') for itf in res],
                              ['lo', 'enp0s31f6', 'wlan0', 'wg0', 'wwan0', 'tun0', 'mybr0', 'mybond0', 'myvrf0', 'tun1'])
@@ -74,17 +114,34 @@ class TestSystemState(unittest.TestCase):
         mock.side_effect = subprocess.CalledProcessError(1, '', 'ERR')
         with self.assertLogs() as cm:
             res = SystemConfigState.query_networkd()
-            mock.assert_called_with(['networkctl', '--json=short'], text=True)
+            mock.assert_called_with(['networkctl', '--json=short'], text=True, timeout=QUERY_TIMEOUT)
             self.assertIsNone(res)
             self.assertIn('CRITICAL:root:Cannot query networkd interface data:', cm.output[0])
 
+    @patch('subprocess.check_output')
+    def test_query_networkd_scoped(self, mock):
+        mock.return_value = json.dumps(json.loads(NETWORKD)['Interfaces'][1])
+        res = SystemConfigState.query_networkd('enp0s31f6')
+        mock.assert_called_with(['networkctl', '--json=short', 'status', 'enp0s31f6'], text=True, timeout=QUERY_TIMEOUT)
+        self.assertListEqual([itf.get('Name') for itf in res], ['enp0s31f6'])
+
+    @patch('subprocess.check_output')
+    def test_query_networkd_scoped_fallback(self, mock):
+        # older networkctl versions print their human readable output instead
+        mock.side_effect = ['● 2: enp0s31f6\n  Link File: /usr/lib/systemd/network/99-default.link', NETWORKD]
+        with self.assertLogs(level='DEBUG') as cm:
+            res = SystemConfigState.query_networkd('enp0s31f6')
+            self.assertIn('DEBUG:root:Cannot query networkd interface data of enp0s31f6:', cm.output[0])
+        mock.assert_called_with(['networkctl', '--json=short'], text=True, timeout=QUERY_TIMEOUT)
+        self.assertEqual(len(res), 10)
+
     @patch('subprocess.check_output')
     def test_query_nm(self, mock):
         mock.return_value = NMCLI
         res = SystemConfigState.query_nm()
         mock.assert_called_with(['nmcli', '-t', '-f',
                                  'DEVICE,NAME,UUID,FILENAME,TYPE,AUTOCONNECT',
-                                 'con', 'show'], text=True)
+                                 'con', 'show', '--active'], text=True, timeout=QUERY_TIMEOUT)
         self.assertEqual(len(res), 2)
         self.assertListEqual([itf.get('device') for itf in res], ['wlan0', 'wlan1'])
 
@@ -95,17 +152,17 @@ class TestSystemState(unittest.TestCase):
             res = SystemConfigState.query_nm()
             mock.assert_called_with(['nmcli', '-t', '-f',
                                      'DEVICE,NAME,UUID,FILENAME,TYPE,AUTOCONNECT',
-                                     'con', 'show'], text=True)
+                                     'con', 'show', '--active'], text=True, timeout=QUERY_TIMEOUT)
             self.assertIsNone(res)
             self.assertIn('DEBUG:root:Cannot query NetworkManager interface data:', cm.output[0])
 
-    @patch('subprocess.check_output')
+    @patch('netplan_cli.cli.state.SystemConfigState.stream_generic')
     def test_query_routes(self, mock):
-        mock.side_effect = [ROUTE4, ROUTE6]
+        mock.side_effect = [iter(json.loads(ROUTE4)), iter(json.loads(ROUTE6))]
         res4, res6 = SystemConfigState.query_routes()
         mock.assert_has_calls([
-            call(['ip', '-d', '-j', '-4', 'route', 'show', 'table', 'all'], text=True),
-            call(['ip', '-d', '-j', '-6', 'route', 'show', 'table', 'all'], text=True),
+            call(['ip', '-d', '-j', '-4', 'route', 'show', 'table', 'all']),
+            call(['ip', '-d', '-j', '-6', 'route', 'show', 'table', 'all']),
             ])
         self.assertEqual(len(res4), 7)
         self.assertListEqual([route.get('dev') for route in res4],
@@ -115,16 +172,105 @@ class TestSystemState(unittest.TestCase):
                              ['lo', 'enp0s31f6', 'wlan0', 'enp0s31f6', 'wlan0',
                               'tun0', 'enp0s31f6', 'wlan0', 'enp0s31f6', 'wlan0'])
 
-    @patch('subprocess.check_output')
+    @patch('netplan_cli.cli.state.SystemConfigState.stream_generic')
+    def test_query_routes_scoped(self, mock):
+        # iproute2 omits the device of routes filtered by device
+        dev_route = {'dst': '10.0.0.0/8', 'gateway': '192.168.0.1', 'protocol': 'static'}
+        default_routes = [{'dst': 'default', 'gateway': '192.168.0.1', 'dev': 'eth0', 'protocol': 'dhcp'},
+                          {'dst': 'default', 'gateway': '192.168.1.1', 'dev': 'wlan0', 'protocol': 'dhcp'}]
+        mock.side_effect = [iter([dev_route]), iter(default_routes), iter([]), iter([])]
+        res4, res6 = SystemConfigState.query_routes('eth0')
+        mock.assert_has_calls([
+            call(['ip', '-d', '-j', '-4', 'route', 'show', 'table', 'all', 'dev', 'eth0']),
+            call(['ip', '-d', '-j', '-4', 'route', 'show', 'table', 'all', 'default']),
+            call(['ip', '-d', '-j', '-6', 'route', 'show', 'table', 'all', 'dev', 'eth0']),
+            call(['ip', '-d', '-j', '-6', 'route', 'show', 'table', 'all', 'default']),
+            ])
+        self.assertListEqual([(route['dst'], route['dev']) for route in res4],
+                             [('10.0.0.0/8', 'eth0'), ('default', 'wlan0')])
+        self.assertListEqual(res6, [])
+        self.assertListEqual(SystemConfigState.default_route_interfaces(res4, res6), ['wlan0'])
+        self.assertListEqual(SystemConfigState.default_route_interfaces(default_routes + [dev_route], None),
+                             ['eth0', 'wlan0'])
+
+    @patch('netplan_cli.cli.state.SystemConfigState.stream_generic')
     def test_query_routes_fail(self, mock):
         mock.side_effect = subprocess.CalledProcessError(1, '', 'ERR')
         with self.assertLogs(level='DEBUG') as cm:
             res4, res6 = SystemConfigState.query_routes()
-            mock.assert_called_with(['ip', '-d', '-j', '-4', 'route', 'show', 'table', 'all'], text=True)
+            mock.assert_called_with(['ip', '-d', '-j', '-4', 'route', 'show', 'table', 'all'])
             self.assertIsNone(res4)
             self.assertIsNone(res6)
             self.assertIn('DEBUG:root:Cannot query iproute2 route data:', cm.output[0])
 
+    @patch('netplan_cli.cli.state.SystemConfigState.stream_generic')
+    def test_query_routes_foreign_protocols(self, mock):
+        bgp = {'type': 'unicast', 'dst': '1.0.0.0/24', 'gateway': '192.0.2.1', 'dev': 'eth0',
+               'table': 'main', 'protocol': 'bgp', 'scope': 'global', 'metric': 20, 'flags': []}
+        ospf = {'type': 'unicast', 'dst': '2001:db8:1::/48', 'gateway': 'fe80::1', 'dev': 'eth0',
+                'table': '100', 'protocol': 'ospf', 'scope': 'global', 'metric': 20, 'flags': []}
+        mock.side_effect = [iter([bgp] + json.loads(ROUTE4) + [bgp]), iter(json.loads(ROUTE6) + [ospf])]
+        res4, res6 = SystemConfigState.query_routes()
+        self.assertEqual(len(res4), 7)
+        self.assertEqual(len(res6), 10)
+        self.assertNotIn('bgp', [route.get('protocol') for route in res4])
+        self.assertNotIn('ospf', [route.get('protocol') for route in res6])
+        self.assertEqual({route['family'] for route in res4}, {2})
+        self.assertEqual({route['family'] for route in res6}, {10})
+
+    def test_stream_generic(self):
+        data = json.loads(ROUTE4) + json.loads(ROUTE6)
+        tmp = tempfile.NamedTemporaryFile('w', suffix='.json')
+        json.dump(data, tmp, indent=2)
+        tmp.flush()
+        # read in small chunks, so elements are split across chunk boundaries
+        with patch('netplan_cli.cli.state.STREAM_CHUNK_SIZE', 7):
+            self.assertListEqual(list(SystemConfigState.stream_generic(['cat', tmp.name])), data)
+        self.assertListEqual(list(SystemConfigState.stream_generic(['echo', '[]'])), [])
+
+    def test_stream_generic_fail(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(SystemConfigState.stream_generic(['false']))
+        with self.assertRaises(subprocess.TimeoutExpired):
+            list(SystemConfigState.stream_generic(['sleep', '10'], timeout=0.1))
+        with self.assertRaises(ValueError) as e:
+            list(SystemConfigState.stream_generic(['echo', '[{"dst":"default"},{"dst":']))
+        self.assertIn('Cannot parse JSON output of echo: {"dst":', str(e.exception))
+
+    def test_stream_generic_full_table(self):
+        # 50k BGP routes (~10 MB of JSON) can be ingested with bounded memory
+        script = (
+            'import json, sys\n'
+            'sys.stdout.write("[")\n'
+            'for i in range(50000):\n'
+            '    sys.stdout.write(("," if i else "") + json.dumps({"type": "unicast", '
+            '"dst": "%d.%d.%d.0/24" % (1 + i // 65536, i // 256 % 256, i % 256), "gateway": "192.0.2.1", '
+            '"dev": "eth0", "table": "main", "protocol": "bgp", "scope": "global", "metric": 20, '
+            '"flags": [], "metrics": [{"mtu": 1500}]}))\n'
+            'sys.stdout.write(json.dumps({"type": "unicast", "dst": "default", "gateway": "192.0.2.1", '
+            '"dev": "eth0", "table": "main", "protocol": "static", "scope": "global", "flags": []}) + "]")\n')
+        cmd = [sys.executable, '-c', script]
+        tracemalloc.start()
+        try:
+            routes = SystemConfigState.process_routes(SystemConfigState.stream_generic(cmd), 2)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(routes, [{'type': 'unicast', 'dst': 'default', 'gateway': '192.0.2.1', 'dev': 'eth0',
+                                   'table': 'main', 'protocol': 'static', 'scope': 'global', 'flags': [],
+                                   'family': 2}])
+        self.assertLess(peak, 1024 * 1024)  # json.loads() needs ~60 MB
+
+    def test_process_routes_numeric_protocol(self):
+        # iproute2 falls back to the numeric ID for protocols missing from rt_protos
+        routes = [{'dst': '198.51.100.0/24', 'dev': 'eth0', 'protocol': '186'},
+                  {'dst': '203.0.113.0/24', 'dev': 'eth0', 'protocol': 'ospf'},
+                  {'dst': 'default', 'dev': 'eth0', 'protocol': 'static'},
+                  {'dst': '192.0.2.0/24', 'dev': 'eth0', 'protocol': '200'}]
+        self.assertEqual(SystemConfigState.process_routes(routes, 2),
+                         [{'dst': 'default', 'dev': 'eth0', 'protocol': 'static', 'family': 2},
+                          {'dst': '192.0.2.0/24', 'dev': 'eth0', 'protocol': '200', 'family': 2}])
+
     @patch('subprocess.check_output')
     def test_query_resolved(self, mock_busctl):
         mock_busctl.return_value = '''{"data":[{
@@ -144,6 +290,26 @@ class TestSystemState(unittest.TestCase):
         self.assertListEqual([s[1] for s in search],
                              ['search.domain', 'search.domain'])
 
+    @patch('netplan_cli.cli.state.if_nametoindex')
+    @patch('subprocess.check_output')
+    def test_query_resolved_links(self, mock_busctl, mock_ifindex):
+        mock_ifindex.side_effect = lambda name: {'eth0': 2, 'wlan0': 42}[name]
+        mock_busctl.side_effect = [
+            json.dumps({'data': [{'DNS': {'type': 'a(iay)', 'data': [[2, DNS_IP4]]},
+                                  'Domains': {'type': 'a(sb)', 'data': [['search.domain', False]]}}]}),
+            json.dumps({'data': [{'DNS': {'type': 'a(iay)', 'data': []},
+                                  'Domains': {'type': 'a(sb)', 'data': []}}]}),
+            ]
+        addresses, search = SystemConfigState.query_resolved(['eth0', 'wlan0', 'gone0'])
+        self.assertListEqual(addresses, [[2, 2, DNS_IP4]])
+        self.assertListEqual(search, [[2, 'search.domain', False]])
+        self.assertListEqual([c.args[0][5:] for c in mock_busctl.call_args_list], [
+            ['/org/freedesktop/resolve1/link/_32', 'org.freedesktop.DBus.Properties', 'GetAll', 's',
+             'org.freedesktop.resolve1.Link'],
+            ['/org/freedesktop/resolve1/link/_342', 'org.freedesktop.DBus.Properties', 'GetAll', 's',
+             'org.freedesktop.resolve1.Link'],
+            ])
+
     @patch('subprocess.check_output')
     def test_query_resolved_fail(self, mock_busctl):
         mock_busctl.return_value = '{"data":[{"DNS":{"type":"invalid","data":"garbage"}}]}'
@@ -153,6 +319,44 @@ class TestSystemState(unittest.TestCase):
             self.assertIsNone(search)
             self.assertIn('DEBUG:root:Cannot query resolved DNS data: DNS address type doesn\'t match', cm.output[0])
 
+    @patch('subprocess.check_output')
+    def test_query_resolved_timeout(self, mock_busctl):
+        mock_busctl.side_effect = subprocess.TimeoutExpired('busctl', QUERY_TIMEOUT)
+        with self.assertLogs(level='DEBUG') as cm:
+            addresses, search = SystemConfigState.query_resolved()
+            self.assertEqual(mock_busctl.call_args.kwargs['timeout'], QUERY_TIMEOUT)
+            self.assertIsNone(addresses)
+            self.assertIsNone(search)
+            self.assertIn('DEBUG:root:Cannot query resolved DNS data: Command \'busctl\' timed out', cm.output[0])
+
+    def test_collect(self):
+        # each query waits for all the others, which only works if they run concurrently
+        barrier = threading.Barrier(3, timeout=5)
+
+        def query(value):
+            barrier.wait()
+            return value
+
+        with self.assertLogs(level='DEBUG') as cm:
+            res = SystemConfigState.collect({
+                'first': lambda: query(1),
+                'second': lambda: query([2]),
+                'third': lambda: query(None),
+            })
+        self.assertDictEqual(res, {'first': 1, 'second': [2], 'third': None})
+        self.assertEqual(len(cm.output), 3)
+        for name in ['first', 'second', 'third']:
+            self.assertTrue(any(line.startswith(f'DEBUG:root:Queried {name} data in ') for line in cm.output))
+
+    def test_collect_fail(self):
+        def query():
+            raise RuntimeError('unexpected')
+
+        with self.assertLogs(level='DEBUG') as cm:
+            with self.assertRaises(RuntimeError):
+                SystemConfigState.collect({'broken': query, 'other': lambda: 42})
+        self.assertEqual(len(cm.output), 2)
+
     @patch('shutil.which')
     def test_query_resolved_fail_missing_busctl(self, mock):
         mock.return_value = None
@@ -217,7 +421,7 @@ search search.domain  another.one
         self.assertFalse(res)
 
     @patch('netplan_cli.cli.utils.systemctl')
-    @patch('netplan_cli.cli.state.SystemConfigState.query_members')
+    @patch('subprocess.check_output')
     @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
     @patch('netplan_cli.cli.state.SystemConfigState.query_networkd')
     @patch('netplan_cli.cli.state.SystemConfigState.query_nm')
@@ -227,10 +431,12 @@ search search.domain  another.one
     @patch('netplan_cli.cli.state.SystemConfigState.query_online_state')
     def test_system_state_config_data_interfaces(self, online_mock, resolvconf_mock, rd_mock,
                                                  routes_mock, nm_mock, networkd_mock, iproute2_mock,
-                                                 members_mock, systemctl_mock):
+                                                 subprocess_mock, systemctl_mock):
         systemctl_mock.return_value = None
-        members_mock.return_value = []
-        iproute2_mock.return_value = [FAKE_DEV, BRIDGE]
+        member = copy.deepcopy(FAKE_DEV)
+        member['ifname'] = 'fakedev1'
+        member['master'] = BRIDGE['ifname']  # wokeignore:rule=master
+        iproute2_mock.return_value = [FAKE_DEV, member, BRIDGE]
         nm_mock.return_value = []
         routes_mock.return_value = (None, None)
         rd_mock.return_value = (None, None)
@@ -239,33 +445,180 @@ search search.domain  another.one
         networkd_mock.return_value = SystemConfigState.process_networkd(NETWORKD)
         state = SystemConfigState()
         self.assertIn('fakedev0', [iface.name for iface in state.interface_list])
+        self.assertEqual(state.interface_list[1].bridge, BRIDGE['ifname'])
+        subprocess_mock.assert_not_called()  # no per-uplink queries
 
-    @patch('subprocess.check_output')
-    def test_query_members(self, mock):
-        mock.return_value = '[{"ifname":"eth0"}, {"ifname":"eth1"}]'
-        members = SystemConfigState.query_members('mybr0')
-        mock.assert_has_calls([
-            call(['ip', '-d', '-j', 'link', 'show', 'master', 'mybr0'], text=True),     # wokeignore:rule=master
-            ])
-        self.assertListEqual(members, ['eth0', 'eth1'])
+    @patch('netplan_cli.cli.utils.systemctl')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_networkd')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_nm')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_routes')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_resolved')
+    @patch('netplan_cli.cli.state.SystemConfigState.resolvconf_json')
+    def test_system_state_refresh(self, resolvconf_mock, rd_mock, routes_mock, nm_mock,
+                                  networkd_mock, iproute2_mock, systemctl_mock):
+        systemctl_mock.return_value = None
+        eth0 = {'ifindex': 2, 'ifname': 'eth0', 'flags': ['UP'], 'operstate': 'UP'}
+        eth1 = {'ifindex': 3, 'ifname': 'eth1', 'flags': ['UP'], 'operstate': 'UP'}
+        iproute2_mock.return_value = [eth0, eth1]
+        networkd_mock.return_value = [{'Index': 2, 'Name': 'eth0', 'Type': 'ether'},
+                                      {'Index': 3, 'Name': 'eth1', 'Type': 'ether'}]
+        nm_mock.return_value = None
+        route = {'dst': '10.0.0.0/8', 'gateway': '192.168.0.1', 'dev': 'eth1', 'protocol': 'static', 'family': 2}
+        routes_mock.return_value = ([route], None)
+        rd_mock.return_value = (None, None)
+        resolvconf_mock.return_value = {'addresses': [], 'search': [], 'mode': None}
+        state = SystemConfigState()
+        eth0_itf, eth1_itf = state.interface_list
 
-    @patch('subprocess.check_output')
-    def test_query_members_fail(self, mock):
-        mock.side_effect = subprocess.CalledProcessError(1, '', 'ERR')
-        with self.assertLogs(level='WARNING') as cm:
-            bridge = SystemConfigState.query_members('mybr0')
-            mock.assert_has_calls([
-                call(['ip', '-d', '-j', 'link', 'show', 'master', 'mybr0'], text=True),     # wokeignore:rule=master
-                ])
-            self.assertListEqual(bridge, [])
-            self.assertIn('WARNING:root:Cannot query bridge:', cm.output[0])
-
-    @patch('netplan_cli.cli.state.SystemConfigState.query_members')
-    def test_correlate_members_and_uplink_bridge(self, mock):
-        mock.side_effect = lambda _: ['eth0', 'eth1']
-        interface1 = Interface({'ifname': 'eth0'})
+        # nothing changed
+        self.assertEqual(state.refresh(['routes']), {})
+        self.assertIs(state.interface_list[0], eth0_itf)
+        self.assertIs(state.interface_list[1], eth1_itf)
+
+        # only eth0 got a new route, only this source is queried again
+        iproute2_mock.reset_mock()
+        routes_mock.return_value = ([route, dict(route, dev='eth0')], None)
+        changes = state.refresh(['routes'])
+        iproute2_mock.assert_not_called()
+        self.assertListEqual(list(changes), ['eth0'])
+        self.assertEqual(changes['eth0']['routes'], [{'to': '10.0.0.0/8', 'family': 2, 'via': '192.168.0.1',
+                                                      'protocol': 'static'}])
+        self.assertIsNot(state.interface_list[0], eth0_itf)
+        self.assertIs(state.interface_list[1], eth1_itf)
+
+        # eth1 is gone, a failing networkd query keeps the previous data
+        iproute2_mock.return_value = [eth0]
+        networkd_mock.return_value = None
+        changes = state.refresh(['iproute2', 'networkd', 'unknown'])
+        self.assertEqual(changes, {'eth1': None})
+        self.assertEqual(state.get_data()['eth0']['type'], 'ethernet')
+
+        # the NetworkManager connection data is queried again
+        state._nm_cache[('802-11-wireless.ssid', 'MYCON')] = 'MYCON'
+        self.assertEqual(state.refresh(['nm']), {})
+        self.assertEqual(state._nm_cache, {})
+
+    @patch('netplan_cli.cli.utils.systemctl')
+    @patch('netplan_cli.cli.state.if_nametoindex')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_networkd')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_nm')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_routes')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_resolved')
+    @patch('netplan_cli.cli.state.SystemConfigState.resolvconf_json')
+    def test_system_state_scoped(self, resolvconf_mock, rd_mock, routes_mock, nm_mock,
+                                 networkd_mock, iproute2_mock, ifindex_mock, systemctl_mock):
+        systemctl_mock.return_value = None
+        ifindex_mock.return_value = 2
+        eth0 = {'ifindex': 2, 'ifname': 'eth0', 'flags': ['UP'], 'operstate': 'UP'}
+        eth1 = {'ifindex': 3, 'ifname': 'eth1', 'flags': ['UP'], 'operstate': 'UP',
+                'addr_info': [{'local': '192.168.0.100', 'prefixlen': 24}]}
+        iproute2_mock.return_value = [eth0, eth1]
+        networkd_mock.return_value = [{'Index': 2, 'Name': 'eth0', 'Type': 'ether'}]
+        nm_mock.return_value = None
+        default = {'dst': 'default', 'gateway': '192.168.0.1', 'dev': 'eth1', 'protocol': 'dhcp', 'family': 2}
+        routes_mock.return_value = ([default], None)
+        rd_mock.return_value = ([[3, 2, DNS_IP4]], None)
+        resolvconf_mock.return_value = {'addresses': [], 'search': [], 'mode': None}
+        state = SystemConfigState('eth0')
+
+        # the routes are queried first, to find the interfaces with a default route
+        routes_mock.assert_called_once_with('eth0')
+        iproute2_mock.assert_called_once_with('eth0', ['eth1'])
+        networkd_mock.assert_called_once_with('eth0')
+        rd_mock.assert_called_once_with(['eth0', 'eth1'])
+        data = state.get_data()
+        self.assertListEqual(list(data), ['netplan-global-state', 'eth0'])
+        self.assertTrue(data['netplan-global-state']['online'])  # via eth1
+        self.assertEqual(state.number_of_interfaces, 1)
+
+        # the related interfaces are queried again, only if they changed
+        state.refresh(['routes'])
+        iproute2_mock.assert_called_once()
+        routes_mock.return_value = (None, None)
+        iproute2_mock.return_value = [eth0]
+        changes = state.refresh(['routes'])
+        iproute2_mock.assert_called_with('eth0', [])
+        rd_mock.assert_called_with(['eth0'])
+        self.assertFalse(changes['netplan-global-state']['online'])
+
+    @patch('netplan_cli.cli.utils.systemctl')
+    @patch('netplan_cli.cli.state.if_nametoindex')
+    def test_system_state_scoped_missing_interface(self, ifindex_mock, systemctl_mock):
+        systemctl_mock.return_value = None
+        ifindex_mock.side_effect = OSError(19, 'No such device')
+        with self.assertLogs() as cm, self.assertRaises(SystemExit):
+            SystemConfigState('notaninterface0')
+        self.assertIn('ERROR:root:Could not find interface notaninterface0', cm.output)
+
+    @patch('netplan_cli.cli.utils.systemctl')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_networkd')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_nm')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_routes')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_resolved')
+    @patch('netplan_cli.cli.state.SystemConfigState.resolvconf_json')
+    def test_system_state_config_data_scale(self, resolvconf_mock, rd_mock, routes_mock,
+                                            nm_mock, networkd_mock, iproute2_mock, systemctl_mock):
+        def collect(n_interfaces: int, n_routes: int) -> int:
+            links, nd, nm, dns, routes4, routes6 = [], [], [], [], [], []
+            for i in range(1, n_interfaces + 1):
+                name = f'eth{i}'
+                links.append({'ifindex': i, 'ifname': name, 'flags': ['UP'], 'operstate': 'UP',
+                              'addr_info': [{'local': f'10.{i >> 8}.{i & 0xff}.1', 'prefixlen': 24},
+                                            {'local': f'fd00:{i:x}::1', 'prefixlen': 64}]})
+                nd.append({'Index': i, 'Name': name, 'Type': 'ether'})
+                nm.append({'device': name, 'name': name, 'autoconnect': 'yes'})
+                dns.append((i, 2, DNS_IP4))
+                routes4.append({'dst': 'default', 'gateway': f'10.{i >> 8}.{i & 0xff}.254', 'dev': name,
+                                'prefsrc': f'10.{i >> 8}.{i & 0xff}.1', 'protocol': 'dhcp', 'family': 2})
+                for r in range(n_routes - 2):
+                    routes4.append({'dst': f'172.{r >> 8}.{r & 0xff}.0/24', 'dev': name,
+                                    'protocol': 'static', 'family': 2})
+                routes6.append({'dst': f'fd00:{i:x}::/64', 'dev': name, 'protocol': 'ra', 'family': 10})
+            iproute2_mock.return_value = links
+            networkd_mock.return_value = nd
+            nm_mock.return_value = nm
+            rd_mock.return_value = (dns, [(i, 'example.com', False) for i in range(1, n_interfaces + 1)])
+            routes_mock.return_value = (routes4, routes6)
+
+            # Count the routes handed to the Interface objects
+            handed = []
+            interface_init = Interface.__init__
+
+            def init(self, ip, nd_data=[], nm_data=[], resolved_data=(None, None), route_data=(None, None),
+                     nm_cache=None):
+                handed.extend(route for routes in route_data if routes for route in routes)
+                interface_init(self, ip, nd_data, nm_data, resolved_data, route_data, nm_cache)
+
+            with patch.object(Interface, '__init__', init):
+                state = SystemConfigState(all=True)
+
+            self.assertEqual(state.number_of_interfaces, n_interfaces)
+            data = state.get_data()
+            self.assertTrue(data['netplan-global-state']['online'])
+            last = data[f'eth{n_interfaces}']
+            self.assertEqual(len(last['routes']), n_routes)
+            self.assertEqual(last['dns_addresses'], ['192.168.178.1'])
+            self.assertEqual(last['dns_search'], ['example.com'])
+            self.assertIn('dhcp', last['addresses'][0][f'10.{n_interfaces >> 8}.{n_interfaces & 0xff}.1']['flags'])
+            self.assertIn('ra', last['addresses'][1][f'fd00:{n_interfaces:x}::1']['flags'])
+            self.assertEqual(len(set(map(id, handed))), len(handed))
+            return len(handed)
+
+        systemctl_mock.return_value = None
+        resolvconf_mock.return_value = {'addresses': [], 'search': [], 'mode': None}
+        with patch('netplan_cli.cli.state.Interface.query_networkctl', return_value=''):
+            # Collecting the state needs to scale linearly with the size of the input data:
+            # each interface is handed only its own routes, not the complete route list.
+            self.assertEqual(collect(100, 20), 100 * 20)
+            self.assertEqual(collect(500, 20), 500 * 20)
+
+    def test_correlate_members_and_uplink_bridge(self):
+        interface1 = Interface({'ifname': 'eth0', 'master': 'br0'})  # wokeignore:rule=master
         interface1.nd = {'Type': 'ether'}
-        interface2 = Interface({'ifname': 'eth1'})
+        interface2 = Interface({'ifname': 'eth1', 'master': 'br0'})  # wokeignore:rule=master
         interface2.nd = {'Type': 'ether'}
         interface3 = Interface({'ifname': 'br0'})
         interface3.nd = {'Type': 'bridge'}
@@ -274,12 +627,10 @@ search search.domain  another.one
         self.assertEqual(interface2.bridge, 'br0')
         self.assertListEqual(interface3.members, ['eth0', 'eth1'])
 
-    @patch('netplan_cli.cli.state.SystemConfigState.query_members')
-    def test_correlate_members_and_uplink_bond(self, mock):
-        mock.side_effect = lambda _: ['eth2', 'eth3']
-        interface1 = Interface({'ifname': 'eth2'})
+    def test_correlate_members_and_uplink_bond(self):
+        interface1 = Interface({'ifname': 'eth2', 'master': 'bond0'})  # wokeignore:rule=master
         interface1.nd = {'Type': 'ether'}
-        interface2 = Interface({'ifname': 'eth3'})
+        interface2 = Interface({'ifname': 'eth3', 'master': 'bond0'})  # wokeignore:rule=master
         interface2.nd = {'Type': 'ether'}
         interface3 = Interface({'ifname': 'bond0'})
         interface3.nd = {'Type': 'bond'}
@@ -288,12 +639,10 @@ search search.domain  another.one
         self.assertEqual(interface2.bond, 'bond0')
         self.assertListEqual(interface3.members, ['eth2', 'eth3'])
 
-    @patch('netplan_cli.cli.state.SystemConfigState.query_members')
-    def test_correlate_members_and_uplink_vrf(self, mock):
-        mock.side_effect = lambda _: ['eth2', 'eth3']
-        interface1 = Interface({'ifname': 'eth2'})
+    def test_correlate_members_and_uplink_vrf(self):
+        interface1 = Interface({'ifname': 'eth2', 'master': 'vrf0'})  # wokeignore:rule=master
         interface1.nd = {'Type': 'ether'}
-        interface2 = Interface({'ifname': 'eth3'})
+        interface2 = Interface({'ifname': 'eth3', 'master': 'vrf0'})  # wokeignore:rule=master
         interface2.nd = {'Type': 'ether'}
         interface3 = Interface({'ifname': 'vrf0'})
         interface3.nd = {'Type': 'ether', 'Kind': 'vrf'}
@@ -302,6 +651,69 @@ search search.domain  another.one
         self.assertEqual(interface2.vrf, 'vrf0')
         self.assertListEqual(interface3.members, ['eth2', 'eth3'])
 
+    def test_correlate_members_and_uplink_not_queried(self):
+        # only a single member of the bond was queried
+        interface = Interface({'ifname': 'eth2', 'master': 'bond0',  # wokeignore:rule=master
+                               'linkinfo': {'info_slave_kind': 'bond'}})
+        interface.nd = {'Type': 'ether'}
+        SystemConfigState.correlate_members_and_uplink([interface])
+        self.assertEqual(interface.bond, 'bond0')
+        self.assertIsNone(interface.bridge)
+
+    def test_correlate_members_and_uplink_other(self):
+        # links enslaved to something else than a bond/bridge/vrf are ignored
+        interface1 = Interface({'ifname': 'eth0', 'master': 'ovs-system'})  # wokeignore:rule=master
+        interface1.nd = {'Type': 'ether'}
+        interface2 = Interface({'ifname': 'ovs-system'})
+        interface2.nd = {'Type': 'ether'}
+        interface3 = Interface({'ifname': 'eth1', 'master': 'missing0'})  # wokeignore:rule=master
+        interface3.nd = {'Type': 'ether'}
+        SystemConfigState.correlate_members_and_uplink([interface1, interface2, interface3])
+        for itf in [interface1, interface2, interface3]:
+            self.assertIsNone(itf.bridge)
+            self.assertIsNone(itf.bond)
+            self.assertIsNone(itf.vrf)
+            self.assertListEqual(itf.members, [])
+
+    def test_correlate_members_and_uplink_fabric(self):
+        # Synthetic 'ip -d -j addr' dump of a large fabric: 8 VRFs, each containing
+        # 32 bridges, each bridging 4 bonds of 2 ports each (3336 links in total).
+        dump = []
+        for v in range(8):
+            dump.append({'ifname': f'vrf{v}', 'linkinfo': {'info_kind': 'vrf'}})
+            for b in range(32):
+                br = f'br{v}-{b}'
+                dump.append({'ifname': br, 'master': f'vrf{v}',  # wokeignore:rule=master
+                             'linkinfo': {'info_kind': 'bridge', 'info_slave_kind': 'vrf'}})
+                for o in range(4):
+                    bond = f'bond{v}-{b}-{o}'
+                    dump.append({'ifname': bond, 'master': br,  # wokeignore:rule=master
+                                 'linkinfo': {'info_kind': 'bond', 'info_slave_kind': 'bridge'}})
+                    for p in range(2):
+                        dump.append({'ifname': f'eth{v}-{b}-{o}-{p}', 'master': bond,  # wokeignore:rule=master
+                                     'linkinfo': {'info_slave_kind': 'bond'}})
+        nd = {'bridge': {'Type': 'bridge'}, 'bond': {'Type': 'bond'}, 'vrf': {'Type': 'ether', 'Kind': 'vrf'}}
+        interfaces = []
+        for link in dump:
+            itf = Interface(link)
+            itf.nd = nd.get(link['linkinfo'].get('info_kind'), {'Type': 'ether'})
+            interfaces.append(itf)
+        self.assertEqual(len(interfaces), 3336)
+        by_name = {itf.name: itf for itf in interfaces}
+
+        with patch('subprocess.check_output') as mock:
+            SystemConfigState.correlate_members_and_uplink(interfaces)
+            mock.assert_not_called()
+
+        self.assertListEqual(by_name['vrf3'].members, [f'br3-{b}' for b in range(32)])
+        self.assertEqual(by_name['br3-7'].vrf, 'vrf3')
+        self.assertListEqual(by_name['br3-7'].members, [f'bond3-7-{o}' for o in range(4)])
+        self.assertEqual(by_name['bond3-7-2'].bridge, 'br3-7')
+        self.assertListEqual(by_name['bond3-7-2'].members, ['eth3-7-2-0', 'eth3-7-2-1'])
+        self.assertEqual(by_name['eth3-7-2-1'].bond, 'bond3-7-2')
+        self.assertIsNone(by_name['eth3-7-2-1'].bridge)
+        self.assertEqual(sum(len(itf.members) for itf in interfaces), len(interfaces) - 8)
+
 
 class TestNetplanState(unittest.TestCase):
     '''Test netplan state NetplanConfigState class'''
@@ -347,7 +759,7 @@ class TestInterface(unittest.TestCase):
         res = itf.query_nm_ssid(con)
         mock.assert_called_with(['nmcli', '--get-values', '802-11-wireless.ssid',
                                  'con', 'show', 'id', con],
-                                text=True)
+                                text=True, timeout=None)
         self.assertEqual(res, 'MYSSID')
 
     @patch('subprocess.check_output')
@@ -359,10 +771,30 @@ class TestInterface(unittest.TestCase):
             res = itf.query_nm_ssid(con)
             mock.assert_called_with(['nmcli', '--get-values', '802-11-wireless.ssid',
                                      'con', 'show', 'id', con],
-                                    text=True)
+                                    text=True, timeout=None)
             self.assertIsNone(res)
             self.assertIn('WARNING:root:Cannot query NetworkManager SSID for {}:'.format(con), cm.output[0])
 
+    @patch('subprocess.check_output')
+    def test_json_nm_wlan0_cached(self, mock):
+        mock.return_value = 'MYCON\n'
+        data = next((itf for itf in yaml.safe_load(IPROUTE2) if itf['ifindex'] == 5), {})
+        nd = SystemConfigState.process_networkd(NETWORKD)
+        nm = SystemConfigState.process_nm(NMCLI)
+        nm_cache = {}
+        itf = Interface(data, nd, nm, nm_cache=nm_cache)
+        _, json = itf.json()
+        self.assertEqual(json.get('ssid'), 'MYCON')
+        self.assertEqual(json.get('id'), 'NM-b6b7a21d-186e-45e1-b3a6-636da1735563')
+        itf.json()
+        # the SSID is queried once, for the 'ssid' and 'id' fields
+        mock.assert_called_once_with(['nmcli', '--get-values', '802-11-wireless.ssid',
+                                      'con', 'show', 'id', 'MYCON'], text=True, timeout=None)
+        # and shared with the other interfaces of the same run
+        itf = Interface(data, nd, nm, nm_cache=nm_cache)
+        self.assertEqual(itf.ssid, 'MYCON')
+        self.assertEqual(mock.call_count, 1)
+
     @patch('subprocess.check_output')
     def test_query_networkctl(self, mock):
         mock.return_value = 'DOES NOT MATTER'
@@ -504,6 +936,63 @@ class TestInterface(unittest.TestCase):
         self.assertEqual(len(json.get('dns_search')), 1)
         self.assertEqual(len(json.get('routes')), 8)
 
+    @patch('netplan_cli.cli.state.Interface.query_networkctl')
+    def test_json_nd_activation_policy_from_json(self, networkctl_mock):
+        data = {'ifname': 'eth0', 'ifindex': 123}
+        nd = [{'Index': 123, 'Type': 'ether', 'Name': 'eth0', 'SetupState': 'configured',
+               'NetworkFile': '/run/systemd/network/10-netplan-eth0.network', 'ActivationPolicy': 'manual'}]
+        itf = Interface(data, nd, [], (None, None), (None, None))
+        self.assertEqual(itf.activation_mode, 'manual')
+        nd[0]['ActivationPolicy'] = 'up'
+        self.assertEqual(itf.activation_mode, 'manual')  # cached
+        itf = Interface(data, nd, [], (None, None), (None, None))
+        self.assertIsNone(itf.activation_mode)
+        networkctl_mock.assert_not_called()
+
+    @patch('netplan_cli.cli.state.Interface.query_networkctl')
+    def test_json_nd_activation_policy_from_network_file(self, networkctl_mock):
+        networkctl_mock.return_value = 'Activation Policy: always-down'
+        tmp = tempfile.TemporaryDirectory()
+        network_dir = os.path.join(tmp.name, 'run', 'systemd', 'network')
+        os.makedirs(network_dir)
+        network_file = os.path.join(network_dir, '10-netplan-eth0.network')
+        dropin = os.path.join(network_dir, '10-netplan-eth0.network.d', 'override.conf')
+        with open(network_file, 'w') as f:
+            f.write('[Match]\nName=eth0\n\n[Network]\nLinkLocalAddressing=ipv6\n')
+        data = {'ifname': 'eth0', 'ifindex': 123}
+        nd = [{'Index': 123, 'Type': 'ether', 'Name': 'eth0', 'SetupState': 'configured',
+               'NetworkFile': network_file, 'NetworkFileDropins': [dropin]}]
+
+        # unreadable drop-in
+        itf = Interface(data, nd, [], (None, None), (None, None))
+        self.assertEqual(itf.activation_mode, 'always-down')
+        # default policy, networkctl is not queried
+        os.makedirs(os.path.dirname(dropin))
+        with open(dropin, 'w') as f:
+            f.write('[Link]\nRequiredForOnline=no\n')
+        networkctl_mock.reset_mock()
+        itf = Interface(data, nd, [], (None, None), (None, None))
+        self.assertIsNone(itf.activation_mode)
+        networkctl_mock.assert_not_called()
+        # custom policy, networkctl is queried once
+        with open(dropin, 'a') as f:
+            f.write('ActivationPolicy=always-down\n')
+        itf = Interface(data, nd, [], (None, None), (None, None))
+        self.assertEqual(itf.activation_mode, 'always-down')
+        self.assertEqual(itf.json()[1].get('activation_mode'), 'always-down')
+        networkctl_mock.assert_called_once_with('eth0')
+
+    @patch('netplan_cli.cli.state.Interface.query_networkctl')
+    def test_json_nd_wlan_ssid_from_json(self, networkctl_mock):
+        data = {'ifname': 'wlan1', 'ifindex': 123}
+        nd = [{'Index': 123, 'Type': 'wlan', 'Name': 'wlan1', 'SetupState': 'configured', 'SSID': 'áéíóú',
+               'NetworkFile': '/run/systemd/network/10-netplan-wlan1.network', 'ActivationPolicy': 'up'}]
+        itf = Interface(data, nd, [], (None, None), (None, None))
+        _, json = itf.json()
+        self.assertEqual(json.get('ssid'), 'áéíóú')
+        self.assertNotIn('activation_mode', json)
+        networkctl_mock.assert_not_called()
+
     def test_json_nd_tunnel(self):
         data = next((itf for itf in yaml.safe_load(IPROUTE2) if itf['ifindex'] == 41), {})
         nd = SystemConfigState.process_networkd(NETWORKD)
@@ -22,7 +22,8 @@ import os
 import tempfile
 import unittest
 
-from unittest.mock import Mock
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
 from netplan.netdef import NetplanRoute
 from netplan_cli.cli.state import Interface, NetplanConfigState, SystemConfigState
 from netplan_cli.cli.state_diff import DiffJSONEncoder, NetplanDiffState
@@ -2071,6 +2072,46 @@ class TestNetplanDiff(unittest.TestCase):
         self.assertListEqual([], missing_system)
         self.assertListEqual([], missing_netplan)
 
+    def test_diff_slash_32_routes_with_match(self):
+        ''' The routes of a netdef matching multiple interfaces are normalized once per interface '''
+        with open(self.path, "w") as f:
+            f.write('''network:
+  ethernets:
+    mynic:
+      match:
+        name: eth*
+      routes:
+        - to: 1.2.3.4/32
+          via: 192.168.0.1''')
+
+        netplan_state = NetplanConfigState(rootdir=self.workdir.name)
+        system_state = Mock(spec=SystemConfigState)
+        route = {
+            'to': '1.2.3.4',
+            'via': '192.168.0.1',
+            'type': 'unicast',
+            'scope': 'global',
+            'protocol': 'static',
+            'family': 2,
+            'table': 'main'
+        }
+        system_state.get_data.return_value = {
+            'netplan-global-state': {},
+            'eth0': {'name': 'eth0', 'id': 'mynic', 'index': 2, 'routes': [route]},
+            'eth1': {'name': 'eth1', 'id': 'mynic', 'index': 3, 'routes': [route]},
+        }
+        system_state.interface_list = []
+
+        diff = NetplanDiffState(system_state, netplan_state)
+        diff.route_lookup_table_names = {
+            0: 'unspec', 253: 'default', 254: 'main', 255: 'local',
+            'unspec': 0, 'default': 253, 'main': 254, 'local': 255}
+        diff_data = diff.get_diff()
+
+        for iface in ['eth0', 'eth1']:
+            self.assertEqual(diff_data['interfaces'][iface]['system_state'], {})
+            self.assertEqual(diff_data['interfaces'][iface]['netplan_state'], {})
+
     def test_diff_compressed_ipv6_routes(self):
         with open(self.path, "w") as f:
             f.write('''network:
@@ -2740,3 +2781,163 @@ class TestNetplanDiff(unittest.TestCase):
 
         missing = diff_data.get('interfaces', {}).get('vrf0', {}).get('netplan_state', {}).get('missing_interfaces', [])
         self.assertListEqual(missing, ['eth0'])
+
+    def test_diff_scale(self):
+        scanned = []
+
+        class ScannedDict(dict):
+            '''Count the entries visited by full scans of the system data'''
+            def __iter__(self):
+                scanned.append(len(self))
+                return super().__iter__()
+
+            def items(self):
+                scanned.append(len(self))
+                return super().items()
+
+            def values(self):
+                scanned.append(len(self))
+                return super().values()
+
+        class ScannedList(list):
+            '''Count the entries visited by full scans of the system interfaces'''
+            def __iter__(self):
+                scanned.append(len(self))
+                return super().__iter__()
+
+        def get_diff(size: int) -> (dict, int):
+            # Each interface has 40 routes, one of which is missing in its netdef.
+            # Every other netdef is not named after its interface (as if using 'match').
+            system_data = ScannedDict({'netplan-global-state': {}})
+            netdefs = {}
+            interface_list = ScannedList()
+            for i in range(size):
+                name = f'eth{i}'
+                netdef_id = f'nic{i}' if i % 2 else name
+                prefix = f'10.{i // 250}.{i % 250}'
+                routes = [{'to': f'172.16.{r}.0/24', 'via': f'{prefix}.254', 'family': 2, 'protocol': 'static',
+                           'table': 'main'} for r in range(38)]
+                system_data[name] = {
+                    'index': i + 2,
+                    'id': netdef_id,
+                    'type': 'ethernet',
+                    'addresses': [{f'{prefix}.1': {'prefix': 24}},
+                                  {f'fe80::{i:x}:1': {'prefix': 64, 'flags': ['link']}}],
+                    'routes': [{'to': 'default', 'via': f'{prefix}.254', 'family': 2, 'protocol': 'static',
+                                'metric': 100, 'table': 'main'},
+                               {'to': f'{prefix}.0/24', 'family': 2, 'scope': 'link', 'protocol': 'kernel',
+                                'table': 'main'}] + routes,
+                    }
+                netdefs[netdef_id] = SimpleNamespace(
+                    type='ethernets', dhcp4=False, dhcp6=False, link_local=['ipv6'], accept_ra=None,
+                    addresses=[], nameserver_addresses=[], nameserver_search=[], _gateway4=f'{prefix}.254',
+                    _gateway6=None, macaddress=None, links={},
+                    routes=[NetplanRoute(to=route['to'], via=route['via'], family=2) for route in routes[:-1]])
+                interface = Mock(spec=Interface)
+                interface.name = name
+                interface.netdef_id = netdef_id
+                interface.data_sources = {}
+                interface_list.append(interface)
+
+            system_state = Mock(spec=SystemConfigState)
+            system_state.get_data.return_value = system_data
+            system_state.interface_list = interface_list
+            netplan_state = Mock(spec=NetplanConfigState)
+            netplan_state.netdefs = netdefs
+            diff = NetplanDiffState(system_state, netplan_state)
+            diff.route_lookup_table_names = {'main': 254}
+            scanned.clear()
+            diff_data = diff.get_diff()
+            return diff_data, len(scanned)
+
+        small_diff, small = get_diff(100)
+        large_diff, large = get_diff(500)  # 20k routes
+
+        for diff_data, size in [(small_diff, 100), (large_diff, 500)]:
+            self.assertEqual(diff_data['missing_interfaces_system'], {})
+            self.assertEqual(diff_data['missing_interfaces_netplan'], {})
+            self.assertEqual(list(diff_data['interfaces']), [f'eth{i}' for i in range(size)])
+            for i in [0, 1, size - 1]:
+                prefix = f'10.{i // 250}.{i % 250}'
+                self.assertEqual(diff_data['interfaces'][f'eth{i}'], {
+                    'index': i + 2,
+                    'name': f'eth{i}',
+                    'id': f'nic{i}' if i % 2 else f'eth{i}',
+                    'system_state': {},
+                    'netplan_state': {
+                        'missing_addresses': [f'{prefix}.1/24'],
+                        'missing_routes': [NetplanRoute(to='172.16.37.0/24', via=f'{prefix}.254', family=2, table=254)],
+                    },
+                })
+        # Diffing needs to scale linearly with the number of interfaces and routes.
+        # Looking up the system interfaces of each netdef by scanning all of them is quadratic.
+        self.assertEqual(large, small)
+
+    def test_diff_for(self):
+        system_data = {'netplan-global-state': {}}
+        netdefs = {}
+        interface_list = []
+        for i in range(3):
+            name = f'eth{i}'
+            route = {'to': f'172.16.{i}.0/24', 'via': f'10.0.{i}.254', 'family': 2, 'protocol': 'static', 'table': 'main'}
+            system_data[name] = {'index': i + 2, 'id': name, 'type': 'ethernet', 'routes': [route]}
+            netdefs[name] = SimpleNamespace(
+                type='ethernets', dhcp4=False, dhcp6=False, link_local=[], accept_ra=None,
+                addresses=[], nameserver_addresses=[], nameserver_search=[], _gateway4=None,
+                _gateway6=None, macaddress=None, links={},
+                # eth1's route is missing in Netplan
+                routes=[] if i == 1 else [NetplanRoute(to=route['to'], via=route['via'], family=2)])
+            interface = Mock(spec=Interface)
+            interface.name = name
+            interface.netdef_id = name
+            interface.data_sources = {}
+            interface_list.append(interface)
+
+        system_state = Mock(spec=SystemConfigState)
+        system_state.get_data.return_value = system_data
+        system_state.interface_list = interface_list
+        netplan_state = Mock(spec=NetplanConfigState)
+        netplan_state.netdefs = netdefs
+        diff = NetplanDiffState(system_state, netplan_state)
+        diff.route_lookup_table_names = {'main': 254}
+
+        expected = {
+            'index': 3,
+            'name': 'eth1',
+            'id': 'eth1',
+            'system_state': {},
+            'netplan_state': {
+                'missing_routes': [NetplanRoute(to='172.16.1.0/24', via='10.0.1.254', family=2,
+                                                protocol='static', table=254)],
+            },
+        }
+        with patch.object(diff, '_system_route_to_netplan', wraps=diff._system_route_to_netplan) as convert:
+            self.assertEqual(diff.diff_for('eth1'), expected)
+            # only the routes of eth1 are looked at
+            self.assertEqual(convert.call_count, 1)
+            self.assertEqual(diff.diff_for('eth1'), expected)
+            self.assertEqual(convert.call_count, 1)
+            self.assertIsNone(diff.diff_for('eth9'))
+
+        with patch.object(diff, '_analyze_routes', wraps=diff._analyze_routes) as analyze:
+            self.assertTrue(diff.has_any_diff())
+            # stops at the first difference, eth1 was compared already
+            self.assertEqual(analyze.call_count, 1)
+            self.assertEqual(diff.get_diff()['interfaces']['eth1'], expected)
+            self.assertEqual(diff.get_diff('eth0')['interfaces']['eth0']['netplan_state'], {})
+
+        # The results are dropped if the system state changes
+        system_data = dict(system_data)
+        system_data['eth1'] = dict(system_data['eth1'], routes=[])
+        system_state.get_data.return_value = system_data
+        self.assertEqual(diff.diff_for('eth1')['netplan_state'], {})
+        self.assertFalse(diff.has_any_diff())
+
+        # Interfaces missing in the system or in Netplan are differences, too
+        system_state.get_data.return_value = {key: value for key, value in system_data.items() if key != 'eth2'}
+        system_state.interface_list = interface_list[:2]
+        self.assertEqual(diff.get_missing_interfaces(), {
+            'missing_interfaces_system': {'eth2': {'type': 'ethernet'}},
+            'missing_interfaces_netplan': {},
+        })
+        self.assertTrue(diff.has_any_diff())
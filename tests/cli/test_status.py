@@ -18,6 +18,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import io
+import json
+import os
+import threading
 import unittest
 import yaml
 
@@ -117,6 +120,34 @@ STATUS_OUTPUT = '''\
 '''
 
 
+class FakeMonitor():
+    '''Emits the data sources written to it, like the monitors of netplan_cli.cli.monitor'''
+
+    def __init__(self):
+        self.rfd, self.wfd = os.pipe()
+        self.closed = False
+
+    def emit(self, *sources):
+        os.write(self.wfd, ' '.join(sources).encode() + b'\n')
+
+    def exit(self):
+        os.close(self.wfd)
+        self.wfd = None
+
+    def fileno(self):
+        return self.rfd
+
+    def read(self):
+        data = os.read(self.rfd, 4096)
+        return set(data.decode().split()) if data else None
+
+    def close(self):
+        os.close(self.rfd)
+        if self.wfd is not None:
+            os.close(self.wfd)
+        self.closed = True
+
+
 class TestStatus(unittest.TestCase):
     '''Test netplan status'''
 
@@ -396,9 +427,11 @@ Online state: offline
     @patch('netplan_cli.cli.state.SystemConfigState.query_resolved')
     @patch('netplan_cli.cli.state.SystemConfigState.resolvconf_json')
     @patch('netplan_cli.cli.state.SystemConfigState.query_online_state')
-    def test_call_cli_ifname(self, online_mock, resolvconf_mock, rd_mock, routes_mock, nm_mock, networkd_mock, iproute2_mock,
-                             systemctl_mock):
+    @patch('netplan_cli.cli.state.if_nametoindex')
+    def test_call_cli_ifname(self, ifindex_mock, online_mock, resolvconf_mock, rd_mock, routes_mock, nm_mock, networkd_mock,
+                             iproute2_mock, systemctl_mock):
         systemctl_mock.return_value = None
+        ifindex_mock.return_value = 42
         iproute2_mock.return_value = [FAKE_DEV, self._get_itf('wlan0')]
         nm_mock.return_value = []
         routes_mock.return_value = (None, None)
@@ -411,9 +444,12 @@ Online state: offline
         self.assertEqual(out.strip(), '''\
 Online state: offline
 
-● 42: fakedev0 other DOWN (unmanaged)
-
-1 inactive interfaces hidden. Use "--all" to show all.''')
+● 42: fakedev0 other DOWN (unmanaged)''')
+        # only the data of the selected interface is queried
+        iproute2_mock.assert_called_with('fakedev0', [])
+        networkd_mock.assert_called_with('fakedev0')
+        routes_mock.assert_called_with('fakedev0')
+        rd_mock.assert_called_with(['fakedev0'])
 
     @patch('netplan_cli.cli.utils.systemctl')
     @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
@@ -545,7 +581,9 @@ netplan-global-state:
 
     @patch('netplan_cli.cli.state.NetplanConfigState.__init__')
     @patch('netplan_cli.cli.state_diff.NetplanDiffState.__init__')
-    @patch('netplan_cli.cli.state_diff.NetplanDiffState.get_diff')
+    @patch('netplan_cli.cli.state_diff.NetplanDiffState.has_any_diff')
+    @patch('netplan_cli.cli.state_diff.NetplanDiffState.get_missing_interfaces')
+    @patch('netplan_cli.cli.state_diff.NetplanDiffState.diff_for')
     @patch('netplan_cli.cli.utils.systemctl')
     @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
     @patch('netplan_cli.cli.state.SystemConfigState.query_networkd')
@@ -556,7 +594,8 @@ netplan-global-state:
     @patch('netplan_cli.cli.state.SystemConfigState.query_online_state')
     def test_call_cli_diff_shallow(self, online_mock, resolvconf_mock, rd_mock, routes_mock,
                                    nm_mock, networkd_mock, iproute2_mock, systemctl_mock,
-                                   diff_state_get_diff_mock, diff_state_init_mock, state_init_mock):
+                                   diff_for_mock, missing_mock, has_any_diff_mock,
+                                   diff_state_init_mock, state_init_mock):
         systemctl_mock.return_value = None
         iproute2_mock.return_value = [FAKE_DEV]
         nm_mock.return_value = []
@@ -566,15 +605,21 @@ netplan-global-state:
         online_mock.return_value = False
         state_init_mock.return_value = None
         diff_state_init_mock.return_value = None
-        diff_state_get_diff_mock.return_value = {}
+        diff_for_mock.return_value = None
+        missing_mock.return_value = {'missing_interfaces_system': {}, 'missing_interfaces_netplan': {}}
+        has_any_diff_mock.return_value = False
         state = SystemConfigState()
         networkd_mock.return_value = state.process_networkd(NETWORKD)
         out = self._call(['--diff'])
         self.assertIn('Use "--diff-only" to omit the information that is consistent', out)
+        diff_for_mock.assert_called_with(FAKE_DEV['ifname'])
+        has_any_diff_mock.assert_not_called()
 
     @patch('netplan_cli.cli.state.NetplanConfigState.__init__')
     @patch('netplan_cli.cli.state_diff.NetplanDiffState.__init__')
-    @patch('netplan_cli.cli.state_diff.NetplanDiffState.get_diff')
+    @patch('netplan_cli.cli.state_diff.NetplanDiffState.has_any_diff')
+    @patch('netplan_cli.cli.state_diff.NetplanDiffState.get_missing_interfaces')
+    @patch('netplan_cli.cli.state_diff.NetplanDiffState.diff_for')
     @patch('netplan_cli.cli.utils.systemctl')
     @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
     @patch('netplan_cli.cli.state.SystemConfigState.query_networkd')
@@ -585,7 +630,8 @@ netplan-global-state:
     @patch('netplan_cli.cli.state.SystemConfigState.query_online_state')
     def test_call_cli_diff_only_shallow(self, online_mock, resolvconf_mock, rd_mock, routes_mock,
                                         nm_mock, networkd_mock, iproute2_mock, systemctl_mock,
-                                        diff_state_get_diff_mock, diff_state_init_mock, state_init_mock):
+                                        diff_for_mock, missing_mock, has_any_diff_mock,
+                                        diff_state_init_mock, state_init_mock):
         systemctl_mock.return_value = None
         iproute2_mock.return_value = [FAKE_DEV]
         nm_mock.return_value = []
@@ -595,11 +641,15 @@ netplan-global-state:
         online_mock.return_value = False
         state_init_mock.return_value = None
         diff_state_init_mock.return_value = None
-        diff_state_get_diff_mock.return_value = {}
+        diff_for_mock.return_value = None
+        missing_mock.return_value = {'missing_interfaces_system': {}, 'missing_interfaces_netplan': {}}
+        has_any_diff_mock.return_value = False
         state = SystemConfigState()
         networkd_mock.return_value = state.process_networkd(NETWORKD)
         out = self._call(['--diff-only'])
         self.assertEqual('', out)
+        has_any_diff_mock.assert_called_once()
+        diff_for_mock.assert_not_called()
 
     @patch('netplan_cli.cli.state.NetplanConfigState.__init__')
     @patch('netplan_cli.cli.state_diff.NetplanDiffState.__init__')
@@ -658,3 +708,162 @@ netplan-global-state:
         networkd_mock.return_value = state.process_networkd(NETWORKD)
         out = self._call(['--diff', '--format=yaml'])
         self.assertIn('{}', out)
+
+    @patch('netplan_cli.cli.commands.status.DBusMonitor')
+    @patch('netplan_cli.cli.commands.status.RtnlMonitor')
+    @patch('netplan_cli.cli.state.SystemConfigState.refresh')
+    @patch('netplan_cli.cli.utils.systemctl')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_networkd')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_nm')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_routes')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_resolved')
+    @patch('netplan_cli.cli.state.SystemConfigState.resolvconf_json')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_online_state')
+    def test_call_cli_watch_json(self, online_mock, resolvconf_mock, rd_mock, routes_mock, nm_mock, networkd_mock,
+                                 iproute2_mock, systemctl_mock, refresh_mock, rtnl_mock, dbus_mock):
+        systemctl_mock.return_value = None
+        iproute2_mock.return_value = [FAKE_DEV]
+        networkd_mock.return_value = SystemConfigState.process_networkd(NETWORKD)
+        nm_mock.return_value = []
+        routes_mock.return_value = (None, None)
+        rd_mock.return_value = (None, None)
+        resolvconf_mock.return_value = {'addresses': [], 'search': [], 'mode': None}
+        online_mock.return_value = False
+        rtnl = FakeMonitor()
+        dbus = FakeMonitor()
+        rtnl_mock.return_value = rtnl
+        dbus_mock.return_value = dbus
+        rtnl.emit('iproute2')
+        dbus.emit('resolved')
+        dbus.exit()  # 'busctl monitor' not permitted
+
+        refreshed = []
+
+        def refresh(sources):
+            refreshed.append(set(sources))
+            if len(refreshed) == 1:
+                rtnl.emit('routes')
+                return {'fakedev0': None}
+            raise KeyboardInterrupt()
+        refresh_mock.side_effect = refresh
+
+        with self.assertLogs(level='DEBUG') as cm:
+            out = self._call(['-a', '--watch', '--format=json'])
+            self.assertIn('DEBUG:root:Updating the state of: iproute2, resolved', cm.output)
+        self.assertListEqual(refreshed, [{'iproute2', 'resolved'}, {'routes'}])
+        lines = out.splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['fakedev0'], {'index': 42, 'adminstate': 'DOWN', 'operstate': 'DOWN'})
+        self.assertEqual(json.loads(lines[1]), {'fakedev0': None})
+        self.assertTrue(rtnl.closed)
+        self.assertTrue(dbus.closed)
+
+    @patch('netplan_cli.cli.commands.status.RICH_OUTPUT', False)
+    @patch('netplan_cli.cli.commands.status.DBusMonitor')
+    @patch('netplan_cli.cli.commands.status.RtnlMonitor')
+    @patch('netplan_cli.cli.state.SystemConfigState.refresh')
+    @patch('netplan_cli.cli.utils.systemctl')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_networkd')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_nm')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_routes')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_resolved')
+    @patch('netplan_cli.cli.state.SystemConfigState.resolvconf_json')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_online_state')
+    def test_call_cli_watch_tabular(self, online_mock, resolvconf_mock, rd_mock, routes_mock, nm_mock, networkd_mock,
+                                    iproute2_mock, systemctl_mock, refresh_mock, rtnl_mock, dbus_mock):
+        systemctl_mock.return_value = None
+        iproute2_mock.return_value = [FAKE_DEV]
+        networkd_mock.return_value = SystemConfigState.process_networkd(NETWORKD)
+        nm_mock.return_value = []
+        routes_mock.return_value = (None, None)
+        rd_mock.return_value = (None, None)
+        resolvconf_mock.return_value = {'addresses': [], 'search': [], 'mode': None}
+        online_mock.return_value = False
+        rtnl = FakeMonitor()
+        rtnl_mock.return_value = rtnl
+        dbus_mock.side_effect = RuntimeError('missing busctl utility')
+        rtnl.emit()  # no relevant changes
+        # settle first, then report more events
+        threading.Timer(0.5, rtnl.emit, ['routes']).start()
+
+        def refresh(sources):
+            if refresh_mock.call_count == 1:
+                rtnl.emit('iproute2')
+                return {}  # nothing changed
+            if refresh_mock.call_count == 2:
+                rtnl.emit('iproute2')
+                return {'fakedev0': {}}
+            raise KeyboardInterrupt()
+        refresh_mock.side_effect = refresh
+
+        with patch('netplan_cli.cli.commands.status.NetplanStatus.pretty_print') as pprint:
+            with self.assertLogs(level='DEBUG') as cm:
+                self._call(['-a', '--watch'])
+                self.assertIn('DEBUG:root:Cannot monitor D-Bus property changes: missing busctl utility', cm.output)
+        # initial state, then only once the state actually changed
+        self.assertEqual(pprint.call_count, 2)
+        self.assertEqual(refresh_mock.call_count, 3)
+        self.assertTrue(rtnl.closed)
+
+    @patch('netplan_cli.cli.commands.status.RICH_OUTPUT', False)
+    @patch('netplan_cli.cli.commands.status.DBusMonitor')
+    @patch('netplan_cli.cli.commands.status.RtnlMonitor')
+    @patch('netplan_cli.cli.state.SystemConfigState.refresh')
+    @patch('netplan_cli.cli.utils.systemctl')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_iproute2')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_networkd')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_nm')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_routes')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_resolved')
+    @patch('netplan_cli.cli.state.SystemConfigState.resolvconf_json')
+    @patch('netplan_cli.cli.state.SystemConfigState.query_online_state')
+    def test_call_cli_watch_steady_traffic(self, online_mock, resolvconf_mock, rd_mock, routes_mock, nm_mock, networkd_mock,
+                                           iproute2_mock, systemctl_mock, refresh_mock, rtnl_mock, dbus_mock):
+        systemctl_mock.return_value = None
+        iproute2_mock.return_value = [FAKE_DEV]
+        networkd_mock.return_value = SystemConfigState.process_networkd(NETWORKD)
+        nm_mock.return_value = []
+        routes_mock.return_value = (None, None)
+        rd_mock.return_value = (None, None)
+        resolvconf_mock.return_value = {'addresses': [], 'search': [], 'mode': None}
+        online_mock.return_value = False
+        dbus_mock.side_effect = RuntimeError('missing busctl utility')
+        stop = threading.Event()
+        # filtered (foreign) events only, then relevant ones
+        busy = iter([()] * 50 + [('routes',)] * 1000000)
+
+        class BusyMonitor(FakeMonitor):
+            # readable all the time, like a host with a lot of routing churn
+            def read(self):
+                affected = super().read()
+                if not stop.is_set():
+                    self.emit(*next(busy))
+                return affected
+
+        rtnl = BusyMonitor()
+        rtnl_mock.return_value = rtnl
+        rtnl.emit()
+        timer = threading.Timer(5, stop.set)  # don't hang if the update never happens
+        timer.start()
+
+        refreshed = []
+
+        def refresh(sources):
+            refreshed.append((set(sources), stop.is_set()))
+            raise KeyboardInterrupt()
+        refresh_mock.side_effect = refresh
+
+        with patch('netplan_cli.cli.commands.status.NetplanStatus.pretty_print'):
+            self._call(['-a', '--watch'])
+        timer.cancel()
+        # updated within the settle time, while the events were still coming in
+        self.assertListEqual(refreshed, [({'routes'}, False)])
+        self.assertTrue(rtnl.closed)
+
+    def test_call_cli_watch_diff(self):
+        with self.assertLogs() as cm:
+            with self.assertRaises(SystemExit):
+                self._call(['--watch', '--diff-only'])
+            self.assertIn('ERROR:root:--watch cannot be combined with --diff or --diff-only', cm.output)
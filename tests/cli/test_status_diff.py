@@ -21,8 +21,9 @@ import io
 import unittest
 
 from contextlib import redirect_stdout
-from unittest.mock import patch
+from unittest.mock import Mock, call, patch
 from netplan_cli.cli.commands.status import NetplanStatus
+from netplan_cli.cli.state_diff import NetplanDiffState
 from netplan.netdef import NetplanRoute
 
 
@@ -1257,3 +1258,47 @@ Use "--diff-only" to omit the information that is consistent between the system
 
             status.state_diff = None
             self.assertDictEqual(status._get_missing_system_interfaces(), {})
+
+    def test_diff_on_demand(self):
+        input_data = {'netplan-global-state': {'online': True, 'nameservers': {'addresses': [], 'search': [], 'mode': 'stub'}}, 'enp5s0': {'index': 2, 'adminstate': 'UP', 'operstate': 'UP', 'type': 'ethernet', 'backend': 'networkd', 'id': 'enp5s0', 'macaddress': '00:16:3e:71:d0:1f'}, 'enp6s0': {'index': 3, 'adminstate': 'UP', 'operstate': 'UP', 'type': 'ethernet', 'backend': 'networkd', 'id': 'enp6s0', 'macaddress': '00:16:3e:71:d0:2f'}}  # nopep8
+        interfaces = {'enp5s0': {'index': 2, 'name': 'enp5s0', 'id': 'enp5s0', 'system_state': {'missing_macaddress': '00:16:3e:71:d0:ff'}, 'netplan_state': {'missing_macaddress': '00:16:3e:71:d0:1f'}}, 'enp6s0': {'index': 3, 'name': 'enp6s0', 'id': 'enp6s0', 'system_state': {}, 'netplan_state': {}}}  # nopep8
+
+        diff_state = Mock(spec=NetplanDiffState)
+        diff_state.diff_for.side_effect = interfaces.get
+        diff_state.get_missing_interfaces.return_value = {'missing_interfaces_system': {}, 'missing_interfaces_netplan': {}}
+        diff_state.has_any_diff.return_value = True
+
+        expected = '''  ●  2: enp5s0 ethernet UP (networkd: enp5s0)
++         MAC Address: 00:16:3e:71:d0:1f
+-                      00:16:3e:71:d0:ff
+'''
+
+        f = io.StringIO()
+        with redirect_stdout(f):
+            status = NetplanStatus()
+            status.ifname = 'enp5s0'
+            status.verbose = False
+            status.diff = True
+            status.diff_only = True
+            status.diff_state = diff_state
+            status.pretty_print(input_data, 2, _console_width=130)
+            out = f.getvalue()
+            self.assertEqual(out, expected)
+
+        # Only the selected interface is compared
+        diff_state.diff_for.assert_called_with('enp5s0')
+        self.assertNotIn(call('enp6s0'), diff_state.diff_for.call_args_list)
+        diff_state.get_missing_interfaces.assert_called_with('enp5s0')
+        diff_state.has_any_diff.assert_not_called()
+
+        # Nothing to compare if there is no difference at all
+        diff_state.reset_mock()
+        diff_state.has_any_diff.return_value = False
+        f = io.StringIO()
+        with redirect_stdout(f):
+            status.ifname = None
+            status.pretty_print(input_data, 3, _console_width=130)
+            out = f.getvalue()
+            self.assertEqual(out, '')
+        diff_state.has_any_diff.assert_called_once()
+        diff_state.diff_for.assert_not_called()
@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+# Closed-box tests of netplan CLI. These are run during "make check" and don't
+# touch the system configuration at all.
+#
+# Copyright (C) 2025 Canonical, Ltd.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+
+from netplan_cli.cli import trace
+
+
+class TestTrace(unittest.TestCase):
+    '''Test netplan trace module'''
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, 'trace.json')
+        os.environ.pop(trace.TRACE_ENV, None)
+        os.environ.pop(trace.TRACE_OWNER_ENV, None)
+
+    def tearDown(self):
+        trace.finish()
+        os.environ.pop(trace.TRACE_ENV, None)
+        os.environ.pop(trace.TRACE_OWNER_ENV, None)
+
+    def test_disabled(self):
+        trace.start()
+        self.assertFalse(trace.enabled())
+        with trace.span('noop'):
+            pass
+        trace.finish()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_span(self):
+        trace.start(self.path)
+        self.assertTrue(trace.enabled())
+        self.assertEqual(os.environ[trace.TRACE_ENV], self.path)
+        with trace.span('outer'):
+            with trace.span('inner'):
+                subprocess.call(['true'])
+            subprocess.call(['true'])
+        trace.finish()
+        self.assertFalse(trace.enabled())
+        self.assertNotIn(trace.TRACE_OWNER_ENV, os.environ)
+        with open(self.path) as f:
+            data = json.load(f)
+        events = data['traceEvents']
+        self.assertEqual([e['name'] for e in events], ['inner', 'outer'])
+        self.assertEqual(events[0]['args'], {'subprocesses': 1})
+        self.assertEqual(events[1]['args'], {'subprocesses': 2})
+        self.assertEqual(events[1]['ph'], 'X')
+        self.assertEqual(events[1]['pid'], os.getpid())
+        self.assertLessEqual(events[1]['ts'], events[0]['ts'])
+        self.assertGreaterEqual(events[1]['dur'], events[0]['dur'])
+
+    def test_span_decorator(self):
+        @trace.span('decorated')
+        def func():
+            return 42
+
+        os.environ[trace.TRACE_ENV] = self.path
+        trace.start()
+        trace.start('/some/other/file.json')  # ignored, already tracing
+        self.assertEqual(func(), 42)
+        trace.finish()
+        self.assertEqual([e['name'] for e in trace.load(self.path)], ['decorated'])
+
+    def test_mark_record(self):
+        trace.start(self.path)
+        phase = trace.mark()
+        trace.record('phase', phase)
+        trace.finish()
+        self.assertEqual([e['name'] for e in trace.load(self.path)], ['phase'])
+
+    def test_nested_process(self):
+        # Another netplan process owns the trace file, we just append to it
+        with open(self.path, 'w') as f:
+            f.write('[\n{"name": "configure", "ph": "X", "ts": 1, "dur": 1},\n')
+        os.environ[trace.TRACE_OWNER_ENV] = '1'
+        trace.start(self.path)
+        with trace.span('nested'):
+            pass
+        trace.finish()
+        self.assertEqual(os.environ[trace.TRACE_OWNER_ENV], '1')
+        with self.assertRaises(json.JSONDecodeError):
+            with open(self.path) as f:
+                json.load(f)
+        self.assertEqual([e['name'] for e in trace.load(self.path)], ['configure', 'nested'])
+
+    def test_load_array(self):
+        with open(self.path, 'w') as f:
+            f.write('[{"name": "configure"}]')
+        self.assertEqual(trace.load(self.path), [{'name': 'configure'}])
+
+    def test_write_error(self):
+        trace.start(self.path)
+        os.remove(self.path)
+        os.mkdir(self.path)  # cannot be opened for writing anymore
+        with self.assertLogs(level='DEBUG') as cm:
+            trace.record('phase', trace.mark())
+        self.assertIn('DEBUG:root:Cannot write trace file ' + self.path, cm.output[0])
+        os.rmdir(self.path)
+        with open(self.path, 'w') as f:
+            f.write('[\n')
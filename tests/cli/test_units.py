@@ -18,17 +18,24 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import errno
+import json
+import netplan
 import os
 import shutil
 import sys
 import unittest
 import subprocess
 import tempfile
+import threading
+import time
 
 from unittest.mock import patch
 from netplan_cli.cli.commands.apply import NetplanApply
+from netplan_cli.cli.commands.generate import NetplanGenerate
 from netplan_cli.cli.commands.try_command import NetplanTry
+from netplan_cli.cli import commands
 from netplan_cli.cli.core import Netplan
+from netplan_cli.configmanager import ConfigManager
 
 
 class TestCLI(unittest.TestCase):
@@ -240,3 +247,370 @@ class TestCLI(unittest.TestCase):
                 NetplanApply._get_nm_interfaces([file_path],
                                                 ['eth0'], exit_on_error=False)
         self.assertTrue(any(os.strerror(errno.EACCES) in msg for msg in ctx.output))
+
+    @patch('netplan_cli.cli.utils.nm_reapply_connection')
+    @patch('netplan_cli.cli.utils.nm_reload_connections')
+    @patch('netplan_cli.cli.utils.nm_active_connections')
+    def test_process_nm_reload(self, mock_active, mock_reload, mock_reapply):
+        # two profiles of the same wifi netdef, only the 1st one is active
+        mock_active.return_value = {'626dd384-8b3d-3690-9511-192b2c79b3fd': 'wlan0',
+                                    '0e2b8a7c-29f3-4e4c-9f5c-3b1fa2a3f1d2': 'eth0'}
+        paths = []
+        for ssid, uuid in [('home', '626dd384-8b3d-3690-9511-192b2c79b3fd'),
+                           ('work', 'ab2d1b3e-7ac5-4c74-a9cd-4e68c3b2e6a1')]:
+            paths.append(os.path.join(self.tmproot, 'netplan-wl0-{}.nmconnection'.format(ssid)))
+            with open(paths[-1], 'w') as f:
+                f.write('[connection]\nid=netplan-wl0-{}\ntype=wifi\n'
+                        'uuid={}\ninterface-name=wlan0\n\n'
+                        '[ipv4]\nmethod=auto\n'.format(ssid, uuid))
+        with self.assertLogs(level='DEBUG') as cm:
+            self.assertTrue(NetplanApply.process_nm_reload(paths))
+            self.assertIn('DEBUG:root:NM connection ab2d1b3e-7ac5-4c74-a9cd-4e68c3b2e6a1 is not active, '
+                          'leaving it to autoconnect', cm.output)
+        mock_reload.assert_called_once()
+        mock_reapply.assert_called_once_with('626dd384-8b3d-3690-9511-192b2c79b3fd', 'wlan0')
+
+    @patch('netplan_cli.cli.utils.nm_reapply_connection')
+    @patch('netplan_cli.cli.utils.nm_reload_connections')
+    @patch('netplan_cli.cli.utils.nm_active_connections')
+    def test_process_nm_reload_no_uuid(self, mock_active, mock_reload, mock_reapply):
+        mock_active.return_value = {}
+        path = os.path.join(self.tmproot, 'netplan-eth0.nmconnection')
+        with open(path, 'w') as f:
+            f.write('[connection]\nid=netplan-eth0\ninterface-name=eth0\n')
+        self.assertFalse(NetplanApply.process_nm_reload([path]))
+        mock_reapply.assert_not_called()
+
+    @patch('netplan_cli.cli.utils.nm_reapply_connection')
+    @patch('netplan_cli.cli.utils.nm_reload_connections')
+    @patch('netplan_cli.cli.utils.nm_active_connections')
+    def test_process_nm_reload_failure(self, mock_active, mock_reload, mock_reapply):
+        mock_active.return_value = {}
+        mock_reload.side_effect = subprocess.CalledProcessError(1, '', 'ERR')
+        self.assertFalse(NetplanApply.process_nm_reload(['/some/netplan-eth0.nmconnection']))
+        mock_reapply.assert_not_called()
+        mock_active.side_effect = subprocess.CalledProcessError(8, 'nmcli')
+        self.assertFalse(NetplanApply.process_nm_reload(['/some/netplan-eth0.nmconnection']))
+
+    def test_read_nm_profiles(self):
+        path = os.path.join(self.tmproot, 'netplan-eth0.nmconnection')
+        with open(path, 'w') as f:
+            f.write('[connection]\nid=netplan-eth0\n')
+        missing = os.path.join(self.tmproot, 'netplan-eth1.nmconnection')
+        with self.assertLogs('', level='DEBUG') as ctx:
+            res = NetplanApply._read_nm_profiles([path, missing])
+        self.assertDictEqual(res, {path: b'[connection]\nid=netplan-eth0\n'})
+        self.assertIn('Cannot read NM profile ' + missing, ctx.output[0])
+
+    def test_networkd_match_names(self):
+        eth0 = os.path.join(self.tmproot, '10-netplan-eth0.network')
+        with open(eth0, 'w') as f:
+            f.write('[Match]\nName=eth0 eth1\n\n[Network]\nDHCP=ipv4\n')
+        glob = os.path.join(self.tmproot, '10-netplan-all-en.network')
+        with open(glob, 'w') as f:
+            f.write('[Match]\nName=en*\n\n[Network]\nDHCP=ipv4\n')
+        mac = os.path.join(self.tmproot, '10-netplan-id0.network')
+        with open(mac, 'w') as f:
+            f.write('[Match]\nMACAddress=00:11:22:33:44:55\n\n[Network]\nDHCP=ipv4\n')
+        missing = os.path.join(self.tmproot, '10-netplan-eth2.network')
+        link = os.path.join(self.tmproot, '10-netplan-eth0.link')
+        self.assertEqual(NetplanApply._networkd_match_names([eth0, missing, link]), {'eth0', 'eth1'})
+        self.assertIsNone(NetplanApply._networkd_match_names([eth0, glob]))
+        self.assertIsNone(NetplanApply._networkd_match_names([mac]))
+
+    @patch('netplan_cli.cli.utils.get_interfaces')
+    @patch('netplan_cli.cli.utils.networkctl_reconfigure')
+    @patch('netplan_cli.cli.utils.networkctl_reload')
+    def test_process_fast_revert(self, mock_reload, mock_reconfigure, mock_devices):
+        mock_devices.return_value = ['lo', 'eth0', 'eth1']
+        eth0 = os.path.join(self.tmproot, '10-netplan-eth0.network')
+        with open(eth0, 'w') as f:
+            f.write('[Match]\nName=eth0\n\n[Network]\nDHCP=ipv4\n')
+        eth2 = os.path.join(self.tmproot, '10-netplan-eth2.network')  # removed by the revert
+        self.assertTrue(NetplanApply.process_fast_revert([eth0, eth2], {'eth1', 'eth2'}))
+        mock_reload.assert_called_once()
+        mock_reconfigure.assert_called_once_with(['eth0', 'eth1'])
+
+    @patch('netplan_cli.cli.utils.networkctl_reconfigure')
+    @patch('netplan_cli.cli.utils.networkctl_reload')
+    def test_process_fast_revert_nothing_changed(self, mock_reload, mock_reconfigure):
+        self.assertTrue(NetplanApply.process_fast_revert([], set()))
+        mock_reload.assert_not_called()
+        mock_reconfigure.assert_not_called()
+
+    @patch('netplan_cli.cli.commands.apply.NetplanApply.process_nm_reload')
+    @patch('netplan_cli.cli.utils.nm_running')
+    def test_process_fast_revert_nm(self, mock_running, mock_nm_reload):
+        mock_running.return_value = True
+        mock_nm_reload.return_value = True
+        path = os.path.join(self.tmproot, 'netplan-eth0.nmconnection')
+        with open(path, 'w') as f:
+            f.write('[connection]\nid=netplan-eth0\n')
+        self.assertTrue(NetplanApply.process_fast_revert([path], set()))
+        mock_nm_reload.assert_called_once_with([path])
+        # NM profiles that got removed need a full apply
+        missing = os.path.join(self.tmproot, 'netplan-eth1.nmconnection')
+        self.assertFalse(NetplanApply.process_fast_revert([path, missing], set()))
+        # NM reload failure
+        mock_nm_reload.return_value = False
+        self.assertFalse(NetplanApply.process_fast_revert([path], set()))
+
+    @patch('netplan_cli.cli.utils.get_interfaces')
+    @patch('netplan_cli.cli.utils.networkctl_reload')
+    def test_process_fast_revert_fallback(self, mock_reload, mock_devices):
+        eth0 = os.path.join(self.tmproot, '10-netplan-eth0.network')
+        with open(eth0, 'w') as f:
+            f.write('[Match]\nName=eth0\n')
+        netdev = os.path.join(self.tmproot, '10-netplan-br0.netdev')
+        # virtual devices need a full apply
+        self.assertFalse(NetplanApply.process_fast_revert([eth0, netdev], {'eth0'}))
+        # unknown interfaces before the revert
+        self.assertFalse(NetplanApply.process_fast_revert([eth0], None))
+        # networkd failure
+        mock_reload.side_effect = subprocess.CalledProcessError(1, '', 'ERR')
+        self.assertFalse(NetplanApply.process_fast_revert([eth0], {'eth0'}))
+
+    @patch('netplan_cli.cli.utils.networkctl_reload')
+    def test_process_fast_revert_wifi(self, mock_reload):
+        with open(os.path.join(self.tmproot, 'etc/netplan/test.yaml'), 'w') as f:
+            f.write('''network:
+  ethernets:
+    eth0:
+      dhcp4: true
+  wifis:
+    wlan0:
+      access-points:
+        "Joe's Home": {password: "s0s3kr1t"}
+''')
+        wifi_state = ConfigManager(prefix=self.tmproot).parse()
+        with open(os.path.join(self.tmproot, 'etc/netplan/test.yaml'), 'w') as f:
+            f.write('''network:
+  ethernets:
+    eth0:
+      dhcp4: true
+''')
+        state = ConfigManager(prefix=self.tmproot).parse()
+        eth0 = os.path.join(self.tmproot, '10-netplan-eth0.network')
+        with open(eth0, 'w') as f:
+            f.write('[Match]\nName=eth0\n')
+        # wifi in the tried or in the reverted state needs a full apply (wpa_supplicant)
+        self.assertFalse(NetplanApply.process_fast_revert([eth0], {'eth0'}, [wifi_state, state]))
+        self.assertFalse(NetplanApply.process_fast_revert([eth0], {'eth0'}, [state, wifi_state]))
+        # unknown state
+        self.assertFalse(NetplanApply.process_fast_revert([eth0], {'eth0'}, [state, None]))
+        mock_reload.assert_not_called()
+
+    @patch('netplan_cli.cli.commands.apply.NetplanApply._has_special_setup')
+    @patch('netplan_cli.cli.utils.networkctl_reload')
+    def test_process_fast_revert_state_error(self, mock_reload, mock_special):
+        mock_special.side_effect = netplan.NetplanException('invalid VF count')
+        eth0 = os.path.join(self.tmproot, '10-netplan-eth0.network')
+        with open(eth0, 'w') as f:
+            f.write('[Match]\nName=eth0\n')
+        # fall back to a full apply, instead of leaving the tried config running
+        self.assertFalse(NetplanApply.process_fast_revert([eth0], {'eth0'}, [object()]))
+        mock_reload.assert_not_called()
+
+    def test_process_fast_revert_generator_output(self):
+        eth0 = os.path.join(self.tmproot, '10-netplan-eth0.network')
+        with open(eth0, 'w') as f:
+            f.write('[Match]\nName=eth0\n')
+        rules = os.path.join(self.tmproot, 'run/udev/rules.d/99-netplan-eth0.rules')
+        # other generator output, like udev rules, needs a full apply
+        self.assertFalse(NetplanApply.process_fast_revert([eth0, rules], {'eth0'}))
+
+    def test_lazy_commands_registry(self):
+        for command_id, (_, _, description, testing) in commands.COMMANDS.items():
+            instance = commands.load_command(command_id)()
+            self.assertEqual(instance.command_id, command_id)
+            self.assertEqual(instance.description, description)
+            self.assertEqual(instance.testing, testing)
+        self.assertIs(commands.NetplanApply, NetplanApply)
+        with self.assertRaises(AttributeError):
+            commands.NetplanFoo
+
+    def test_lazy_commands_parse_args(self):
+        old_argv = sys.argv
+        sys.argv = [old_argv[0], 'info', '--json']
+        try:
+            with patch.dict(os.environ, {'ENABLE_TEST_COMMANDS': ''}):
+                cli = Netplan()
+                cli.parse_args()
+        finally:
+            sys.argv = old_argv
+        self.assertEqual(cli.commandclass.command_id, 'info')
+        self.assertEqual(cli.func, cli.commandclass.run)
+        self.assertEqual(cli._args, ['--json'])
+        self.assertNotIn('migrate', cli.subcommands)
+
+    def test_lazy_commands_import_budget(self):
+        # 'netplan generate' is called often (e.g. by NetworkManager), it must
+        # not pay for the modules only needed by other commands. Only count what
+        # netplan_cli pulls in, not what site hooks (e.g. coverage) did already.
+        script = ('import json, sys\n'
+                  'preloaded = set(sys.modules)\n'
+                  'from netplan_cli.cli.core import Netplan\n'
+                  'cli = Netplan()\n'
+                  'cli.parse_args()\n'
+                  'print(json.dumps(sorted(set(sys.modules) - preloaded)))\n')
+        heavy = {'yaml', 'rich', 'ipaddress', 'netplan_cli.cli.state', 'netplan_cli.cli.state_diff',
+                 'netplan_cli.cli.sriov', 'netplan_cli.cli.ovs', 'netplan_cli.cli.monitor',
+                 'netplan_cli.cli.commands.apply', 'netplan_cli.cli.commands.status'}
+        res = subprocess.run([sys.executable, '-c', script, 'generate'],
+                             capture_output=True, text=True, check=True)
+        modules = set(json.loads(res.stdout))
+        self.assertIn('netplan_cli.cli.commands.generate', modules)
+        self.assertEqual(modules & heavy, set())
+
+    @patch('netplan_cli.cli.commands.generate.COALESCE_WINDOW_SEC', 0)
+    def test_generate_coalesce(self):
+        pending = os.path.join(self.tmproot, 'run', 'netplan', 'netplan-generate.pending')
+        running = threading.Event()
+        release = threading.Event()
+        runs = []
+
+        def generate():
+            runs.append(len(runs))
+            if len(runs) == 1:
+                running.set()
+                release.wait(10)
+            return len(runs) + 41
+
+        results = {}
+
+        def request(n):
+            cli = NetplanGenerate()
+            cli._rootdir = self.tmproot
+            results[n] = cli._coalesce(generate)
+
+        threads = [threading.Thread(target=request, args=(0,))]
+        threads[0].start()
+        self.assertTrue(running.wait(10))
+        # further requests while the first run is ongoing
+        for n in range(1, 4):
+            threads.append(threading.Thread(target=request, args=(n,)))
+            threads[-1].start()
+        for _ in range(1000):
+            with NetplanGenerate._pending_state(pending) as state:
+                if state['requested'] == 4:
+                    break
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join(10)
+        # all follow-up requests were merged into a single run
+        self.assertEqual(runs, [0, 1])
+        self.assertEqual(results, {0: 42, 1: 43, 2: 43, 3: 43})
+        with NetplanGenerate._pending_state(pending) as state:
+            self.assertEqual((state['requested'], state['done'], state['result']), (4, 4, 43))
+
+    @patch('time.sleep')
+    def test_generate_coalesce_window(self, mock_sleep):
+        cli = NetplanGenerate()
+        cli._rootdir = self.tmproot
+        self.assertEqual(cli._coalesce(lambda: 0), 0)
+        mock_sleep.assert_not_called()  # first request runs immediately
+        self.assertEqual(cli._coalesce(lambda: 1), 1)
+        mock_sleep.assert_called_once()  # back-to-back request waits for the window
+        self.assertLessEqual(mock_sleep.call_args.args[0], 0.5)
+
+    def test_generate_coalesce_corrupted_state(self):
+        rundir = os.path.join(self.tmproot, 'run', 'netplan')
+        os.makedirs(rundir)
+        with open(os.path.join(rundir, 'netplan-generate.pending'), 'w') as f:
+            f.write('garbage')
+        cli = NetplanGenerate()
+        cli._rootdir = self.tmproot
+        self.assertEqual(cli._coalesce(lambda: 0), 0)
+        with NetplanGenerate._pending_state(os.path.join(rundir, 'netplan-generate.pending')) as state:
+            self.assertEqual((state['requested'], state['done']), (1, 1))
+
+    @patch('netplan_cli.cli.commands.generate.NetplanGenerate._generate')
+    def test_generate_coalesce_cli(self, mock_generate):
+        mock_generate.return_value = 0
+        old_argv = sys.argv
+        sys.argv = [old_argv[0], 'generate', '--coalesce', '--root-dir', self.tmproot]
+        try:
+            with self.assertRaises(SystemExit) as e:
+                Netplan().main()
+        finally:
+            sys.argv = old_argv
+        self.assertEqual(e.exception.code, 0)
+        mock_generate.assert_called_once()
+        self.assertTrue(os.path.isfile(os.path.join(self.tmproot, 'run', 'netplan', 'netplan-generate.lock')))
+
+    def test_generate_try_ready_stamp(self):
+        NetplanTry().touch_ready_stamp()
+        cli = NetplanGenerate()
+        cli.root_dir = self.tmproot
+        cli._netplan_try_stamp = os.path.join(self.tmproot, cli.try_ready_stamp)
+        with self.assertLogs(level='DEBUG') as cm:
+            self.assertEqual(cli._generate(['generate']), 1)
+            self.assertIn('Skipping daemon-reload', cm.output[0])
+
+    def test_generate_coalesce_try_ready_stamp(self):
+        NetplanTry().touch_ready_stamp()
+        old_argv = sys.argv
+        sys.argv = [old_argv[0], 'generate', '--coalesce', '--root-dir', self.tmproot]
+        try:
+            with self.assertRaises(SystemExit) as e:
+                Netplan().main()
+        finally:
+            sys.argv = old_argv
+        self.assertEqual(e.exception.code, 1)
+        with NetplanGenerate._pending_state(os.path.join(self.tmproot, 'run', 'netplan',
+                                                         'netplan-generate.pending')) as state:
+            self.assertEqual(state['result'], 1)
+
+    def _generate_only(self, netdef_id: str) -> int:
+        old_argv = sys.argv
+        sys.argv = [old_argv[0], 'generate', '--only', netdef_id, '--root-dir', self.tmproot]
+        try:
+            with self.assertRaises(SystemExit) as e:
+                Netplan().main()
+        finally:
+            sys.argv = old_argv
+        return e.exception.code
+
+    @patch('netplan_cli.cli.commands.generate.NetplanGenerate._generate')
+    @patch('subprocess.check_call')
+    def test_generate_only(self, mock_call, mock_generate):
+        with open(os.path.join(self.tmproot, 'etc/netplan/test.yaml'), 'w') as f:
+            f.write('''network:
+  renderer: NetworkManager
+  ethernets:
+    eth0: {dhcp4: true}
+    eth1: {dhcp4: true}
+''')
+        mock_call.side_effect = subprocess.CalledProcessError(1, 'udevadm')
+        # Netplan.main() resets the logging handlers, check the calls instead
+        with patch('logging.debug') as log:
+            self.assertEqual(self._generate_only('eth0'), 0)
+        self.assertIn('Could not call "udevadm control --reload"', log.call_args.args[0])
+        mock_generate.assert_not_called()
+        mock_call.assert_called_once_with(['udevadm', 'control', '--reload'])
+        nm_dir = os.path.join(self.tmproot, 'run', 'NetworkManager', 'system-connections')
+        self.assertEqual(os.listdir(nm_dir), ['netplan-eth0.nmconnection'])
+
+    @patch('netplan_cli.cli.commands.generate.NetplanGenerate._generate')
+    @patch('subprocess.check_call')
+    def test_generate_only_fallback(self, mock_call, mock_generate):
+        with open(os.path.join(self.tmproot, 'etc/netplan/test.yaml'), 'w') as f:
+            f.write('''network:
+  ethernets:
+    eth0: {dhcp4: true}
+''')
+        mock_generate.return_value = 0
+        with patch('logging.debug') as log:
+            self.assertEqual(self._generate_only('eth0'), 0)
+        log.assert_called_once_with('Cannot regenerate %s on its own, running a full generate', 'eth0')
+        mock_generate.assert_called_once()
+        mock_call.assert_not_called()
+
+    @patch('netplan_cli.cli.commands.generate.NetplanGenerate._generate')
+    def test_generate_only_try_ready_stamp(self, mock_generate):
+        NetplanTry().touch_ready_stamp()
+        mock_generate.return_value = 1
+        self.assertEqual(self._generate_only('eth0'), 1)
+        mock_generate.assert_called_once()
+        self.assertFalse(os.path.exists(os.path.join(self.tmproot, 'run', 'NetworkManager')))
@@ -3,7 +3,9 @@
 #include <stddef.h>
 #include <setjmp.h>
 
+#include <sys/mman.h>
 #include <sys/stat.h>
+#include <unistd.h>
 #include <netinet/in.h>
 
 #include <cmocka.h>
@@ -546,6 +548,113 @@ test_scrub_systemd_unit_content(__unused void** state)
     g_free(res);
 }
 
+void
+test_util_trace_span(__unused void** state)
+{
+    char template[] = "/tmp/netplan.XXXXXX";
+    // no need to free() tmpdir, as it will modify the template[] buffer
+    char *tmpdir = mkdtemp(template);
+    g_autofree gchar* path = g_build_path(G_DIR_SEPARATOR_S, tmpdir, "trace.json", NULL);
+    g_autofree gchar* bad_path = g_build_path(G_DIR_SEPARATOR_S, tmpdir, "missing", "trace.json", NULL);
+    g_autofree gchar* content = NULL;
+
+    /* Tracing disabled */
+    unsetenv("NETPLAN_TRACE");
+    _netplan_trace_span("disabled", g_get_monotonic_time());
+    assert_false(g_file_test(path, G_FILE_TEST_EXISTS));
+
+    /* Tracing into a new file, then appending to it */
+    setenv("NETPLAN_TRACE", path, 1);
+    _netplan_trace_span("first", g_get_monotonic_time());
+    _netplan_trace_span("second", g_get_monotonic_time());
+    assert_true(g_file_get_contents(path, &content, NULL, NULL));
+    assert_true(g_str_has_prefix(content, "[\n{\"name\": \"first\", \"cat\": \"netplan\", \"ph\": \"X\", "));
+    assert_non_null(strstr(content, "},\n{\"name\": \"second\""));
+    assert_true(g_str_has_suffix(content, "},\n"));
+    assert_null(strstr(content, "\"args\""));
+
+    /* Trace file cannot be opened */
+    setenv("NETPLAN_TRACE", bad_path, 1);
+    _netplan_trace_span("failure", g_get_monotonic_time());
+    assert_false(g_file_test(bad_path, G_FILE_TEST_EXISTS));
+
+    unsetenv("NETPLAN_TRACE");
+    remove(path);
+    rmdir(tmpdir);
+}
+
+void
+test_util_set_get_all(__unused void** state)
+{
+    char template[] = "/tmp/netplan.XXXXXX";
+    // no need to free() rootdir, as it will modify the template[] buffer
+    char *rootdir = mkdtemp(template);
+    g_autofree gchar* etc = g_build_path(G_DIR_SEPARATOR_S, rootdir, "etc", NULL);
+    g_autofree gchar* etc_netplan = g_build_path(G_DIR_SEPARATOR_S, etc, "netplan", NULL);
+    g_autofree gchar* fallback = g_build_path(G_DIR_SEPARATOR_S, etc_netplan, "70-netplan-set.yaml", NULL);
+    g_autofree gchar* hint = g_build_path(G_DIR_SEPARATOR_S, etc_netplan, "90-hint.yaml", NULL);
+    g_autofree gchar* content = NULL;
+    char output[200] = {0};
+    GError* err = NULL;
+    g_mkdir_with_parents(etc_netplan, 0700);
+
+    /* Keys are prefixed by "network", escaped dots are part of the key */
+    const char* escaped[] = {"ethernets.eth0\\.1.dhcp4=true", NULL};
+    assert_true(_netplan_util_set(escaped, NULL, rootdir, &err));
+    assert_null(err);
+    assert_true(g_file_get_contents(fallback, &content, NULL, NULL));
+    assert_string_equal(content, "network:\n  version: 2\n  ethernets:\n    eth0.1:\n      dhcp4: true\n");
+    g_free(content);
+
+    /* Settings are written to the origin-hint file, all at once */
+    const char* many[] = {"network.ethernets.eth1.dhcp4=false", "ethernets.eth1.dhcp6=true", "ethernets.eth1.dhcp4=NULL", NULL};
+    assert_true(_netplan_util_set(many, "90-hint", rootdir, &err));
+    assert_null(err);
+    assert_true(g_file_get_contents(hint, &content, NULL, NULL));
+    assert_string_equal(content, "network:\n  version: 2\n  ethernets:\n    eth1:\n      dhcp6: true\n");
+    g_free(content);
+
+    /* Nothing is written if any of the settings is invalid */
+    const char* invalid[] = {"ethernets.eth1.dhcp4=true", "ethernets.eth1.dhcp6=garbage", NULL};
+    assert_false(_netplan_util_set(invalid, "90-hint", rootdir, &err));
+    g_clear_error(&err);
+    assert_true(g_file_get_contents(hint, &content, NULL, NULL));
+    assert_string_equal(content, "network:\n  version: 2\n  ethernets:\n    eth1:\n      dhcp6: true\n");
+
+    /* Invalid input */
+    const char* no_value[] = {"ethernets.eth0.dhcp4", NULL};
+    assert_false(_netplan_util_set(no_value, NULL, rootdir, &err));
+    assert_string_equal(err->message, "Invalid value specified");
+    g_clear_error(&err);
+    assert_false(_netplan_util_set(escaped, "", rootdir, &err));
+    assert_string_equal(err->message, "Invalid/empty origin-hint");
+    g_clear_error(&err);
+
+    /* Dump the whole config */
+    int fd = memfd_create("netplan-get.yaml", 0);
+    assert_true(_netplan_util_get_all(rootdir, fd, &err));
+    assert_null(err);
+    assert_true(pread(fd, output, sizeof(output) - 1, 0) > 0);
+    assert_string_equal(output, "network:\n  version: 2\n  ethernets:\n"
+                                "    eth0.1:\n      dhcp4: true\n"
+                                "    eth1:\n      dhcp6: true\n");
+    close(fd);
+
+    /* Netdefs defined in other files are moved to the origin-hint file */
+    const char* other[] = {"ethernets.eth0\\.1.dhcp6=true", NULL};
+    assert_true(_netplan_util_set(other, "90-hint", rootdir, &err));
+    assert_null(err);
+    g_free(content);
+    assert_true(g_file_get_contents(hint, &content, NULL, NULL));
+    assert_non_null(strstr(content, "    eth0.1:\n      dhcp6: true\n"));
+
+    remove(fallback);
+    remove(hint);
+    rmdir(etc_netplan);
+    rmdir(etc);
+    rmdir(rootdir);
+}
+
 int
 setup(__unused void** state)
 {
@@ -584,6 +693,8 @@ main()
            cmocka_unit_test(test_util_get_link_local_true),
            cmocka_unit_test(test_util_get_link_local_false),
            cmocka_unit_test(test_scrub_systemd_unit_content),
+           cmocka_unit_test(test_util_trace_span),
+           cmocka_unit_test(test_util_set_get_all),
        };
 
        return cmocka_run_group_tests(tests, setup, tear_down);
@@ -49,6 +49,74 @@ test_wait_online_utils(__unused void** state)
     rmdir(rootdir);
 }
 
+void
+test_sysfs_inventory(__unused void** state)
+{
+    char template[] = "/tmp/netplan.XXXXXX";
+    const char* rootdir = mkdtemp(template);
+    g_autofree gchar* eth99 = g_strdup_printf("%s/sys/class/net/eth99", rootdir);
+    g_autofree gchar* mac = g_strdup_printf("%s/address", eth99);
+    g_mkdir_with_parents(eth99, 0700);
+    assert_true(g_file_set_contents(mac, "aa:bb:cc:dd:ee:ff\n", -1, NULL));
+
+    NetplanSysfsInventory* inventory = _netplan_sysfs_inventory_new(rootdir);
+    const NetplanInterfaceInfo* info = _netplan_sysfs_inventory_lookup(inventory, "eth99");
+    assert_string_equal(info->name, "eth99");
+    assert_string_equal(info->mac, "aa:bb:cc:dd:ee:ff");
+    assert_null(info->driver);
+
+    // sysfs is queried only once per interface
+    assert_true(g_file_set_contents(mac, "11:22:33:44:55:66\n", -1, NULL));
+    assert_ptr_equal(_netplan_sysfs_inventory_lookup(inventory, "eth99"), info);
+    assert_string_equal(info->mac, "aa:bb:cc:dd:ee:ff");
+
+    // all system interfaces are queried at once, e.g. the loopback device
+    const GArray* infos = _netplan_sysfs_inventory_get_system_infos(inventory);
+    assert_ptr_equal(_netplan_sysfs_inventory_get_system_infos(inventory), infos);
+    assert_true(g_hash_table_contains(_netplan_sysfs_inventory_get_system_interfaces(inventory), "lo"));
+    assert_int_equal(infos->len, g_hash_table_size(_netplan_sysfs_inventory_get_system_interfaces(inventory)));
+
+    _netplan_sysfs_inventory_free(inventory);
+    _netplan_sysfs_inventory_free(NULL);
+
+    // Cleanup
+    remove(mac);
+    rmdir(eth99);
+    g_autofree gchar* sys_class_net = g_path_get_dirname(eth99);
+    g_autofree gchar* sys_class = g_path_get_dirname(sys_class_net);
+    g_autofree gchar* sys = g_path_get_dirname(sys_class);
+    rmdir(sys_class_net);
+    rmdir(sys_class);
+    rmdir(sys);
+    rmdir(rootdir);
+}
+
+
+void
+test_generate_wait_online_compat(__unused void** state)
+{
+    char template[] = "/tmp/netplan.XXXXXX";
+    const char* rootdir = mkdtemp(template);
+    g_autofree gchar* override_dir = g_strdup_printf("%s/systemd-networkd-wait-online.service.d", rootdir);
+    g_autofree gchar* override = g_strdup_printf("%s/10-netplan.conf", override_dir);
+    NetplanState* np_state = load_string_to_netplan_state(
+        "network:\n"
+        "  ethernets:\n"
+        "    eth0:\n"
+        "      dhcp4: true\n"
+        "      optional: true\n");
+
+    // The rootdir based variant creates its own sysfs inventory
+    assert_false(_netplan_networkd_generate_wait_online(np_state, rootdir, rootdir));
+    assert_true(g_file_test(override, G_FILE_TEST_EXISTS));
+
+    netplan_state_clear(&np_state);
+
+    // Cleanup
+    remove(override);
+    rmdir(override_dir);
+    rmdir(rootdir);
+}
 
 int
 setup(__unused void** state)
@@ -68,6 +136,8 @@ main()
 
     const struct CMUnitTest tests[] = {
         cmocka_unit_test(test_wait_online_utils),
+        cmocka_unit_test(test_sysfs_inventory),
+        cmocka_unit_test(test_generate_wait_online_compat),
     };
 
     return cmocka_run_group_tests(tests, setup, tear_down);
@@ -97,6 +97,70 @@ test_netplan_state_flags_bad_flags(__unused void** state)
     netplan_state_clear(&np_state);
 }
 
+void
+test_netplan_state_match_interfaces(__unused void** state)
+{
+    const char* yaml =
+        "network:\n"
+        "  ethernets:\n"
+        "    eth0: {}\n"
+        "    by-name:\n"
+        "      match:\n"
+        "        name: \"eth1\"\n"
+        "    by-glob:\n"
+        "      match:\n"
+        "        name: \"eth*\"\n"
+        "        driver: [\"ixgbe\", \"e1000*\"]\n"
+        "    by-mac:\n"
+        "      match:\n"
+        "        macaddress: AA:BB:CC:DD:EE:FF\n"
+        "    no-match:\n"
+        "      match:\n"
+        "        name: \"wl*\"\n";
+    NetplanInterfaceInfo ifaces[] = {
+        { .name = "eth0", .mac = "00:11:22:33:44:55", .driver = "e1000e" },
+        { .name = "eth1", .mac = "aa:bb:cc:dd:ee:ff", .driver = "virtio_net" },
+        { .name = "eth2", .mac = NULL, .driver = "ixgbe" },
+        { .name = "lo", .mac = NULL, .driver = NULL },
+        { .name = "eth3", .mac = NULL, .driver = NULL },
+        { .name = NULL, .mac = NULL, .driver = "ixgbe" },
+    };
+    NetplanInterfaceMatch matches[6];
+
+    NetplanState* np_state = load_string_to_netplan_state(yaml);
+    assert_int_equal(netplan_state_match_interfaces(np_state, ifaces, 6, matches, 4), NETPLAN_BUFFER_TOO_SMALL);
+    assert_int_equal(netplan_state_match_interfaces(np_state, ifaces, 6, matches, 6), 5);
+
+    // eth0 -> eth0 (by ID)
+    assert_string_equal(matches[0].netdef->id, "eth0");
+    assert_int_equal(matches[0].iface_index, 0);
+    assert_true(matches[0].duplicate);
+    // by-name -> eth1
+    assert_string_equal(matches[1].netdef->id, "by-name");
+    assert_int_equal(matches[1].iface_index, 1);
+    assert_true(matches[1].duplicate);
+    // by-glob -> eth0, eth2
+    assert_string_equal(matches[2].netdef->id, "by-glob");
+    assert_int_equal(matches[2].iface_index, 0);
+    assert_true(matches[2].duplicate);
+    assert_string_equal(matches[3].netdef->id, "by-glob");
+    assert_int_equal(matches[3].iface_index, 2);
+    assert_false(matches[3].duplicate);
+    // by-mac -> eth1 (case insensitive)
+    assert_string_equal(matches[4].netdef->id, "by-mac");
+    assert_int_equal(matches[4].iface_index, 1);
+    assert_true(matches[4].duplicate);
+
+    // Same semantics as netplan_netdef_match_interface()
+    for (int i = 0; i < 5; i++) {
+        const NetplanInterfaceInfo* iface = &ifaces[matches[i].iface_index];
+        assert_true(netplan_netdef_match_interface(matches[i].netdef, iface->name, iface->mac, iface->driver));
+    }
+
+    assert_int_equal(netplan_state_match_interfaces(np_state, NULL, 0, matches, 0), 0);
+    netplan_state_clear(&np_state);
+}
+
 
 int
 setup(__unused void** state)
@@ -122,6 +186,7 @@ main()
         cmocka_unit_test(test_netplan_state_iterator_null_has_next),
         cmocka_unit_test(test_netplan_state_flags),
         cmocka_unit_test(test_netplan_state_flags_bad_flags),
+        cmocka_unit_test(test_netplan_state_match_interfaces),
     };
 
     return cmocka_run_group_tests(tests, setup, tear_down);
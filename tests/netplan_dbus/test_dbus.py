@@ -241,6 +241,93 @@ class TestNetplanDBus(unittest.TestCase):
                 ["netplan", "apply"],
         ])
 
+    def _job_property(self, job, name):
+        return subprocess.check_output([
+            "busctl", "get-property", "--system",
+            "io.netplan.Netplan",
+            job,
+            "io.netplan.Netplan.Job",
+            name,
+        ]).decode("utf-8")
+
+    def test_netplan_dbus_apply_async(self):
+        self.mock_netplan_cmd.set_delay(1.5)
+        BUSCTL_NETPLAN_APPLY_ASYNC = [
+            "busctl", "call", "--system",
+            "io.netplan.Netplan",
+            "/io/netplan/Netplan",
+            "io.netplan.Netplan",
+            "ApplyAsync",
+        ]
+        output = subprocess.check_output(BUSCTL_NETPLAN_APPLY_ASYNC)
+        self.assertEqual(output.decode("utf-8"), 'o "/io/netplan/Netplan/job/1"\n')
+        self.assertIn(self._job_property("/io/netplan/Netplan/job/1", "Phase"),
+                      ['s "started"\n', 's "running"\n'])
+
+        # Read-only methods are served while the job is running
+        output = subprocess.check_output([
+            "busctl", "call", "--system",
+            "io.netplan.Netplan",
+            "/io/netplan/Netplan",
+            "io.netplan.Netplan",
+            "Info",
+        ])
+        self.assertIn("Features", output.decode("utf-8"))
+
+        # Only one apply at a time
+        err = self._check_dbus_error(BUSCTL_NETPLAN_APPLY_ASYNC)
+        self.assertIn('Another ApplyAsync() is currently in progress: PID ', err)
+        cid = self._new_config_object()
+        err = self._check_dbus_error([
+            "busctl", "call", "--system",
+            "io.netplan.Netplan",
+            "/io/netplan/Netplan/config/{}".format(cid),
+            "io.netplan.Netplan.Config",
+            "Apply",
+        ])
+        self.assertIn('Another ApplyAsync() is currently in progress: PID ', err)
+        err = self._check_dbus_error([
+            "busctl", "call", "--system",
+            "io.netplan.Netplan",
+            "/io/netplan/Netplan",
+            "io.netplan.Netplan",
+            "Generate",
+        ])
+        self.assertIn('Another ApplyAsync() is currently in progress: PID ', err)
+
+        time.sleep(2.5)  # Give some time for the job to finish
+        self.assertEqual(self._job_property("/io/netplan/Netplan/job/1", "Phase"), 's "finished"\n')
+        self.assertEqual(self._job_property("/io/netplan/Netplan/job/1", "Success"), 'b true\n')
+        self.assertEqual(self.mock_netplan_cmd.calls(), [
+                ["netplan", "apply"],
+        ])
+
+        # and again, replacing the previous job object
+        output = subprocess.check_output(BUSCTL_NETPLAN_APPLY_ASYNC)
+        self.assertEqual(output.decode("utf-8"), 'o "/io/netplan/Netplan/job/2"\n')
+        err = self._check_dbus_error([
+            "busctl", "get-property", "--system",
+            "io.netplan.Netplan",
+            "/io/netplan/Netplan/job/1",
+            "io.netplan.Netplan.Job",
+            "Phase",
+        ])
+        self.assertIn("Unknown object '/io/netplan/Netplan/job/1'", err)
+
+    def test_netplan_dbus_apply_async_failed(self):
+        self.mock_netplan_cmd.set_returncode(1)
+        output = subprocess.check_output([
+            "busctl", "call", "--system",
+            "io.netplan.Netplan",
+            "/io/netplan/Netplan",
+            "io.netplan.Netplan",
+            "ApplyAsync",
+        ])
+        self.assertEqual(output.decode("utf-8"), 'o "/io/netplan/Netplan/job/1"\n')
+        time.sleep(1)  # Give some time for the job to finish
+        self.assertEqual(self._job_property("/io/netplan/Netplan/job/1", "Phase"), 's "failed"\n')
+        self.assertEqual(self._job_property("/io/netplan/Netplan/job/1", "Success"), 'b false\n')
+
     def test_netplan_dbus_generate(self):
         BUSCTL_NETPLAN_CMD = [
             "busctl", "call", "--system",
@@ -271,10 +358,10 @@ class TestNetplanDBus(unittest.TestCase):
         # Create test YAML
         test_file_lib = os.path.join(self.tmp, 'lib', 'netplan', 'lib_test.yaml')
         with open(test_file_lib, 'w') as f:
-            f.write('TESTING-lib')
+            f.write('network:\n  ethernets:\n    eth1:\n      dhcp6: true')
         test_file_run = os.path.join(self.tmp, 'run', 'netplan', 'run_test.yaml')
         with open(test_file_run, 'w') as f:
-            f.write('TESTING-run')
+            f.write('network:\n  ethernets:\n    eth2:\n      dhcp4: true')
         self.assertTrue(os.path.isfile(os.path.join(self.tmp, 'etc', 'netplan', 'main_test.yaml')))
         self.assertTrue(os.path.isfile(os.path.join(self.tmp, 'lib', 'netplan', 'lib_test.yaml')))
         self.assertTrue(os.path.isfile(os.path.join(self.tmp, 'run', 'netplan', 'run_test.yaml')))
@@ -293,10 +380,11 @@ class TestNetplanDBus(unittest.TestCase):
             "Get",
         ]
         out = subprocess.check_output(BUSCTL_NETPLAN_CMD, text=True)
-        self.assertIn(r's ""', out)  # No output as 'netplan get' is actually mocked
-        self.assertEqual(self.mock_netplan_cmd.calls(), [[
-            "netplan", "get", "all", "--root-dir={}".format(tmpdir)
-        ]])
+        self.assertIn(r'eth0:\n      dhcp4: true', out)
+        self.assertIn(r'eth1:\n      dhcp6: true', out)
+        self.assertIn(r'eth2:\n      dhcp4: true', out)
+        # 'netplan get' is served by libnetplan directly
+        self.assertFalse(os.path.exists(self.mock_netplan_cmd.call_log))
 
         # Verify all *.yaml files have been copied
         self.assertTrue(os.path.isfile(os.path.join(tmpdir, 'etc', 'netplan', 'main_test.yaml')))
@@ -319,7 +407,6 @@ class TestNetplanDBus(unittest.TestCase):
         self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
 
         # Verify .Config.Set() on the config object
-        # No actual YAML file will be created, as the netplan command is mocked
         BUSCTL_NETPLAN_CMD = [
             "busctl", "call", "--system",
             "io.netplan.Netplan",
@@ -329,10 +416,72 @@ class TestNetplanDBus(unittest.TestCase):
         ]
         out = subprocess.check_output(BUSCTL_NETPLAN_CMD)
         self.assertEqual(b'b true\n', out)
-        self.assertEqual(self.mock_netplan_cmd.calls(), [[
-            "netplan", "set", "ethernets.eth42.dhcp6=true",
-            "--root-dir={}".format(tmpdir)
-        ]])
+        # 'netplan set' is served by libnetplan directly
+        self.assertFalse(os.path.exists(self.mock_netplan_cmd.call_log))
+        with open(os.path.join(tmpdir, 'etc', 'netplan', '70-netplan-set.yaml'), 'r') as f:
+            self.assertEqual(f.read(), 'network:\n  version: 2\n  ethernets:\n    eth42:\n      dhcp6: true\n')
+
+    def test_netplan_dbus_config_set_origin_hint(self):
+        cid = self._new_config_object()
+        tmpdir = self.tmp + '/run/netplan/config-{}'.format(cid)
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+
+        BUSCTL_NETPLAN_CMD = [
+            "busctl", "call", "--system",
+            "io.netplan.Netplan",
+            "/io/netplan/Netplan/config/{}".format(cid),
+            "io.netplan.Netplan.Config",
+            "Set", "ss", "ethernets.eth0.dhcp4=false", "70-snapd",
+        ]
+        out = subprocess.check_output(BUSCTL_NETPLAN_CMD)
+        self.assertEqual(b'b true\n', out)
+        with open(os.path.join(tmpdir, 'etc', 'netplan', '70-snapd.yaml'), 'r') as f:
+            self.assertEqual(f.read(), 'network:\n  version: 2\n  ethernets:\n    eth0:\n      dhcp4: false\n')
+
+    def test_netplan_dbus_config_set_many(self):
+        cid = self._new_config_object()
+        tmpdir = self.tmp + '/run/netplan/config-{}'.format(cid)
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+
+        BUSCTL_NETPLAN_CMD = [
+            "busctl", "call", "--system",
+            "io.netplan.Netplan",
+            "/io/netplan/Netplan/config/{}".format(cid),
+            "io.netplan.Netplan.Config",
+            "SetMany", "a{ss}s", "2", "ethernets.eth0.dhcp4", "false", "ethernets.eth0.dhcp6", "true", "70-snapd",
+        ]
+        out = subprocess.check_output(BUSCTL_NETPLAN_CMD)
+        self.assertEqual(b'b true\n', out)
+        self.assertFalse(os.path.exists(self.mock_netplan_cmd.call_log))
+        hint = os.path.join(tmpdir, 'etc', 'netplan', '70-snapd.yaml')
+        with open(hint, 'r') as f:
+            self.assertEqual(f.read(), 'network:\n  version: 2\n  ethernets:\n    eth0:\n      dhcp4: false\n      dhcp6: true\n')
+
+        # Nothing is written if any of the settings is invalid
+        BUSCTL_NETPLAN_CMD[-6:] = ["2", "ethernets.eth0.dhcp4", "true", "ethernets.eth0.dhcp6", "garbage", "70-snapd"]
+        err = self._check_dbus_error(BUSCTL_NETPLAN_CMD)
+        self.assertIn('netplan set failed:', err)
+        with open(hint, 'r') as f:
+            self.assertIn('dhcp4: false', f.read())
+
+    def test_netplan_dbus_config_set_invalid(self):
+        cid = self._new_config_object()
+        tmpdir = self.tmp + '/run/netplan/config-{}'.format(cid)
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+
+        BUSCTL_NETPLAN_CMD = [
+            "busctl", "call", "--system",
+            "io.netplan.Netplan",
+            "/io/netplan/Netplan/config/{}".format(cid),
+            "io.netplan.Netplan.Config",
+            "Set", "ss", "ethernets.eth0.dhcp4", "",
+        ]
+        err = self._check_dbus_error(BUSCTL_NETPLAN_CMD)
+        self.assertIn('netplan set failed: Invalid value specified', err)
+        BUSCTL_NETPLAN_CMD[-2] = "ethernets.eth0.dhcp4=[garbage"
+        err = self._check_dbus_error(BUSCTL_NETPLAN_CMD)
+        self.assertIn('netplan set failed: Error parsing YAML', err)
+        self.assertFalse(os.path.isfile(os.path.join(tmpdir, 'etc', 'netplan', '70-netplan-set.yaml')))
 
     def test_netplan_dbus_config_get(self):
         cid = self._new_config_object()
@@ -340,7 +489,6 @@ class TestNetplanDBus(unittest.TestCase):
         self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
 
         # Verify .Config.Get() on the config object
-        self.mock_netplan_cmd.set_output("network:\n  eth42:\n    dhcp6: true")
         BUSCTL_NETPLAN_CMD = [
             "busctl", "call", "--system",
             "io.netplan.Netplan",
@@ -349,10 +497,26 @@ class TestNetplanDBus(unittest.TestCase):
             "Get",
         ]
         out = subprocess.check_output(BUSCTL_NETPLAN_CMD, text=True)
-        self.assertIn(r's "network:\n  eth42:\n    dhcp6: true\n"', out)
-        self.assertEqual(self.mock_netplan_cmd.calls(), [[
-            "netplan", "get", "all", "--root-dir={}".format(tmpdir)
-        ]])
+        self.assertIn(r's "network:\n  version: 2\n  ethernets:\n    eth0:\n      dhcp4: true\n"', out)
+        self.assertFalse(os.path.exists(self.mock_netplan_cmd.call_log))
+
+        # Invalid YAML is reported back to the caller
+        with open(os.path.join(tmpdir, 'etc', 'netplan', 'main_test.yaml'), 'w') as f:
+            f.write('network:\n  ethernets: [garbage')
+        err = self._check_dbus_error(BUSCTL_NETPLAN_CMD)
+        self.assertIn('netplan get failed:', err)
+
+        # Debug messages are not reported back to the caller
+        with open(os.path.join(tmpdir, 'etc', 'netplan', 'main_test.yaml'), 'w') as f:
+            f.write('''network:
+  ethernets:
+    eth0:
+      nameservers:
+        addresses: [1.2.3.4, 1.2.3.4]
+      dhcp4: garbage''')
+        err = self._check_dbus_error(BUSCTL_NETPLAN_CMD)
+        self.assertIn('netplan get failed:', err)
+        self.assertNotIn('has already been added', err)
 
     def test_netplan_dbus_config_cancel(self):
         cid = self._new_config_object()
@@ -666,12 +830,10 @@ class TestNetplanDBus(unittest.TestCase):
 
         # Verify that Set()/Apply() was only called by one config object
         self.assertEqual(self.mock_netplan_cmd.calls(), [
-            ["netplan", "set", "ethernets.eth0.dhcp4=true", "--origin-hint=70-snapd",
-             "--root-dir={}/run/netplan/config-{}".format(self.tmp, cid)],
-            ["netplan", "set", "ethernets.eth0.dhcp4=yes", "--origin-hint=70-snapd",
-             "--root-dir={}/run/netplan/config-{}".format(self.tmp, cid)],
             ["netplan", "apply", "--state=%s/run/netplan/config-BACKUP" % self.tmp]
         ])
+        with open(os.path.join(self.tmp, 'etc', 'netplan', '70-snapd.yaml'), 'r') as f:
+            self.assertIn('dhcp4: true', f.read())
 
         # Now it works again
         cid3 = self._new_config_object()
@@ -734,13 +896,10 @@ class TestNetplanDBus(unittest.TestCase):
         out = subprocess.check_output(BUSCTL_NETPLAN_CMD2)
         self.assertEqual(b'b true\n', out)
 
-        # Verify the call stack
-        self.assertEqual(self.mock_netplan_cmd.calls(), [
-            ["netplan", "set", "ethernets.eth0.dhcp4=true", "--origin-hint=70-snapd",
-             "--root-dir={}/run/netplan/config-{}".format(self.tmp, cid)],
-            ["netplan", "set", "ethernets.eth0.dhcp4=false", "--origin-hint=70-snapd",
-             "--root-dir={}/run/netplan/config-{}".format(self.tmp, cid2)]
-        ])
+        # Verify the config of the other object was updated
+        with open(os.path.join(self.tmp, 'run', 'netplan', 'config-{}'.format(cid2),
+                               'etc', 'netplan', '70-snapd.yaml'), 'r') as f:
+            self.assertIn('dhcp4: false', f.read())
 
     def test_netplan_dbus_config_set_uninvalidate_timeout(self):
         self.mock_netplan_cmd.touch(self._netplan_try_stamp)
@@ -786,9 +945,5 @@ class TestNetplanDBus(unittest.TestCase):
 
         # Verify the call stack
         self.assertEqual(self.mock_netplan_cmd.calls(), [
-            ["netplan", "set", "ethernets.eth0.dhcp4=true", "--origin-hint=70-snapd",
-             "--root-dir={}/run/netplan/config-{}".format(self.tmp, cid)],
             ["netplan", "try", "--timeout=1", "--state=%s/run/netplan/config-BACKUP" % self.tmp],
-            ["netplan", "set", "ethernets.eth0.dhcp4=false", "--origin-hint=70-snapd",
-             "--root-dir={}/run/netplan/config-{}".format(self.tmp, cid2)]
         ])
@@ -16,11 +16,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import errno
 import os
 import shutil
 import tempfile
 import unittest
+from unittest.mock import patch
 
+from netplan_cli import configmanager
 from netplan_cli.configmanager import ConfigManager, ConfigurationError
 from netplan_cli.cli.ovs import OVS_VSCTL_PATH
 
@@ -257,6 +260,33 @@ class TestConfigManager(unittest.TestCase):
         self.assertIn('ethtest', state.ethernets)
         self.assertIn('bond6',   state.bonds)
 
+    def test_parse_missing_extra_config(self):
+        with self.assertRaises(ConfigurationError):
+            self.configmanager.parse(extra_config=[os.path.join(self.workdir.name, "missing.yaml")])
+        self.assertIsNone(self.configmanager.np_state)
+
+    def test_parse_memoized(self):
+        state = self.configmanager.parse()
+        with self.assertLogs(level='DEBUG') as cm:
+            self.assertIs(self.configmanager.parse(), state)
+        self.assertIn('DEBUG:root:Re-using parsed config of ' + self.workdir.name, cm.output)
+        # a different set of files needs a new parse
+        extra = os.path.join(self.workdir.name, "newfile.yaml")
+        state_extra = self.configmanager.parse(extra_config=[extra])
+        self.assertIsNot(state_extra, state)
+        self.assertIn('ethtest', state_extra.ethernets)
+        self.assertIs(self.configmanager.parse(extra_config=[extra]), state_extra)
+        # a modified file needs a new parse
+        path = os.path.join(self.workdir.name, "etc/netplan/test2.yaml")
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+        self.assertIsNot(self.configmanager.parse(extra_config=[extra]), state_extra)
+
+    def test_parse_debug_dump(self):
+        with self.assertLogs(level='DEBUG') as cm:
+            self.configmanager.parse()
+        self.assertTrue(any(line.startswith('DEBUG:root:Merged config:\n') for line in cm.output))
+
     def test_add(self):
         self.configmanager.add({os.path.join(self.workdir.name, "newfile.yaml"):
                                 os.path.join(self.workdir.name, "etc/netplan/newfile.yaml")})
@@ -299,6 +329,148 @@ class TestConfigManager(unittest.TestCase):
             lines = fd.readlines()
             self.assertNotIn("CHANGED\n", lines)
 
+    def test_revert_only_changed_files(self):
+        networkd = os.path.join(self.workdir.name, "run/systemd/network")
+        with open(os.path.join(networkd, "02-unchanged.network"), 'w') as fd:
+            print("UNCHANGED", file=fd)
+        with open(os.path.join(networkd, "03-deleted.network"), 'w') as fd:
+            print("DELETED", file=fd)
+        self.configmanager.backup()
+        inode = os.stat(os.path.join(networkd, "02-unchanged.network")).st_ino
+        with open(os.path.join(networkd, "01-pretend.network"), 'a+') as fd:
+            print("CHANGED", file=fd)
+        os.unlink(os.path.join(networkd, "03-deleted.network"))
+        with open(os.path.join(networkd, "04-added.network"), 'w') as fd:
+            print("ADDED", file=fd)
+        os.makedirs(os.path.join(networkd, "05-added.network.d"))
+        os.symlink("/dev/null", os.path.join(networkd, "06-added.network"))
+        self.assertEqual(sorted(self.configmanager.changed_files()),
+                         [os.path.join(networkd, name) for name in
+                          ["01-pretend.network", "03-deleted.network", "04-added.network",
+                           "05-added.network.d", "06-added.network"]])
+        self.configmanager.revert()
+        self.assertEqual(self.configmanager.changed_files(), [])
+        self.assertEqual(sorted(os.listdir(networkd)),
+                         ["01-pretend.network", "02-unchanged.network", "03-deleted.network"])
+        with open(os.path.join(networkd, "01-pretend.network"), 'r') as fd:
+            self.assertNotIn("CHANGED\n", fd.readlines())
+        with open(os.path.join(networkd, "03-deleted.network"), 'r') as fd:
+            self.assertEqual("DELETED\n", fd.read())
+        # unchanged files are left alone
+        self.assertEqual(inode, os.stat(os.path.join(networkd, "02-unchanged.network")).st_ino)
+
+    def test_revert_replaces_symlinks(self):
+        networkd = os.path.join(self.workdir.name, "run/systemd/network")
+        os.makedirs(os.path.join(networkd, "02-dir.network.d"))
+        with open(os.path.join(networkd, "02-dir.network.d/override.conf"), 'w') as fd:
+            print("OVERRIDE", file=fd)
+        self.configmanager.backup()
+        victim = os.path.join(self.workdir.name, "victim")
+        with open(victim, 'w') as fd:
+            print("VICTIM", file=fd)
+        outside = os.path.join(self.workdir.name, "outside.d")
+        os.makedirs(outside)
+        with open(os.path.join(outside, "override.conf"), 'w') as fd:
+            print("OUTSIDE", file=fd)
+        os.unlink(os.path.join(networkd, "01-pretend.network"))
+        os.symlink(victim, os.path.join(networkd, "01-pretend.network"))
+        shutil.rmtree(os.path.join(networkd, "02-dir.network.d"))
+        os.symlink(outside, os.path.join(networkd, "02-dir.network.d"))
+        self.assertEqual(sorted(self.configmanager.changed_files()),
+                         [os.path.join(networkd, name) for name in
+                          ["01-pretend.network", "02-dir.network.d", "02-dir.network.d/override.conf"]])
+        self.configmanager.revert()
+        self.assertEqual(self.configmanager.changed_files(), [])
+        # the symlinks got replaced, their targets are left alone
+        self.assertFalse(os.path.islink(os.path.join(networkd, "01-pretend.network")))
+        self.assertFalse(os.path.islink(os.path.join(networkd, "02-dir.network.d")))
+        with open(os.path.join(networkd, "02-dir.network.d/override.conf"), 'r') as fd:
+            self.assertEqual("OVERRIDE\n", fd.read())
+        with open(victim, 'r') as fd:
+            self.assertEqual("VICTIM\n", fd.read())
+        with open(os.path.join(outside, "override.conf"), 'r') as fd:
+            self.assertEqual("OUTSIDE\n", fd.read())
+
+    def test_changed_files_generator_output(self):
+        run = os.path.join(self.workdir.name, "run")
+        os.makedirs(os.path.join(run, "udev/rules.d"))
+        os.makedirs(os.path.join(run, "systemd/system/systemd-networkd.service.wants"))
+        with open(os.path.join(run, "udev/rules.d/99-netplan-eth0.rules"), 'w') as fd:
+            print("UNCHANGED", file=fd)
+        with open(os.path.join(run, "udev/rules.d/90-netplan.rules"), 'w') as fd:
+            print("RULES", file=fd)
+        with open(os.path.join(run, "udev/rules.d/70-other.rules"), 'w') as fd:
+            print("NOT OURS", file=fd)
+        self.configmanager.backup()
+        self.assertEqual(self.configmanager.changed_files(), [])
+        with open(os.path.join(run, "udev/rules.d/90-netplan.rules"), 'w') as fd:
+            print("CHANGED", file=fd)
+        with open(os.path.join(run, "udev/rules.d/70-other.rules"), 'w') as fd:
+            print("CHANGED", file=fd)
+        with open(os.path.join(run, "systemd/system/netplan-ovs-br0.service"), 'w') as fd:
+            print("ADDED", file=fd)
+        os.symlink("../netplan-ovs-br0.service",
+                   os.path.join(run, "systemd/system/systemd-networkd.service.wants/netplan-ovs-br0.service"))
+        self.assertEqual(self.configmanager.changed_files(), [
+            os.path.join(run, "systemd/system/netplan-ovs-br0.service"),
+            os.path.join(run, "systemd/system/systemd-networkd.service.wants/netplan-ovs-br0.service"),
+            os.path.join(run, "udev/rules.d/90-netplan.rules")])
+        # other generator output is not restored
+        self.configmanager.revert()
+        self.assertEqual(len(self.configmanager.changed_files()), 3)
+
+    def test_copy_with_ownership_reflink(self):
+        def clone(dst_fd, request, src_fd):
+            self.assertEqual(configmanager.FICLONE, request)
+            os.write(dst_fd, os.read(src_fd, 1024))
+
+        src = os.path.join(self.workdir.name, "newfile.yaml")
+        dst = os.path.join(self.workdir.name, "copy.yaml")
+        with patch('fcntl.ioctl', side_effect=clone) as mock, \
+             patch('netplan_cli.configmanager._reflink_unsupported', set()):
+            configmanager.copy_with_ownership(src, dst)
+            mock.assert_called_once()
+        with open(src, 'r') as a, open(dst, 'r') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_copy_with_ownership_reflink_unsupported(self):
+        src = os.path.join(self.workdir.name, "newfile.yaml")
+        dst = os.path.join(self.workdir.name, "copy.yaml")
+        with patch('fcntl.ioctl', side_effect=OSError(errno.EOPNOTSUPP, 'Operation not supported')) as mock, \
+             patch('netplan_cli.configmanager._reflink_unsupported', set()):
+            configmanager.copy_with_ownership(src, dst)
+            configmanager.copy_with_ownership(src, dst)
+            # the filesystem is not tried again
+            mock.assert_called_once()
+        with open(src, 'r') as a, open(dst, 'r') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_copy_with_ownership_reflink_failure(self):
+        src = os.path.join(self.workdir.name, "newfile.yaml")
+        dst = os.path.join(self.workdir.name, "copy.yaml")
+        with patch('fcntl.ioctl', side_effect=OSError(errno.EACCES, 'Permission denied')) as mock, \
+             patch('netplan_cli.configmanager._reflink_unsupported', set()):
+            configmanager.copy_with_ownership(src, dst)
+            configmanager.copy_with_ownership(src, dst)
+            # a failure of a single file does not rule out the filesystem
+            self.assertEqual(mock.call_count, 2)
+        with open(src, 'r') as a, open(dst, 'r') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_copy_with_ownership_symlink_dst(self):
+        src = os.path.join(self.workdir.name, "newfile.yaml")
+        dst = os.path.join(self.workdir.name, "copy.yaml")
+        victim = os.path.join(self.workdir.name, "victim")
+        with open(victim, 'w') as fd:
+            print("VICTIM", file=fd)
+        os.symlink(victim, dst)
+        configmanager.copy_with_ownership(src, dst)
+        self.assertFalse(os.path.islink(dst))
+        with open(victim, 'r') as fd:
+            self.assertEqual("VICTIM\n", fd.read())
+        with open(src, 'r') as a, open(dst, 'r') as b:
+            self.assertEqual(a.read(), b.read())
+
     def test_revert_extra_files(self):
         self.configmanager.add({os.path.join(self.workdir.name, "newfile.yaml"):
                                 os.path.join(self.workdir.name, "etc/netplan/newfile.yaml")})
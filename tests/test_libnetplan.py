@@ -21,6 +21,7 @@ import ctypes
 import os
 import shutil
 import tempfile
+import time
 import unittest
 import io
 import yaml
@@ -506,6 +507,173 @@ class TestState(TestBase):
       dhcp4: false''')
         self.assertEqual(1, len(state))
 
+    def test_patch_overrides_other_files(self):
+        state_from_yaml(self.confdir, 'network: {ethernets: {eth0: {dhcp4: true}}}')
+        hint = os.path.join(self.confdir, 'hint.yaml')
+        with open(hint, 'w') as f:
+            f.write('network: {ethernets: {eth1: {dhcp4: true}}}')
+        parser = netplan.Parser()
+        parser.load_yaml(os.path.join(self.confdir, 'a.yml'))
+        parser.load_yaml(hint)
+        state = netplan.State()
+        state.import_parser_results(parser)
+
+        def check(key_value: str) -> bool:
+            with tempfile.TemporaryFile() as patch:
+                key, value = key_value.split('=', 1)
+                netplan._create_yaml_patch(key.split('.'), value, patch)
+                patch.seek(0, io.SEEK_SET)
+                return state._patch_overrides_other_files(patch, 'hint.yaml')
+
+        self.assertTrue(check('network.ethernets.eth0.dhcp6=true'))  # defined in a.yml
+        self.assertFalse(check('network.ethernets.eth1.dhcp6=true'))  # defined in hint.yaml only
+        self.assertFalse(check('network.ethernets.eth2.dhcp6=true'))  # new netdef
+        self.assertFalse(check('network.ethernets.eth0=NULL'))  # deleted netdef
+        self.assertFalse(check('network.renderer=NetworkManager'))  # global
+
+    def test_match_interfaces(self):
+        state = state_from_yaml(self.confdir, '''network:
+  ethernets:
+    eth0: {}
+    by-name:
+      match:
+        name: "eth1"
+    by-glob:
+      match:
+        name: "eth*"
+        driver: ["ixgbe", "e1000*"]
+    by-mac:
+      match:
+        macaddress: AA:BB:CC:DD:EE:FF
+    no-match:
+      match:
+        name: "wl*"''')
+        interfaces = [('eth0', 'e1000e', '00:11:22:33:44:55'),
+                      ('eth1', 'virtio_net', 'aa:bb:cc:dd:ee:ff'),
+                      ('eth2', 'ixgbe', None),
+                      ('lo', None, None)]
+        matches, duplicates = state._match_interfaces(interfaces)
+        self.assertDictEqual(matches, {
+            'eth0': ['eth0'],
+            'by-name': ['eth1'],
+            'by-glob': ['eth0', 'eth2'],
+            'by-mac': ['eth1'],
+        })
+        self.assertSetEqual(duplicates, {'eth0', 'eth1'})
+        self.assertEqual(state._match_interfaces([]), ({}, set()))
+
+    def test_match_interfaces_scale(self):
+        # 500 netdefs, matching by ID, name, glob, driver and MAC address
+        yaml = 'network:\n  ethernets:\n'
+        for i in range(100):
+            yaml += f'''    eth{i}: {{}}
+    name{i}: {{match: {{name: "ens{i}"}}}}
+    glob{i}: {{match: {{name: "enp{i}s*"}}}}
+    driver{i}: {{match: {{name: "enx*", driver: "drv{i}*"}}}}
+    mac{i}: {{match: {{macaddress: "00:00:00:00:00:{i:02X}"}}}}
+'''
+        state = state_from_yaml(self.confdir, yaml)
+        self.assertEqual(500, len(state))
+        # 1000 interfaces
+        interfaces = []
+        for i in range(200):
+            interfaces += [(f'eth{i}', None, None),
+                           (f'ens{i}', 'e1000e', f'00:00:00:00:01:{i % 256:02x}'),
+                           (f'enp{i}s0', 'e1000e', None),
+                           (f'enx{i}', f'drv{i}', None),
+                           (f'wlan{i}', 'iwlwifi', f'00:00:00:00:00:{i % 256:02x}')]
+        self.assertEqual(1000, len(interfaces))
+
+        start = time.perf_counter()
+        matches, duplicates = state._match_interfaces(interfaces)
+        bulk = time.perf_counter() - start
+
+        # Compare to matching every netdef/interface pair individually
+        start = time.perf_counter()
+        expected = {}
+        for netdef_id, netdef in state.netdefs.items():
+            for name, driver, mac in interfaces:
+                if netdef._match_interface(name, driver, mac):
+                    expected.setdefault(netdef_id, []).append(name)
+        pairwise = time.perf_counter() - start
+
+        self.assertDictEqual(matches, expected)
+        self.assertEqual(len(matches), 500)
+        names = [name for ifaces in expected.values() for name in ifaces]
+        self.assertSetEqual(duplicates, set(name for name in names if names.count(name) > 1))
+        self.assertEqual(matches['driver1'], ['enx1'] + [f'enx{i}' for i in range(10, 20)] +
+                         [f'enx{i}' for i in range(100, 200)])
+        self.assertLess(bulk, pairwise)
+
+    def test_regenerate_netdef(self):
+        state = state_from_yaml(self.confdir, '''network:
+  renderer: NetworkManager
+  ethernets:
+    eth0: {dhcp4: true}
+    eth0-x: {dhcp4: true}
+    eth1: {dhcp4: true}
+  vlans:
+    vlan10: {id: 10, link: eth1}''')
+        nm_dir = os.path.join(self.workdir.name, 'run', 'NetworkManager', 'system-connections')
+
+        def path(netdef_id: str) -> str:
+            return os.path.join(nm_dir, 'netplan-{}.nmconnection'.format(netdef_id))
+
+        def mark(netdef_id: str):
+            with open(path(netdef_id), 'a') as f:
+                f.write('# marker\n')
+
+        def marked(netdef_id: str) -> bool:
+            with open(path(netdef_id)) as f:
+                return '# marker' in f.read()
+
+        for netdef_id in ['eth0', 'eth0-x', 'eth1', 'vlan10']:
+            self.assertTrue(state._regenerate_netdef(netdef_id, self.workdir.name))
+        self.assertEqual(sorted(os.listdir(nm_dir)), ['netplan-eth0-x.nmconnection', 'netplan-eth0.nmconnection',
+                                                      'netplan-eth1.nmconnection', 'netplan-vlan10.nmconnection'])
+        self.assertTrue(os.path.isfile(self.nm_enable_all_conf))
+
+        for netdef_id in ['eth0', 'eth0-x', 'eth1', 'vlan10']:
+            mark(netdef_id)
+        # only eth0 is rewritten, eth0-x shares its prefix but is left alone
+        self.assertTrue(state._regenerate_netdef('eth0', self.workdir.name))
+        self.assertEqual([marked(i) for i in ['eth0', 'eth0-x', 'eth1', 'vlan10']], [False, True, True, True])
+        # the VLAN refers to its parent connection, both are rewritten
+        self.assertTrue(state._regenerate_netdef('vlan10', self.workdir.name))
+        self.assertEqual([marked(i) for i in ['eth0-x', 'eth1', 'vlan10']], [True, False, False])
+
+        # a removed netdef is cleaned up
+        with open(path('gone'), 'w') as f:
+            f.write('[connection]\n')
+        self.assertTrue(state._regenerate_netdef('gone', self.workdir.name))
+        self.assertFalse(os.path.exists(path('gone')))
+        self.assertTrue(marked('eth0-x'))
+
+    def test_regenerate_netdef_unsupported(self):
+        state = state_from_yaml(self.confdir, '''network:
+  ethernets:
+    eth0: {dhcp4: true, renderer: NetworkManager}
+    eth1: {dhcp4: true}''')
+        nm_file = os.path.join(self.workdir.name, 'run', 'NetworkManager', 'system-connections',
+                               'netplan-eth0.nmconnection')
+        network_file = os.path.join(self.workdir.name, 'run', 'systemd', 'network', '10-netplan-eth0.network')
+        # networkd definitions are written by the systemd generator
+        self.assertFalse(state._regenerate_netdef('eth1', self.workdir.name))
+        self.assertFalse(os.path.exists(os.path.join(self.workdir.name, 'run')))
+
+        self.assertTrue(state._regenerate_netdef('eth0', self.workdir.name))
+        with open(nm_file, 'a') as f:
+            f.write('# marker\n')
+        # eth0 used to be rendered by networkd, or was removed from a networkd setup
+        os.makedirs(os.path.dirname(network_file))
+        with open(network_file, 'w') as f:
+            f.write('[Match]\nName=eth0\n')
+        self.assertFalse(state._regenerate_netdef('eth0', self.workdir.name))
+        os.rename(network_file, network_file.replace('eth0', 'gone'))
+        self.assertFalse(state._regenerate_netdef('gone', self.workdir.name))
+        with open(nm_file) as f:
+            self.assertIn('# marker', f.read())
+
     def test_bad_state(self):
         state = netplan.State()
         parser = netplan.Parser()
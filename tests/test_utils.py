@@ -17,6 +17,7 @@
 
 import io
 import os
+import subprocess
 import sys
 import unittest
 import tempfile
@@ -92,6 +93,10 @@ then
 fi
 """.format(timeout_dsec))
 
+    def set_delay(self, seconds):
+        with open(self.path, "a") as fp:
+            fp.write("\nsleep %s\n" % seconds)
+
     def set_returncode(self, returncode):
         with open(self.path, "a") as fp:
             fp.write("\nexit %d" % returncode)
@@ -445,6 +450,72 @@ class TestUtils(unittest.TestCase):
         out = utils.nm_get_connection_for_interface('asd0')
         self.assertEqual(out, '')
 
+    def test_nm_keyfile_connection(self):
+        path = os.path.join(self.workdir.name, 'netplan-eth0.nmconnection')
+        with open(path, 'w') as f:
+            f.write('[connection]\nid=netplan-eth0\nuuid=626dd384-8b3d-3690-9511-192b2c79b3fd\n'
+                    'interface-name=eth0\n\n[ethernet]\nwake-on-lan=0\n')
+        self.assertDictEqual(utils.nm_keyfile_connection(path),
+                             {'id': 'netplan-eth0', 'uuid': '626dd384-8b3d-3690-9511-192b2c79b3fd',
+                              'interface-name': 'eth0'})
+
+    @patch('subprocess.check_output')
+    def test_nm_reload_connections(self, mock):
+        mock.return_value = '{"type":"b","data":[true]}'
+        utils.nm_reload_connections()
+        args = mock.call_args.args[0]
+        self.assertEqual(args[1:], ['--json=short', 'call', '--system', 'org.freedesktop.NetworkManager',
+                                    '/org/freedesktop/NetworkManager/Settings',
+                                    'org.freedesktop.NetworkManager.Settings', 'ReloadConnections'])
+
+    @patch('subprocess.check_output')
+    def test_nm_reload_connections_fail(self, mock):
+        mock.return_value = '{"type":"b","data":[false]}'
+        with self.assertRaises(RuntimeError):
+            utils.nm_reload_connections()
+
+    @patch('shutil.which')
+    def test_nm_dbus_call_missing_busctl(self, mock):
+        mock.return_value = None
+        with self.assertRaises(RuntimeError):
+            utils.nm_dbus_call('/org/freedesktop/NetworkManager', '', 'Reload', ['u', '0'])
+
+    @patch('netplan_cli.cli.utils.nmcli_out')
+    def test_nm_active_connections(self, nmcli):
+        nmcli.return_value = ('626dd384-8b3d-3690-9511-192b2c79b3fd:eth0\n'
+                              'ab2d1b3e-7ac5-4c74-a9cd-4e68c3b2e6a1:wl\\:p0\n'
+                              '0e2b8a7c-29f3-4e4c-9f5c-3b1fa2a3f1d2:\n')
+        self.assertDictEqual(utils.nm_active_connections(),
+                             {'626dd384-8b3d-3690-9511-192b2c79b3fd': 'eth0',
+                              'ab2d1b3e-7ac5-4c74-a9cd-4e68c3b2e6a1': 'wl:p0'})
+        nmcli.assert_called_once_with(['-t', '-f', 'UUID,DEVICE', 'connection', 'show', '--active'])
+
+    @patch('subprocess.check_output')
+    def test_nm_reapply_connection(self, mock):
+        mock.side_effect = [
+            '{"type":"o","data":["/org/freedesktop/NetworkManager/Settings/3"]}',  # GetConnectionByUuid
+            '{"type":"o","data":["/org/freedesktop/NetworkManager/Devices/2"]}',  # GetDeviceByIpIface
+            '',  # Reapply
+        ]
+        utils.nm_reapply_connection('some-uuid', 'eth0')
+        self.assertEqual(mock.call_count, 3)
+        self.assertEqual(mock.call_args.args[0][-7:],
+                         ['/org/freedesktop/NetworkManager/Devices/2', 'org.freedesktop.NetworkManager.Device',
+                          'Reapply', 'a{sa{sv}}tu', '0', '0', '0'])
+
+    @patch('subprocess.check_output')
+    def test_nm_reapply_connection_reactivate(self, mock):
+        mock.side_effect = [
+            '{"type":"o","data":["/org/freedesktop/NetworkManager/Settings/3"]}',  # GetConnectionByUuid
+            '{"type":"o","data":["/org/freedesktop/NetworkManager/Devices/2"]}',  # GetDeviceByIpIface
+            subprocess.CalledProcessError(1, '', 'Incompatible connection'),  # Reapply
+            '{"type":"o","data":["/org/freedesktop/NetworkManager/ActiveConnection/4"]}',  # ActivateConnection
+        ]
+        utils.nm_reapply_connection('some-uuid', 'eth0')
+        self.assertEqual(mock.call_args.args[0][-5:],
+                         ['ActivateConnection', 'ooo', '/org/freedesktop/NetworkManager/Settings/3',
+                          '/org/freedesktop/NetworkManager/Devices/2', '/'])
+
     @patch('builtins.open')
     def test_route_table_lookup(self, open_mock):
         file = io.StringIO()